@@ -3,8 +3,7 @@ import os
 
 import requests
 from requests import Response
-import openmeteo_requests
-import requests_cache
+from weather_tools import get_current_weather
 from openai import OpenAI
 from openai.types.chat import ChatCompletion
 from typing import Literal
@@ -98,17 +97,7 @@ def get_random_numbers(min: int, max: int, count: int) -> str:
 
 @timer
 def get_temperature(latitude: float, longitude: float) -> str:
-    cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    openmeteo = openmeteo_requests.Client(session=cache_session)
-
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "current": "temperature_2m"
-    }
-    responses = openmeteo.weather_api(url, params=params)
-    value = responses[0].Current().Variables(0).Value()
+    value = (get_current_weather(latitude, longitude) or {}).get("temperature", "N/A")
     return json.dumps({"temperature": str(value)})
 
 @timer
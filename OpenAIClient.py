@@ -8,38 +8,24 @@ import json
 import yaml
 import jsonref
 from pinecone import Pinecone, ServerlessSpec
-import tiktoken
 import concurrent.futures
 from tenacity import retry, stop_after_attempt, wait_exponential
-
-def split_text_by_tokens(text: str, max_tokens: int = 8000) -> List[str]:
-    """
-    Splits the input text into smaller chunks not exceeding max_tokens tokens.
-
-    Args:
-        text (str): The text to split.
-        max_tokens (int): Maximum number of tokens per chunk.
-
-    Returns:
-        List[str]: A list of text chunks.
-    """
-    encoding = tiktoken.get_encoding("cl100k_base")  # Adjust based on your model's encoding
-    tokens = encoding.encode(text)
-
-    chunks = []
-    for i in range(0, len(tokens), max_tokens):
-        chunk_tokens = tokens[i:i + max_tokens]
-        chunk_text = encoding.decode(chunk_tokens)
-        chunks.append(chunk_text)
-
-    return chunks
+import time
+from chunking import CHUNK_OVERLAP_TOKENS, split_text
+from document_store import get_document_store, slim_metadata
+from embeddings import MAX_CONCURRENT_REQUESTS, embed_texts
+from embedding_cache import get_embedding_cache
+from lexical_index import HYBRID_CANDIDATES, HYBRID_SEARCH, get_lexical_index, reciprocal_rank_fusion
+from query_cache import get_query_cache
+from vector_store import VECTOR_STORE, LocalVectorStore, VectorStore, index_identity, scope_key
 
 class OpenAIClient:
     """
     A client to interact with OpenAI's API and Pinecone Vector Store for Retrieval-Augmented Generation (RAG).
     """
 
-    def __init__(self, api_key: str, pinecone_api_key: str, pinecone_env: str, index_name: str):
+    def __init__(self, api_key: str, pinecone_api_key: str = "", pinecone_env: str = "", index_name: str = "",
+                 vector_store: Optional[VectorStore] = None):
         """
         Initializes the OpenAIClient with necessary credentials.
 
@@ -48,6 +34,8 @@ class OpenAIClient:
             pinecone_api_key (str): Pinecone API key.
             pinecone_env (str): Pinecone environment (e.g., "us-west1-gcp").
             index_name (str): Name of the Pinecone index.
+            vector_store (VectorStore): Vector store to use instead of Pinecone; with ``VECTOR_STORE=local``
+                a LocalVectorStore is opened when None.
         """
         self.api_key = api_key
         openai.api_key = self.api_key
@@ -56,24 +44,32 @@ class OpenAIClient:
         self.pinecone_env = pinecone_env
         self.index_name = index_name
 
-        # Initialize Pinecone using the Pinecone class
-        try:
-            self.pc = Pinecone(api_key=self.pinecone_api_key)
-            self.spec = ServerlessSpec(cloud='aws', region='us-east-1')  # Update as needed
-            if self.index_name not in self.pc.list_indexes().names():
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=1536,  # Dimensionality for text-embedding-ada-002
-                    metric='cosine',
-                    spec=self.spec
-                )
-                st.success(f"Pinecone index '{self.index_name}' created.")
-            else:
-                st.info(f"Pinecone index '{self.index_name}' already exists.")
-
-            self.index = self.pc.Index(self.index_name)
-        except Exception as e:
-            st.error(f"Failed to initialize Pinecone: {e}")
+        if vector_store is not None or VECTOR_STORE == "local":
+            # In-process backend with the same interface as a Pinecone index
+            self.index = vector_store or LocalVectorStore()
+            st.info(f"Using a local vector store ({type(self.index).__name__}) instead of Pinecone.")
+        else:
+            # Initialize Pinecone using the Pinecone class
+            try:
+                self.pc = Pinecone(api_key=self.pinecone_api_key)
+                self.spec = ServerlessSpec(cloud='aws', region='us-east-1')  # Update as needed
+                if self.index_name not in self.pc.list_indexes().names():
+                    self.pc.create_index(
+                        name=self.index_name,
+                        dimension=1536,  # Dimensionality for text-embedding-ada-002
+                        metric='cosine',
+                        spec=self.spec
+                    )
+                    st.success(f"Pinecone index '{self.index_name}' created.")
+                else:
+                    st.info(f"Pinecone index '{self.index_name}' already exists.")
+
+                self.index = self.pc.Index(self.index_name)
+            except Exception as e:
+                st.error(f"Failed to initialize Pinecone: {e}")
+
+        # This client only uses the default namespace; local state about it is kept per index
+        self.scope = scope_key(index_identity(getattr(self, "index", None), self.index_name), "")
 
     # -----------------------------
     # Helper Methods
@@ -114,9 +110,11 @@ class OpenAIClient:
             batch (List[tuple]): A list of tuples containing (id, embedding, metadata).
         """
         self.index.upsert(vectors=batch)
+        get_query_cache().invalidate(self.scope)
         st.info(f"Upserted batch containing {len(batch)} vectors.")
 
-    def upsert_embeddings(self, id: str, text: str, metadata: Dict[str, Any] = {}, chunk_size: int = 8000, batch_size: int = 500, max_workers: int = 5):
+    def upsert_embeddings(self, id: str, text: str, metadata: Dict[str, Any] = {}, chunk_size: int = 8000, batch_size: int = 500, max_workers: int = 5,
+                          embed_workers: int = MAX_CONCURRENT_REQUESTS, chunk_overlap: int = CHUNK_OVERLAP_TOKENS):
         """
         Generates embeddings for the given text (split into chunks) and upserts them into Pinecone with metadata in batches using parallel processing.
 
@@ -127,28 +125,37 @@ class OpenAIClient:
             chunk_size (int): Maximum number of tokens per chunk.
             batch_size (int): Number of vectors per upsert batch.
             max_workers (int): Number of parallel threads.
+            embed_workers (int): Number of embedding requests in flight.
+            chunk_overlap (int): Maximum tokens shared by consecutive chunks.
         """
         try:
-            # Split the text into smaller chunks based on tokens
-            chunks = split_text_by_tokens(text, max_tokens=chunk_size)
+            start = time.perf_counter()
+
+            # Split the text into smaller chunks on structural boundaries
+            chunks = split_text(text, max_tokens=chunk_size, overlap_tokens=chunk_overlap)
+
+            # Generate the embeddings in packed, concurrent requests instead of one request per chunk;
+            # unchanged chunks come from the embedding cache
+            cache = get_embedding_cache()
+            hits_before = cache.stats()["hits"] if cache else 0
+            embeddings = embed_texts(chunks, max_workers=embed_workers)
+            reused = cache.stats()["hits"] - hits_before if cache else 0
 
             vectors = []
-            for idx, chunk in enumerate(chunks):
+            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
                 # Generate a unique ID for each chunk
                 chunk_id = f"{id}_chunk_{idx}"
 
-                # Generate embedding for the chunk
-                embedding_response = openai.Embedding.create(
-                    input=chunk,
-                    model="text-embedding-ada-002"
-                )
-                embedding = embedding_response['data'][0]['embedding']
-
                 # Prepare the vector with metadata
                 vector_metadata = metadata.copy()
                 vector_metadata["chunk_id"] = chunk_id  # Example of adding more metadata
 
-                vectors.append((chunk_id, embedding, {"content": chunk, **vector_metadata}))
+                vectors.append((chunk_id, embedding, slim_metadata(vector_metadata)))
+
+            # Chunk text lives in the local document store, not in the vector metadata
+            bodies = {vector[0]: chunk for vector, chunk in zip(vectors, chunks)}
+            get_document_store().put_many(self.scope, bodies)
+            get_lexical_index().add_many(self.scope, bodies)
 
             # Define a helper function for upserting a batch
             def upsert_batch_wrapper(batch):
@@ -160,10 +167,12 @@ class OpenAIClient:
                     executor.submit(upsert_batch_wrapper, vectors[i:i + batch_size])
                     for i in range(0, len(vectors), batch_size)
                 ]
-                # Wait for all upserts to complete
-                concurrent.futures.wait(futures)
+                # Wait for all upserts to complete, surfacing the first failure
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
 
-            st.success(f"Successfully upserted all {len(vectors)} vectors with base ID: {id}")
+            elapsed = time.perf_counter() - start
+            st.success(f"Successfully upserted all {len(vectors)} vectors with base ID: {id} ({len(vectors) / max(elapsed, 1e-9):.1f} chunks/s, {reused} embeddings reused from cache)")
 
         except Exception as e:
             st.error(f"Failed to upsert embeddings: {e}")
@@ -177,35 +186,58 @@ class OpenAIClient:
             top_k (int): Number of top similar documents to retrieve.
 
         Returns:
-            List[Dict]: A list of dictionaries containing retrieved documents and similarity scores.
+            List[Dict]: A list of dictionaries containing retrieved documents and similarity scores, or
+            reciprocal rank fusion scores of the vector and BM25 rankings with ``HYBRID_SEARCH`` on.
         """
         try:
-            embedding_response = openai.Embedding.create(
-                input=query,
-                model="text-embedding-ada-002"
-            )
-            query_embedding = embedding_response['data'][0]['embedding']
-
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
-
-            formatted_results = []
-            for match in results.matches:
-                formatted_results.append({
-                    "id": match.id,
-                    "score": match.score,
-                    "content": match.metadata.get("content", "No content available")
-                })
-
-            return formatted_results
+            if HYBRID_SEARCH:
+                candidates = max(top_k, HYBRID_CANDIDATES)
+                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                    lexical = executor.submit(get_lexical_index().search, self.scope, query, candidates)
+                    dense = self._query_vectors(query, candidates)
+                    lexical = lexical.result()
+                by_id = {result["id"]: result for result in dense}
+                fused = reciprocal_rank_fusion([list(by_id), [id for id, _ in lexical]])[:top_k]
+                missing = get_document_store().get_many(self.scope, [id for id, _ in fused if id not in by_id])
+                return [{"id": id, "score": score,
+                         "content": by_id[id]["content"] if id in by_id else missing.get(id, "No content available")}
+                        for id, score in fused]
+            return self._query_vectors(query, top_k)
 
         except Exception as e:
             st.error(f"An error occurred during Vector Store query: {e}")
             return None
 
+    def _query_vectors(self, query: str, top_k: int) -> List[Dict]:
+        """
+        The ``top_k`` nearest chunks with their similarity scores and text.
+        """
+        # Repeated questions reuse the query embedding, and unchanged namespaces their results
+        cache = get_query_cache()
+        query_embedding = cache.embedding(query, lambda text: embed_texts([text])[0])
+        version = cache.version(self.scope)
+        cached = cache.get_results(self.scope, query_embedding, top_k)
+        if cached is not None:
+            return cached
+
+        results = self.index.query(
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True
+        )
+
+        bodies = get_document_store().get_many(self.scope, [match.id for match in results.matches])
+        formatted_results = []
+        for match in results.matches:
+            formatted_results.append({
+                "id": match.id,
+                "score": match.score,
+                "content": bodies.get(match.id) or (match.metadata or {}).get("content", "No content available")
+            })
+
+        cache.put_results(self.scope, query_embedding, top_k, formatted_results, version=version)
+        return formatted_results
+
     def delete_vector(self, id: str):
         """
         Deletes a vector from Pinecone by its ID.
@@ -215,6 +247,9 @@ class OpenAIClient:
         """
         try:
             self.index.delete(ids=[id])
+            get_query_cache().invalidate(self.scope)
+            get_document_store().delete(self.scope, [id])
+            get_lexical_index().delete(self.scope, [id])
             st.success(f"Deleted vector with ID: {id} successfully.")
         except Exception as e:
             st.error(f"Failed to delete vector: {e}")
@@ -0,0 +1,352 @@
+# async_openai_client.py
+
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Union
+
+import aiohttp
+import openai
+from loguru import logger
+from pinecone import Pinecone, ServerlessSpec
+
+from chunking import CHUNK_OVERLAP_TOKENS, split_text
+from document_store import get_document_store, slim_metadata
+from embeddings import MAX_CONCURRENT_REQUESTS, aembed_texts
+from id_pager import IDPager, get_id_pager, invalidate_id_pages
+from lexical_index import HYBRID_CANDIDATES, HYBRID_SEARCH
+from query_cache import get_query_cache
+from retrieval import forget_chunks, lexical_candidates, rank_namespace, store_chunks, top_results, vector_candidates
+from sync_manifest import content_hash, get_sync_manifest
+from vector_store import VECTOR_STORE, LocalVectorStore, VectorStore, index_identity, scope_key
+
+"""
+    Asyncio RAG client
+    - The surface of openai_client.OpenAIClient (upsert, query, delete, namespace and ID listing) as
+      coroutines, for callers that already run an event loop; no Streamlit dependency
+    - One aiohttp session, with at most ``ASYNC_MAX_CONNECTIONS`` connections, carries every embeddings
+      request (openai 0.28 picks it up from ``openai.aiosession``)
+    - pinecone-client has no asyncio API: index calls, local stores and SQLite run on one shared thread
+      pool, and the Pinecone index keeps a matching number of HTTP connections
+    - Embedding requests, upsert batches and per-namespace queries run concurrently; embeddings share the
+      process-wide rate limiter and caches with the sync client
+    - Failures raise ``RAGClientError`` and are reported through the ``notify`` callback (loguru by default)
+"""
+
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "32"))
+
+# (level, message) with level one of "info", "success", "warning" and "error"
+Notify = Callable[[str, str], None]
+
+
+class RAGClientError(Exception):
+    pass
+
+
+def _log(level: str, message: str):
+    logger.log(level.upper(), message)
+
+
+class AsyncOpenAIClient:
+    """
+    An asyncio client for OpenAI embeddings and a Pinecone (or local) vector store.
+
+    Use it as ``async with AsyncOpenAIClient(...) as client``, or call ``start`` and ``close``.
+
+    Args:
+        api_key (str): OpenAI API key.
+        pinecone_api_key (str): Pinecone API key.
+        index_name (str): Pinecone index, created if missing.
+        vector_store (VectorStore): Store to use instead of Pinecone.
+        max_connections (int): Size of the HTTP connection pools and of the thread pool.
+        notify (Notify): Receives progress and error messages; loguru if None.
+    """
+
+    def __init__(self, api_key: str, pinecone_api_key: str = "", index_name: str = "",
+                 vector_store: Optional[VectorStore] = None, max_connections: int = ASYNC_MAX_CONNECTIONS,
+                 notify: Optional[Notify] = None):
+        self.api_key = api_key
+        openai.api_key = self.api_key
+        self.pinecone_api_key = pinecone_api_key
+        self.index_name = index_name
+        self.max_connections = max_connections
+        self.notify = notify or _log
+        self.index = vector_store
+        self.index_id = index_identity(vector_store, index_name)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    async def __aenter__(self) -> "AsyncOpenAIClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        """
+        Opens the shared connection pools and connects to the vector store.
+        """
+        if self._session is not None:
+            return
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_connections,
+                                                               thread_name_prefix="rag-async")
+        try:
+            if self.index is None and VECTOR_STORE == "local":
+                self.index = LocalVectorStore()
+            if self.index is not None:
+                self.notify("info", f"Using a local vector store ({type(self.index).__name__}) instead of Pinecone.")
+            else:
+                self.index = await self._run(self._connect_pinecone)
+            # Scopes the manifest, document store, lexical index and caches to this index
+            self.index_id = index_identity(self.index, self.index_name)
+        except Exception as e:
+            await self.close()
+            self._fail("Failed to initialize Pinecone", e)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # -----------------------------
+    # Helper Methods
+    # -----------------------------
+    def _connect_pinecone(self):
+        pc = Pinecone(api_key=self.pinecone_api_key)
+        if self.index_name not in pc.list_indexes().names():
+            pc.create_index(name=self.index_name, dimension=1536, metric="cosine",
+                            spec=ServerlessSpec(cloud="aws", region="us-east-1"))
+            self.notify("success", f"Pinecone index '{self.index_name}' created.")
+        # The index's own HTTP pool is sized like the thread pool that calls it
+        return pc.Index(self.index_name, pool_threads=self.max_connections)
+
+    async def _run(self, function: Callable, *args, **kwargs) -> Any:
+        """
+        Runs a blocking call on the shared thread pool.
+        """
+        if self._executor is None:
+            raise RAGClientError("Client is not started; use 'async with' or call start() first")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    @contextlib.contextmanager
+    def _openai_session(self):
+        # A context variable: set for this call and the tasks it starts, then restored
+        token = openai.aiosession.set(self._session)
+        try:
+            yield
+        finally:
+            openai.aiosession.reset(token)
+
+    def _fail(self, message: str, error: Exception):
+        self.notify("error", f"{message}: {error}")
+        raise RAGClientError(f"{message}: {error}") from error
+
+    def _written(self, namespace: str):
+        get_query_cache().invalidate(scope_key(self.index_id, namespace))
+        invalidate_id_pages(self.index_id, namespace)
+
+    async def _upsert_batch(self, batch: List[tuple], namespace: str):
+        await self._run(self.index.upsert, vectors=batch, namespace=namespace)
+        self.notify("info", f"Upserted batch containing {len(batch)} vectors into namespace '{namespace}'.")
+
+    # -----------------------------
+    # Vector Store
+    # -----------------------------
+    async def upsert_embeddings(self, id: str, text: str, metadata: Dict[str, Any] = {}, namespace: str = "",
+                                chunk_size: int = 8000, batch_size: int = 500,
+                                chunk_overlap: int = CHUNK_OVERLAP_TOKENS) -> int:
+        """
+        Chunks, embeds and upserts one document into a namespace.
+        """
+        return await self.upsert_documents([{"id": id, "text": text, "metadata": metadata}], namespace=namespace,
+                                           chunk_size=chunk_size, batch_size=batch_size, chunk_overlap=chunk_overlap)
+
+    async def upsert_documents(self, documents: Iterable[Dict[str, Any]], namespace: str = "", chunk_size: int = 8000,
+                               batch_size: int = 500, chunk_overlap: int = CHUNK_OVERLAP_TOKENS) -> int:
+        """
+        Chunks, embeds and upserts many documents, with documents chunked on the thread pool, embedding
+        requests in flight together and upsert batches sent concurrently.
+
+        Args:
+            documents (Iterable[Dict[str, Any]]): Documents with "id", "text" and optional "metadata".
+            namespace (str): Pinecone namespace.
+            chunk_size (int): Maximum number of tokens per chunk.
+            batch_size (int): Maximum number of vectors per upsert batch.
+            chunk_overlap (int): Maximum tokens shared by consecutive chunks of a document.
+
+        Returns:
+            int: Number of vectors upserted.
+        """
+        try:
+            documents = list(documents)
+            chunked = await asyncio.gather(*(self._run(split_text, document["text"], max_tokens=chunk_size,
+                                                       overlap_tokens=chunk_overlap) for document in documents))
+            ids, texts, metadatas = [], [], []
+            for document, chunks in zip(documents, chunked):
+                for idx, text in enumerate(chunks):
+                    chunk_id = f"{document['id']}_chunk_{idx}"
+                    ids.append(chunk_id)
+                    texts.append(text)
+                    metadatas.append({**document.get("metadata", {}), "chunk_id": chunk_id})
+            if not ids:
+                return 0
+
+            with self._openai_session():
+                embeddings = await aembed_texts(texts, max_concurrency=MAX_CONCURRENT_REQUESTS)
+
+            # Bodies first, so a query never matches a vector whose text is not stored yet
+            await self._run(store_chunks, self.index_id, namespace, dict(zip(ids, texts)))
+            vectors = [(id, embedding, slim_metadata(metadata)) for id, embedding, metadata in zip(ids, embeddings, metadatas)]
+            try:
+                await asyncio.gather(*(self._upsert_batch(vectors[i:i + batch_size], namespace)
+                                       for i in range(0, len(vectors), batch_size)))
+            finally:
+                self._written(namespace)
+            await self._run(get_sync_manifest().record, scope_key(self.index_id, namespace),
+                            {id: content_hash(text, metadata) for id, text, metadata in zip(ids, texts, metadatas)})
+            self.notify("success", f"Successfully upserted {len(vectors)} vectors into namespace '{namespace}'.")
+            return len(vectors)
+        except RAGClientError:
+            raise
+        except Exception as e:
+            self._fail("Failed to upsert embeddings", e)
+
+    async def query_vector_store(self, query: str, top_k: int = 5, namespace: str = "",
+                                 namespaces: Optional[Union[List[str], str]] = None) -> List[Dict]:
+        """
+        Queries one or more namespaces with the provided query string.
+
+        BM25 searches start before the query is embedded; the vector queries of all namespaces then run
+        together, and the results are ranked as in ``OpenAIClient.query_vector_store``.
+
+        Args:
+            query (str): The user's query.
+            top_k (int): Number of results over all namespaces.
+            namespace (str): Namespace to query when ``namespaces`` is not given.
+            namespaces (Union[List[str], str]): Namespaces to query, or "all" for every namespace in the index.
+
+        Returns:
+            List[Dict]: Results with "id", "score", "content" and "namespace", best first.
+        """
+        try:
+            if namespaces is None:
+                namespaces = [namespace]
+            elif namespaces == "all":
+                namespaces = await self.list_namespaces() or [""]
+            namespaces = list(dict.fromkeys(namespaces))
+            candidates = max(top_k, HYBRID_CANDIDATES) if HYBRID_SEARCH else top_k
+
+            lexical = [asyncio.ensure_future(self._run(lexical_candidates, self.index_id, ns, query, candidates))
+                       for ns in namespaces] if HYBRID_SEARCH else []
+
+            async def embed_query(text: str) -> List[float]:
+                return (await aembed_texts([text]))[0]
+
+            try:
+                # Repeated questions reuse the query embedding
+                with self._openai_session():
+                    query_embedding = await get_query_cache().aembedding(query, embed_query)
+                dense = await asyncio.gather(*(self._run(vector_candidates, self.index, self.index_id, query_embedding, candidates, ns)
+                                               for ns in namespaces))
+                sparse = await asyncio.gather(*lexical) if lexical else [None] * len(namespaces)
+            finally:
+                for task in lexical:
+                    task.cancel()
+
+            ranked = []
+            for ns, matches, lexical_matches in zip(namespaces, dense, sparse):
+                ranked.extend(rank_namespace(ns, matches, lexical_matches, top_k))
+            return await self._run(top_results, ranked, top_k, self.index_id)
+        except RAGClientError:
+            raise
+        except Exception as e:
+            self._fail("An error occurred during Vector Store query", e)
+
+    async def delete_vector(self, id: str, namespace: str = ""):
+        """
+        Deletes a vector by its ID within a specified namespace.
+        """
+        try:
+            await self._run(self.index.delete, ids=[id], namespace=namespace)
+            self._written(namespace)
+            await self._run(get_sync_manifest().forget, scope_key(self.index_id, namespace), [id])
+            await self._run(forget_chunks, self.index_id, namespace, [id])
+            self.notify("success", f"Deleted vector with ID: {id} from namespace '{namespace}' successfully.")
+        except RAGClientError:
+            raise
+        except Exception as e:
+            self._fail("Failed to delete vector", e)
+
+    async def describe_index_statistics(self) -> Dict:
+        """
+        Retrieves statistics for the index, including per-namespace statistics.
+        """
+        try:
+            return await self._run(self.index.describe_index_stats)
+        except RAGClientError:
+            raise
+        except Exception as e:
+            self._fail("Failed to retrieve index statistics", e)
+
+    async def document_store_statistics(self) -> Dict:
+        """
+        Chunk count and text/compressed sizes of the local document store.
+        """
+        return await self._run(get_document_store().stats)
+
+    async def list_namespaces(self) -> List[str]:
+        """
+        Lists all namespaces in the index.
+        """
+        stats = await self.describe_index_statistics()
+        if stats and "namespaces" in stats:
+            return list(stats["namespaces"].keys())
+        self.notify("warning", "No namespaces found.")
+        return []
+
+    def id_pager(self, namespace: str = "", prefix: str = "", limit: int = 100) -> IDPager:
+        """
+        The pager over a namespace's IDs, shared with the sync client.
+        """
+        def list_page(token: Optional[str]):
+            response = self.index.list_paginated(prefix=prefix, limit=limit, namespace=namespace, pagination_token=token)
+            return [v.id for v in response.vectors], response.pagination.next if response.pagination else None
+
+        return get_id_pager(self.index_id, namespace, prefix, limit, list_page)
+
+    async def iter_ids_in_namespace(self, namespace: str = "", prefix: str = "", limit: int = 100,
+                                    pagination_token: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Yields the vector IDs in a namespace page by page, starting at ``pagination_token`` if given.
+        """
+        async for page in self.id_pager(namespace, prefix, limit).apages(pagination_token):
+            for id in page.ids:
+                yield id
+
+    async def list_ids_in_namespace(self, namespace: str = "", prefix: str = "", limit: int = 100) -> List[str]:
+        """
+        Lists all vector IDs in a specified namespace, following pagination.
+        """
+        try:
+            return [id async for id in self.iter_ids_in_namespace(namespace=namespace, prefix=prefix, limit=limit)]
+        except Exception as e:
+            self._fail(f"Failed to list IDs in namespace '{namespace}'", e)
+
+    async def list_ids_in_namespace_paginated(self, namespace: str = "", prefix: str = "", limit: int = 100,
+                                              pagination_token: Optional[str] = None) -> Dict:
+        """
+        Lists one page of vector IDs, the first page or the one at ``pagination_token``, as
+        {"ids", "next_token"}.
+        """
+        try:
+            page = await self.id_pager(namespace, prefix, limit).apage(pagination_token)
+            return {"ids": page.ids, "next_token": page.next_token}
+        except Exception as e:
+            self._fail(f"Failed to list IDs with pagination in namespace '{namespace}'", e)
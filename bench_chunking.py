@@ -0,0 +1,87 @@
+# bench_chunking.py
+
+import json
+import sys
+import time
+from typing import Callable, List
+
+import tiktoken
+import yaml
+
+import chunking
+import embeddings
+
+"""
+    Chunking throughput benchmark, in MB/s of input text
+    - Before: split_text_by_tokens as it was (encoder looked up per call, whole-document token list, decode
+      of every token slice, no overlap)
+    - After: chunking.split_text per document, and chunking.chunk_documents over all documents on a
+      thread pool
+    - Inputs: openapi.yaml as one document, and its operations as indented JSON endpoint documents
+      (what me.py embeds)
+    - cl100k_base is downloaded on first use; offline, a byte-level encoding with the same
+      pre-tokenizer stands in and the output says so
+    - Usage: python bench_chunking.py [spec] [max_tokens]
+"""
+
+REPEAT = 5
+CL100K_PATTERN = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+
+
+def load_encoding():
+    try:
+        return embeddings.get_encoding(), "cl100k_base"
+    except Exception:
+        encoding = tiktoken.Encoding("bytes", pat_str=CL100K_PATTERN,
+                                     mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={})
+        return encoding, "byte-level stand-in (cl100k_base unavailable offline)"
+
+
+def split_text_by_tokens(text: str, max_tokens: int, load: Callable) -> List[str]:
+    encoding = load()
+    tokens = encoding.encode(text)
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def throughput(documents: List[str], run: Callable[[], None]) -> float:
+    megabytes = sum(len(document.encode("utf-8")) for document in documents) / 1e6
+    best = float("inf")
+    for _ in range(REPEAT):
+        # Measure a cold start: no line token counts memoized by an earlier run
+        chunking._line_counts.clear()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return megabytes / best
+
+
+def main(path: str = "openapi.yaml", max_tokens: str = "1000"):
+    max_tokens = int(max_tokens)
+    encoding, name = load_encoding()
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    spec = yaml.safe_load(raw)
+    endpoints = [json.dumps({method.upper(): {path_name: operation}}, indent=4, default=str)
+                 for path_name, operations in (spec.get("paths") or {}).items()
+                 for method, operation in operations.items() if isinstance(operation, dict)]
+
+    # The old function looked the encoding up in tiktoken's registry on every call
+    load = (lambda: tiktoken.get_encoding("cl100k_base")) if name == "cl100k_base" else (lambda: encoding)
+
+    print(f"{len(raw) / 1e6:.2f} MB spec, {len(endpoints)} endpoint documents, max_tokens={max_tokens}, {name}")
+    rows = [
+        ("spec, before (split_text_by_tokens)", [raw],
+         lambda: split_text_by_tokens(raw, max_tokens, load)),
+        ("spec, after (split_text)", [raw],
+         lambda: chunking.split_text(raw, max_tokens, chunking.CHUNK_OVERLAP_TOKENS, encoding)),
+        ("endpoints, before (serial loop)", endpoints,
+         lambda: [split_text_by_tokens(document, max_tokens, load) for document in endpoints]),
+        ("endpoints, after (chunk_documents)", endpoints,
+         lambda: chunking.chunk_documents(endpoints, max_tokens, chunking.CHUNK_OVERLAP_TOKENS, encoding=encoding)),
+    ]
+    for label, documents, run in rows:
+        print(f"{label:<40}{throughput(documents, run):>8.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
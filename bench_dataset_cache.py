@@ -0,0 +1,85 @@
+# bench_dataset_cache.py
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+import dataset_cache
+
+"""
+    Dataset cache benchmark
+    - Cold start: a fresh interpreter loading the dataset with pd.read_csv vs the memory-mapped Arrow cache
+    - Per query: loading the dataset and filtering one index over a date range, as get_stock_market_data does
+    - Usage: python bench_dataset_cache.py [repeats]
+"""
+
+DATASETS = {
+    "data/Stock Market Dataset.csv": {"parse_dates": ["Date"], "date_format": "mixed", "dayfirst": True, "thousands": ","},
+    "data/stock_data.csv": {"parse_dates": ["Date"]},
+}
+
+COLD_START_SNIPPET = """
+import time
+{setup}
+start = time.perf_counter()
+{body}
+print(time.perf_counter() - start)
+"""
+
+
+def cold_start(setup: str, body: str, repeats: int) -> float:
+    # Each run is a new process, so nothing is shared except the OS page cache
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_SNIPPET.format(setup=setup, body=body)],
+            capture_output=True, text=True, check=True
+        )
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def per_query(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(repeats: int = 20):
+    shutil.rmtree(dataset_cache.CACHE_DIR, ignore_errors=True)
+
+    print(f"{'dataset':<34}{'path':<16}{'cold start':>14}{'per query':>14}")
+    for path, options in DATASETS.items():
+        # Prime the on-disk cache so the cached cold start measures a hit
+        dataset_cache.open_table(path, **options)
+
+        # Imports happen before the clock starts; only the first load of the dataset is timed
+        csv_cold = ("import pandas as pd", f"pd.read_csv({path!r}, **{options!r})")
+        cache_cold = ("import dataset_cache", f"dataset_cache.open_table({path!r}, **{options!r})")
+
+        def csv_query():
+            data = pd.read_csv(path, **options)
+            return data[(data["Date"] >= "2023-01-01") & (data["Date"] <= "2023-12-31")]
+
+        def cache_query():
+            data = dataset_cache.read_csv_cached(path, **options)
+            return data[(data["Date"] >= "2023-01-01") & (data["Date"] <= "2023-12-31")]
+
+        rows = [
+            ("pd.read_csv", cold_start(*csv_cold, max(3, repeats // 4)), per_query(csv_query, repeats)),
+            ("arrow cache", cold_start(*cache_cold, max(3, repeats // 4)), per_query(cache_query, repeats)),
+        ]
+        for label, cold, query in rows:
+            print(f"{os.path.basename(path):<34}{label:<16}{cold * 1000:>11.2f} ms{query * 1000:>11.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
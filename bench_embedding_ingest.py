@@ -0,0 +1,95 @@
+# bench_embedding_ingest.py
+
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+import yaml
+
+import embeddings
+from embedding_cache import EmbeddingCache
+
+"""
+    Embedding ingest benchmark
+    - Before: one Embedding.create request per chunk, in a serial loop (the previous upsert_embeddings)
+    - After: chunks packed into requests up to the model limits, several requests in flight (embed_texts)
+    - Re-ingest: the same chunks again, all served from the embedding cache
+    - Chunks are the operations of openapi.yaml plus the raw spec in 1 KB pieces
+    - With OPENAI_API_KEY set the real API is called; otherwise a simulated endpoint with a fixed
+      per-request latency and a per-token cost is used (SIMULATED_* below)
+    - Usage: python bench_embedding_ingest.py [spec]
+"""
+
+SIMULATED_REQUEST_SECONDS = 0.1
+SIMULATED_SECONDS_PER_1K_TOKENS = 0.002
+DIMENSIONS = 1536
+
+
+def load_chunks(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    spec = yaml.safe_load(raw)
+    chunks = [json.dumps({"path": path_name, "method": method, **operation}, default=str)
+              for path_name, operations in (spec.get("paths") or {}).items()
+              for method, operation in operations.items() if isinstance(operation, dict)]
+    chunks += [raw[i:i + 1024] for i in range(0, len(raw), 1024)]
+    return chunks
+
+
+def token_counts(chunks: List[str]) -> List[int]:
+    try:
+        return embeddings.count_tokens(chunks)
+    except Exception:
+        # The encoding is downloaded on first use; estimate offline
+        return [len(chunk) // 4 + 1 for chunk in chunks]
+
+
+def simulated_create(texts: List[str], model: str) -> List[List[float]]:
+    tokens = sum(len(text) // 4 + 1 for text in texts)
+    time.sleep(SIMULATED_REQUEST_SECONDS + tokens / 1000 * SIMULATED_SECONDS_PER_1K_TOKENS)
+    return [[0.0] * DIMENSIONS for _ in texts]
+
+
+def main(path: str = "openapi.yaml"):
+    chunks = load_chunks(path)
+    counts = token_counts(chunks)
+    live = bool(os.getenv("OPENAI_API_KEY"))
+    if live:
+        import openai
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        create = embeddings._create
+    else:
+        create = simulated_create
+    limiter = embeddings.RateLimiter()
+
+    print(f"{len(chunks)} chunks, {sum(counts)} tokens, {'live API' if live else 'simulated endpoint'}")
+
+    start = time.perf_counter()
+    for chunk, count in zip(chunks, counts):
+        limiter.acquire(count)
+        create([chunk], embeddings.EMBEDDING_MODEL)
+    serial = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(directory)
+        start = time.perf_counter()
+        embeddings.embed_texts(chunks, rate_limiter=limiter, token_counts=counts, create=create, cache=cache)
+        batched = time.perf_counter() - start
+
+        start = time.perf_counter()
+        embeddings.embed_texts(chunks, rate_limiter=limiter, token_counts=counts, create=create, cache=cache)
+        cached = time.perf_counter() - start
+        stats = cache.stats()
+
+    requests = len(embeddings.pack_batches(counts))
+    print(f"{'before (serial, 1 chunk/request)':<40}{len(chunks):>6} requests {len(chunks) / serial:>10.1f} chunks/s")
+    print(f"{'after (packed, concurrent)':<40}{requests:>6} requests {len(chunks) / batched:>10.1f} chunks/s")
+    print(f"{'re-ingest (embedding cache)':<40}{0:>6} requests {len(chunks) / cached:>10.1f} chunks/s "
+          f"({stats['hit_ratio']:.0%} hits overall, {stats['tokens_saved']} tokens saved)")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
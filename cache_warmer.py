@@ -0,0 +1,378 @@
+# cache_warmer.py
+
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from loguru import logger
+
+from locations import resolve_location
+from market_data import get_market_store
+from weather_cache import Coordinate, WeatherCache
+
+"""
+    Predictive cache warming
+    - Every tool call is recorded in a call log (JSON lines, replayed on start-up) that keeps
+      exponentially decaying counts per (tool, arguments), so yesterday's daily pattern still ranks
+      today's popular lookups while stale ones fade out; past ``TOOL_CALL_LOG_MAX_BYTES`` the log is
+      compacted to one weighted line per live (tool, arguments)
+    - A background thread refreshes the weather cache cells of the top-N argument tuples per tool
+      as soon as the provider has published new values, so users hit a warm entry instead of paying
+      upstream latency; refreshes of cells sharing an update boundary are spread over a window
+    - Market tools read the resident store, which is loaded and kept up to date ahead of users
+    - Budgets cap refreshes per tick and per hour; stats() reports the misses prevented
+"""
+
+TOOL_CALL_LOG = os.getenv("TOOL_CALL_LOG", ".tool_calls.jsonl")
+
+# Set CACHE_WARMING=0 to record calls without warming
+CACHE_WARMING = os.getenv("CACHE_WARMING", "1") != "0"
+
+# Counts halve every 6 hours: a lookup made every morning stays popular, a one-off fades within a day
+HALF_LIFE_SECONDS = 6 * 3600
+
+# Argument tuples warmed per tool, and the decayed count they need to qualify
+TOP_N = 20
+MIN_SCORE = 1.0
+
+TICK_SECONDS = 15
+
+# Refreshes of cells expiring at the same boundary are spread over this window after it
+SPREAD_SECONDS = 60
+
+MAX_REFRESHES_PER_TICK = 50
+MAX_REFRESHES_PER_HOUR = 1000
+
+# Log lines replayed on start-up
+MAX_REPLAY_LINES = 100000
+
+# Log size that triggers compaction into the current decayed counts
+TOOL_CALL_LOG_MAX_BYTES = int(os.getenv("TOOL_CALL_LOG_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Decayed count below which an argument tuple is left out of a compacted log
+COMPACT_MIN_SCORE = 0.01
+
+CallKey = str
+
+
+class DecayingCounter:
+    """
+    Exponentially decaying counts.
+
+    Scores are kept relative to a reference time, so adding to a key does not touch the others;
+    the reference moves forward when the scale factors grow too large.
+    """
+
+    def __init__(self, half_life: float = HALF_LIFE_SECONDS):
+        self.half_life = half_life
+        self.reference: Optional[float] = None
+        self.scores: Dict[CallKey, float] = {}
+
+    def _scale(self, at: float) -> float:
+        return 2.0 ** ((at - self.reference) / self.half_life)
+
+    def add(self, key: CallKey, at: float, weight: float = 1.0):
+        if self.reference is None:
+            self.reference = at
+        if (at - self.reference) / self.half_life > 64:
+            self._rebase(at)
+        self.scores[key] = self.scores.get(key, 0.0) + weight * self._scale(at)
+
+    def _rebase(self, at: float):
+        factor = 1.0 / self._scale(at)
+        # Drop keys that decayed to nothing while rescaling
+        self.scores = {key: score * factor for key, score in self.scores.items() if score * factor > 1e-3}
+        self.reference = at
+
+    def top(self, n: int, now: float, min_score: float = 0.0) -> List[Tuple[CallKey, float]]:
+        """
+        The ``n`` highest current scores of at least ``min_score``.
+        """
+        if self.reference is None:
+            return []
+        factor = 1.0 / self._scale(now)
+        ranked = sorted(self.scores.items(), key=lambda item: -item[1])[:n]
+        return [(key, score * factor) for key, score in ranked if score * factor >= min_score]
+
+
+class CallLog:
+    """
+    Decaying per-tool counts of argument tuples, persisted as JSON lines.
+
+    Args:
+        path (str): Log file, appended to on every call and replayed on start-up; None keeps the
+            counts in memory only.
+        half_life (float): Half-life of the counts in seconds.
+        max_bytes (int): Log size at which it is rewritten as the current decayed counts.
+        clock (Callable[[], float]): Time source, in seconds since the epoch.
+    """
+
+    def __init__(self, path: Optional[str] = TOOL_CALL_LOG, half_life: float = HALF_LIFE_SECONDS,
+                 max_bytes: int = TOOL_CALL_LOG_MAX_BYTES, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.half_life = half_life
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._counters: Dict[str, DecayingCounter] = {}
+        self._lock = threading.Lock()
+        self._compact_at = max_bytes
+        if path and os.path.exists(path):
+            self._replay(path)
+
+    @staticmethod
+    def key(arguments: Dict) -> CallKey:
+        return json.dumps(arguments, sort_keys=True, separators=(",", ":"))
+
+    def _add(self, tool: str, key: CallKey, at: float, weight: float = 1.0):
+        counter = self._counters.get(tool)
+        if counter is None:
+            counter = self._counters[tool] = DecayingCounter(self.half_life)
+        counter.add(key, at, weight)
+
+    def _replay(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()[-MAX_REPLAY_LINES:]
+        horizon = self.clock() - 20 * self.half_life
+        replayed = 0
+        for line in lines:
+            try:
+                record = json.loads(line)
+                if record["t"] >= horizon:
+                    # Compacted lines carry the decayed count they stand for
+                    self._add(record["tool"], self.key(record["args"]), record["t"], float(record.get("w", 1.0)))
+                    replayed += 1
+            except (ValueError, KeyError, TypeError):
+                continue
+        logger.info(f"Replayed {replayed} tool calls from {path}")
+
+    def record(self, tool: str, arguments: Dict):
+        """
+        Counts one call of ``tool`` with ``arguments``.
+        """
+        now = self.clock()
+        with self._lock:
+            self._add(tool, self.key(arguments), now)
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps({"t": round(now, 3), "tool": tool, "args": arguments}, separators=(",", ":")) + "\n")
+                        size = f.tell()
+                    if size > self._compact_at:
+                        self._compact(now)
+                except OSError as e:
+                    logger.warning(f"Failed to append to call log {self.path}: {e}")
+
+    def _compact(self, now: float):
+        """
+        Rewrites the log as one line per live (tool, arguments) holding its decayed count.
+        """
+        lines = []
+        for tool, counter in self._counters.items():
+            for key, score in counter.top(len(counter.scores), now, COMPACT_MIN_SCORE):
+                lines.append(json.dumps({"t": round(now, 3), "tool": tool, "args": json.loads(key), "w": round(score, 4)},
+                                        separators=(",", ":")) + "\n")
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+            size = f.tell()
+        os.replace(temporary, self.path)
+        # Many live tuples can leave the compacted log near the limit; wait for it to double before the next pass
+        self._compact_at = max(self.max_bytes, 2 * size)
+        logger.info(f"Compacted call log {self.path} to {len(lines)} lines ({size} bytes)")
+
+    def top(self, tool: str, n: int = TOP_N, min_score: float = MIN_SCORE) -> List[Tuple[Dict, float]]:
+        """
+        The ``n`` most popular argument dictionaries of ``tool`` with their decayed counts.
+        """
+        with self._lock:
+            counter = self._counters.get(tool)
+            ranked = counter.top(n, self.clock(), min_score) if counter else []
+        return [(json.loads(key), score) for key, score in ranked]
+
+    def tools(self) -> List[str]:
+        with self._lock:
+            return list(self._counters)
+
+
+def _spread(cell: Tuple[int, int]) -> float:
+    # Stable fraction in [0, 1) per cell, so a cell is refreshed at the same offset every time
+    return zlib.crc32(repr(cell).encode()) / 2 ** 32
+
+
+class CacheWarmer:
+    """
+    Refreshes popular cache entries in the background.
+
+    Args:
+        call_log (CallLog): Source of the popular argument tuples.
+        weather_cache (WeatherCache): Cache to refresh.
+        weather_tools (Dict[str, Callable[[Dict], Iterable[Coordinate]]]): Weather tool names and the
+            coordinates their arguments look up.
+        market_tools (Set[str]): Tools served from the resident market store.
+        top_n (int): Argument tuples considered per tool.
+        min_score (float): Decayed count an argument tuple needs to be warmed.
+        tick_seconds (float): Interval between planning rounds.
+        spread_seconds (float): Window after an update boundary over which refreshes are spread.
+        max_per_tick (int): Maximum cells refreshed per round.
+        max_per_hour (int): Maximum cells refreshed per hour (token bucket).
+        clock (Callable[[], float]): Time source, in seconds since the epoch.
+    """
+
+    def __init__(self, call_log: CallLog, weather_cache: WeatherCache,
+                 weather_tools: Dict[str, Callable[[Dict], Iterable[Coordinate]]], market_tools: Set[str],
+                 top_n: int = TOP_N, min_score: float = MIN_SCORE, tick_seconds: float = TICK_SECONDS,
+                 spread_seconds: float = SPREAD_SECONDS, max_per_tick: int = MAX_REFRESHES_PER_TICK,
+                 max_per_hour: int = MAX_REFRESHES_PER_HOUR, clock: Callable[[], float] = time.time):
+        self.call_log = call_log
+        self.weather_cache = weather_cache
+        self.weather_tools = weather_tools
+        self.market_tools = market_tools
+        self.top_n = top_n
+        self.min_score = min_score
+        self.tick_seconds = tick_seconds
+        self.spread_seconds = spread_seconds
+        self.max_per_tick = max_per_tick
+        self.max_per_hour = max_per_hour
+        self.clock = clock
+
+        self._tokens = float(max_per_hour)
+        self._refilled_at = clock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {"ticks": 0, "refreshed_cells": 0, "deferred_by_budget": 0, "market_refreshes": 0, "errors": 0}
+
+    def _popular_coordinates(self) -> List[Tuple[float, Coordinate]]:
+        scored: Dict[Tuple[int, int], Tuple[float, Coordinate]] = {}
+        for tool, extract in self.weather_tools.items():
+            for arguments, score in self.call_log.top(tool, self.top_n, self.min_score):
+                try:
+                    coordinates = list(extract(arguments))
+                except Exception:
+                    continue
+                for coordinate in coordinates:
+                    cell = self.weather_cache.cell(*coordinate)
+                    # A cell wanted by several tools or argument tuples ranks by their combined count
+                    previous = scored.get(cell, (0.0, coordinate))[0]
+                    scored[cell] = (previous + score, coordinate)
+        return sorted(scored.values(), key=lambda item: -item[0])
+
+    def plan(self) -> List[Coordinate]:
+        """
+        Popular coordinates whose cache entry is missing or was replaced upstream, most popular
+        first and within the budgets.
+        """
+        now = self.clock()
+        self._tokens = min(float(self.max_per_hour),
+                           self._tokens + (now - self._refilled_at) * self.max_per_hour / 3600.0)
+        self._refilled_at = now
+
+        due = []
+        for _, coordinate in self._popular_coordinates():
+            expiry = self.weather_cache.expiry(*coordinate)
+            # Values are replaced upstream at the expiry; refresh after it, at a stable per-cell offset
+            if expiry is None or now >= expiry + _spread(self.weather_cache.cell(*coordinate)) * self.spread_seconds:
+                due.append(coordinate)
+
+        allowed = min(len(due), self.max_per_tick, math.floor(self._tokens))
+        self._counters["deferred_by_budget"] += len(due) - allowed
+        self._tokens -= allowed
+        return due[:allowed]
+
+    async def tick(self):
+        """
+        One planning round: refreshes the due weather cells and the market store.
+        """
+        self._counters["ticks"] += 1
+        coordinates = self.plan()
+        if coordinates:
+            self._counters["refreshed_cells"] += await self.weather_cache.refresh(coordinates)
+
+        if any(self.call_log.top(tool, 1, self.min_score) for tool in self.market_tools):
+            # Loads the store on first use, then ingests rows appended to the CSVs since the last round
+            await asyncio.to_thread(get_market_store)
+            self._counters["market_refreshes"] += 1
+
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await self.tick()
+            except Exception as e:
+                self._counters["errors"] += 1
+                logger.error(f"Cache warming round failed: {e}")
+            await asyncio.to_thread(self._stop.wait, self.tick_seconds)
+
+    def start(self):
+        """
+        Starts warming on a daemon thread with its own event loop.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._run(),), name="cache-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        """
+        Warmer counters with the cache's view of their effect: ``prevented_misses`` are user
+        lookups served by a warmed entry, ``unused_refreshes`` warmed entries that expired unread.
+        """
+        cache = self.weather_cache.stats()
+        return {**self._counters, "prevented_misses": cache["warm_hits"], "unused_refreshes": cache["warm_unused"],
+                "budget_tokens": round(self._tokens, 1)}
+
+
+def _locations(arguments: Dict) -> List[Coordinate]:
+    return [(float(location["latitude"]), float(location["longitude"])) for location in arguments["locations"]]
+
+
+def _place(arguments: Dict) -> List[Coordinate]:
+    place = resolve_location(arguments["location"])
+    return [(place.latitude, place.longitude)] if place else []
+
+
+WEATHER_TOOL_COORDINATES: Dict[str, Callable[[Dict], Sequence[Coordinate]]] = {
+    "get_temperature": lambda arguments: [(float(arguments["latitude"]), float(arguments["longitude"]))],
+    "get_batch_weather": _locations,
+    "get_current_weather": _place,
+}
+
+_call_log: Optional[CallLog] = None
+_warmer: Optional[CacheWarmer] = None
+_warmer_lock = threading.Lock()
+
+
+def get_call_log() -> CallLog:
+    """
+    The process-wide call log, replayed from ``TOOL_CALL_LOG`` on first use.
+    """
+    global _call_log
+    with _warmer_lock:
+        if _call_log is None:
+            _call_log = CallLog()
+        return _call_log
+
+
+def start_cache_warmer(weather_cache: WeatherCache, market_tools: Iterable[str]) -> Optional[CacheWarmer]:
+    """
+    Starts the process-wide warmer for the given weather cache and market tool names, unless
+    disabled with ``CACHE_WARMING=0``.
+    """
+    global _warmer
+    if not CACHE_WARMING:
+        return None
+    call_log = get_call_log()
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = CacheWarmer(call_log, weather_cache, WEATHER_TOOL_COORDINATES, set(market_tools))
+            _warmer.start()
+        return _warmer
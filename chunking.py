@@ -0,0 +1,191 @@
+# chunking.py
+
+import concurrent.futures
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from embeddings import get_encoding
+
+"""
+    Structure-aware chunking
+    - Splits text into chunks of at most ``max_tokens`` tokens at line boundaries, preferring the
+      shallowest indentation level: for indented JSON and YAML (OpenAPI endpoint documents) an object or
+      list item is only broken up when it does not fit on its own
+    - Consecutive chunks can share ``overlap_tokens`` tokens of whole lines/blocks for context
+    - Works on a stream of lines: each line is tokenized once and only its token count is kept, so the
+      token list of the whole input is never built; block sizes are sums of line counts
+    - Only a single line longer than ``max_tokens`` is cut on token boundaries
+    - Uses the process-wide encoder from embeddings.get_encoding
+"""
+
+CHUNK_MAX_TOKENS = 8000
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "200"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Token counts of short lines are memoized: specs repeat the same lines ("}," or "type: string") constantly
+LINE_CACHE_MAX_CHARS = 120
+LINE_CACHE_SIZE = 1 << 18
+
+Line = Tuple[str, int]
+Unit = Tuple[str, int]
+
+_line_counts: Dict[Tuple[str, str], int] = {}
+
+
+def _count_lines(lines: Iterable[str], encoding) -> Iterator[Line]:
+    """
+    Pairs each line with its token count.
+
+    The pre-tokenizer never merges text across a line ending (other than runs of blank lines), so the
+    tokens of a run of lines are the sum of the lines' tokens, or slightly more than it.
+    """
+    encode = encoding.encode_ordinary
+    name = encoding.name
+    for line in lines:
+        if len(line) > LINE_CACHE_MAX_CHARS:
+            yield line, len(encode(line))
+            continue
+        key = (name, line)
+        count = _line_counts.get(key)
+        if count is None:
+            if len(_line_counts) >= LINE_CACHE_SIZE:
+                _line_counts.clear()
+            count = _line_counts[key] = len(encode(line))
+        yield line, count
+
+
+def _blocks(lines: Iterable[Line]) -> Iterator[List[Line]]:
+    """
+    Groups lines into blocks, each starting at a line indented no deeper than the first line.
+
+    Blank lines and lines closing a bracket (``}``, ``]``) stay with the block before them.
+    """
+    base = None
+    block: List[Line] = []
+    for line in lines:
+        stripped = line[0].lstrip()
+        if stripped.strip():
+            indent = len(line[0]) - len(stripped)
+            if base is None:
+                base = indent
+            elif indent <= base and stripped[0] not in "}])" and block:
+                yield block
+                block = []
+        block.append(line)
+    if block:
+        yield block
+
+
+def _slice(text: str, max_tokens: int, encoding) -> Iterator[Unit]:
+    tokens = encoding.encode_ordinary(text)
+    for start in range(0, len(tokens), max_tokens):
+        window = tokens[start:start + max_tokens]
+        yield encoding.decode(window), len(window)
+
+
+def _fit(block: List[Line], max_tokens: int, encoding) -> Iterator[Unit]:
+    """
+    (text, tokens) units of at most ``max_tokens`` tokens: the block itself if it fits, otherwise its
+    first line followed by the units of the blocks nested under it.
+    """
+    count = sum(tokens for _, tokens in block)
+    if count <= max_tokens:
+        yield "".join(line for line, _ in block), count
+    elif len(block) == 1:
+        yield from _slice(block[0][0], max_tokens, encoding)
+    else:
+        yield from _fit(block[:1], max_tokens, encoding)
+        for child in _blocks(block[1:]):
+            yield from _fit(child, max_tokens, encoding)
+
+
+def _units(lines: Iterable[str], max_tokens: int, encoding) -> Iterator[Unit]:
+    for block in _blocks(_count_lines(lines, encoding)):
+        yield from _fit(block, max_tokens, encoding)
+
+
+def iter_chunks(lines: Iterable[str], max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                encoding=None) -> Iterator[str]:
+    """
+    Chunks a stream of lines (a file object, ``str.splitlines(keepends=True)``) lazily.
+
+    Args:
+        lines (Iterable[str]): Lines including their line endings.
+        max_tokens (int): Maximum tokens per chunk.
+        overlap_tokens (int): Maximum tokens of trailing lines repeated at the start of the next chunk.
+        encoding: tiktoken encoding; the cl100k_base encoding if None.
+
+    Returns:
+        Iterator[str]: Chunks in input order.
+    """
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be at least 0 and less than max_tokens")
+    encoding = encoding or get_encoding()
+
+    window: List[Unit] = []
+    total = 0
+    for text, count in _units(lines, max_tokens, encoding):
+        if window and total + count > max_tokens:
+            yield "".join(text for text, _ in window)
+            # Carry whole trailing units, up to the overlap, into the next chunk
+            kept: List[Unit] = []
+            total = 0
+            for unit in reversed(window):
+                if total + unit[1] > overlap_tokens or total + unit[1] + count > max_tokens:
+                    break
+                kept.insert(0, unit)
+                total += unit[1]
+            window = kept
+        window.append((text, count))
+        total += count
+    if window:
+        yield "".join(text for text, _ in window)
+
+
+def split_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+               encoding=None) -> List[str]:
+    """
+    Splits a document into chunks of at most ``max_tokens`` tokens on structural boundaries.
+
+    Minified JSON is pretty-printed first so that it has structure to split on.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int): Maximum number of tokens per chunk.
+        overlap_tokens (int): Maximum tokens shared by consecutive chunks.
+        encoding: tiktoken encoding; the cl100k_base encoding if None.
+
+    Returns:
+        List[str]: A list of text chunks.
+    """
+    if not text:
+        return []
+    if "\n" not in text.strip() and len(text) > max_tokens and text.lstrip()[:1] in "{[":
+        try:
+            text = json.dumps(json.loads(text), indent=2)
+        except ValueError:
+            pass
+    return list(iter_chunks(text.splitlines(keepends=True), max_tokens, overlap_tokens, encoding))
+
+
+def chunk_documents(texts: Sequence[str], max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                    max_workers: int = CHUNK_WORKERS, encoding=None) -> List[List[str]]:
+    """
+    ``split_text`` over many documents on a thread pool; the encoder releases the GIL while tokenizing.
+
+    Args:
+        texts (Sequence[str]): Documents to split.
+        max_tokens (int): Maximum number of tokens per chunk.
+        overlap_tokens (int): Maximum tokens shared by consecutive chunks.
+        max_workers (int): Documents split concurrently.
+        encoding: tiktoken encoding; the cl100k_base encoding if None.
+
+    Returns:
+        List[List[str]]: The chunks of each document, in input order.
+    """
+    encoding = encoding or get_encoding()
+    if len(texts) <= 1 or max_workers <= 1:
+        return [split_text(text, max_tokens, overlap_tokens, encoding) for text in texts]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda text: split_text(text, max_tokens, overlap_tokens, encoding), texts))
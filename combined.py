@@ -4,8 +4,7 @@ import functools
 import time
 import asyncio
 from typing import Literal
-import requests_cache
-import openmeteo_requests
+from weather_tools import get_current_weather
 from loguru import logger
 
 # Example prompts
@@ -74,17 +73,7 @@ def get_random_numbers(min: int, max: int, count: int) -> str:
 
 @log_function_call
 def get_temperature(latitude: float, longitude: float) -> str:
-    cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    openmeteo = openmeteo_requests.Client(session=cache_session)
-
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "current_weather": True
-    }
-    responses = openmeteo.weather(params=params)
-    temperature = responses["current_weather"]["temperature"]
+    temperature = (get_current_weather(latitude, longitude) or {}).get("temperature", "N/A")
     return json.dumps({"temperature": str(temperature)})
 
 def handle_tool_response(client, completion, messages: list[dict[str, str]]) -> str:
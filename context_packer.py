@@ -0,0 +1,141 @@
+# context_packer.py
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from chunking import iter_chunks
+from embeddings import get_encoding
+
+"""
+    Token-budgeted RAG context
+    - Retrieved chunks are grouped by source document (chunk IDs are ``<document>_chunk_<n>``); runs of
+      consecutive chunks are merged into one passage with the lines their overlap repeats removed, and
+      exact duplicates are dropped
+    - Passages go into the prompt best score first until ``CONTEXT_TOKEN_BUDGET`` tokens (cl100k_base, the
+      chat model's encoding) are used; the first passage that does not fit is cut at a structural boundary
+      if at least ``MIN_PARTIAL_TOKENS`` remain, and the rest are left out
+    - The prompt size is bounded by the budget, not by how many chunks were retrieved
+"""
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+MIN_PARTIAL_TOKENS = 200
+SEPARATOR = "\n\n---\n\n"
+
+_CHUNK_ID = re.compile(r"^(?P<source>.*)_chunk_(?P<index>\d+)$")
+
+
+@dataclass
+class Passage:
+    source: str
+    namespace: str
+    indexes: List[int]
+    score: float
+    text: str
+    tokens: int = 0
+    truncated: bool = False
+
+    def header(self) -> str:
+        where = f"{self.namespace}/{self.source}" if self.namespace else self.source
+        return f"[{where}]\n"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    passages: List[Passage] = field(default_factory=list)
+    # Passages left out for lack of budget
+    dropped: List[Passage] = field(default_factory=list)
+    duplicates: int = 0
+
+    def summary(self) -> Dict:
+        return {"tokens": self.tokens, "passages": len(self.passages), "dropped": len(self.dropped),
+                "duplicates": self.duplicates, "truncated": sum(passage.truncated for passage in self.passages)}
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """
+    ``first`` followed by ``second`` without the leading lines of ``second`` that repeat the end of ``first``.
+    """
+    head = first.splitlines(keepends=True)
+    tail = second.splitlines(keepends=True)
+    # Longest overlap first; it can only start where ``first`` repeats the first line of ``second``
+    for start in (i for i, line in enumerate(head) if tail and line == tail[0]):
+        overlap = len(head) - start
+        if overlap <= len(tail) and head[start:] == tail[:overlap]:
+            return first + "".join(tail[overlap:])
+    return first + ("" if first.endswith("\n") else "\n") + second
+
+
+def _passages(results: Sequence[Dict]) -> Tuple[List[Passage], int]:
+    """
+    Merged passages, best first, and the number of duplicate chunks dropped.
+    """
+    seen = set()
+    duplicates = 0
+    by_source: Dict[Tuple[str, str], List[Tuple[int, float, str]]] = {}
+    for result in results:
+        content = result.get("content") or ""
+        if not content or content in seen:
+            duplicates += bool(content)
+            continue
+        seen.add(content)
+        match = _CHUNK_ID.match(result["id"])
+        source, index = (match["source"], int(match["index"])) if match else (result["id"], 0)
+        by_source.setdefault((result.get("namespace", ""), source), []).append((index, result.get("score", 0.0), content))
+
+    passages = []
+    for (namespace, source), chunks in by_source.items():
+        chunks.sort()
+        current: Optional[Passage] = None
+        for index, score, content in chunks:
+            if current is not None and index == current.indexes[-1] + 1:
+                current.text = _join_overlapping(current.text, content)
+                current.indexes.append(index)
+                current.score = max(current.score, score)
+                continue
+            current = Passage(source, namespace, [index], score, content)
+            passages.append(current)
+    passages.sort(key=lambda passage: passage.score, reverse=True)
+    return passages, duplicates
+
+
+def pack_context(results: Sequence[Dict], budget: int = CONTEXT_TOKEN_BUDGET, encoding=None) -> PackedContext:
+    """
+    Builds the context for an answer from retrieved chunks within a token budget.
+
+    Args:
+        results (Sequence[Dict]): Query results with "id", "score", "content" and optionally "namespace".
+        budget (int): Maximum tokens of the returned text, headers and separators included.
+        encoding: tiktoken encoding; the cl100k_base encoding if None.
+
+    Returns:
+        PackedContext: The context text, its token count, and the passages used and left out.
+    """
+    encoding = encoding or get_encoding()
+    separator_tokens = len(encoding.encode_ordinary(SEPARATOR))
+    passages, duplicates = _passages(results)
+
+    packed = PackedContext("", 0, duplicates=duplicates)
+    parts = []
+    for position, passage in enumerate(passages):
+        header = passage.header()
+        overhead = len(encoding.encode_ordinary(header)) + (separator_tokens if parts else 0)
+        passage.tokens = len(encoding.encode_ordinary(passage.text))
+        remaining = budget - packed.tokens - overhead
+        if passage.tokens > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                packed.dropped.extend(passages[position:])
+                break
+            # The longest leading part of the passage that fits, cut between lines or nested blocks
+            passage.text = next(iter_chunks(passage.text.splitlines(keepends=True), remaining, 0, encoding))
+            passage.tokens = len(encoding.encode_ordinary(passage.text))
+            passage.truncated = True
+        parts.append(header + passage.text)
+        packed.passages.append(passage)
+        packed.tokens += overhead + passage.tokens
+    packed.text = SEPARATOR.join(parts)
+    packed.tokens = len(encoding.encode_ordinary(packed.text))
+    return packed
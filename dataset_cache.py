@@ -0,0 +1,198 @@
+# dataset_cache.py
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from loguru import logger
+
+"""
+    Dataset cache
+    - Converts source CSV files into Arrow IPC files keyed by the SHA-256 of the source bytes
+    - Memory-maps the cached files so worker processes share the same page cache (zero-copy reads)
+    - Falls back to parsing the CSV whenever the cache is missing, stale or unreadable
+"""
+
+CACHE_DIR = os.getenv("DATASET_CACHE_DIR", ".dataset_cache")
+
+# In-process memo: (abs path, size, mtime_ns, options) -> memory-mapped table
+_tables: Dict[Tuple[str, int, int, str], pa.Table] = {}
+_lock = threading.Lock()
+
+
+def source_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 digest of a source file.
+
+    Args:
+        path (str): Path to the source file.
+        chunk_size (int): Number of bytes hashed per read.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _options_key(read_csv_kwargs: Dict[str, Any]) -> str:
+    # Parser options are part of the key: the same CSV parsed differently is a different dataset
+    encoded = json.dumps(read_csv_kwargs, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_path_for(path: str, digest: str, options_key: str) -> str:
+    """
+    Returns the Arrow IPC cache location for a source file.
+
+    Args:
+        path (str): Path to the source CSV file.
+        digest (str): SHA-256 digest of the source file.
+        options_key (str): Hash of the parser options.
+
+    Returns:
+        str: Path of the cached Arrow file.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    return os.path.join(CACHE_DIR, f"{stem}-{digest[:16]}-{options_key}.arrow")
+
+
+def _to_arrow(df: pd.DataFrame) -> pa.Table:
+    # Float columns keep NaN as a value (not an Arrow null) so they can be read back zero-copy
+    arrays = []
+    for name in df.columns:
+        column = df[name]
+        if pd.api.types.is_float_dtype(column.dtype):
+            arrays.append(pa.array(column.to_numpy(), from_pandas=False))
+        else:
+            arrays.append(pa.Array.from_pandas(column))
+    return pa.Table.from_arrays(arrays, names=[str(name) for name in df.columns])
+
+
+def _write_cache(table: pa.Table, target: str):
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    # Uncompressed IPC file format so the buffers can be mapped directly
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, target)
+
+
+def _remove_stale(path: str, keep: str):
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        candidate = os.path.join(CACHE_DIR, name)
+        if name.startswith(f"{stem}-") and name.endswith(".arrow") and candidate != keep:
+            try:
+                os.remove(candidate)
+            except OSError:
+                pass
+
+
+def _map_table(target: str) -> pa.Table:
+    source = pa.memory_map(target, "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def open_table(path: str, **read_csv_kwargs) -> pa.Table:
+    """
+    Returns the contents of a CSV file as a memory-mapped Arrow table.
+
+    The cache is keyed by the SHA-256 of the source bytes and the parser options, so an
+    edited CSV never serves stale rows. On a miss the CSV is parsed with ``pd.read_csv``
+    and the result written to the cache for the next process.
+
+    Args:
+        path (str): Path to the source CSV file.
+        **read_csv_kwargs: Options forwarded to ``pd.read_csv``.
+
+    Returns:
+        pa.Table: Table backed by the memory-mapped cache file (or by memory if the cache could not be written).
+    """
+    stat = os.stat(path)
+    options_key = _options_key(read_csv_kwargs)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, options_key)
+
+    with _lock:
+        table = _tables.get(memo_key)
+        if table is not None:
+            return table
+
+        digest = source_digest(path)
+        target = cache_path_for(path, digest, options_key)
+
+        if os.path.exists(target):
+            try:
+                table = _map_table(target)
+            except (OSError, pa.ArrowInvalid) as e:
+                logger.warning(f"Discarding unreadable dataset cache '{target}': {e}")
+                table = None
+
+        if table is None:
+            logger.info(f"Dataset cache miss for '{path}', parsing CSV")
+            table = _to_arrow(pd.read_csv(path, **read_csv_kwargs))
+            try:
+                _write_cache(table, target)
+                _remove_stale(path, keep=target)
+                table = _map_table(target)
+            except OSError as e:
+                logger.warning(f"Failed to write dataset cache '{target}': {e}")
+
+        # Only the latest version of a file is kept resident
+        for key in [k for k in _tables if k[0] == memo_key[0]]:
+            del _tables[key]
+        _tables[memo_key] = table
+        return table
+
+
+def read_csv_cached(path: str, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Drop-in replacement for ``pd.read_csv`` backed by the Arrow dataset cache.
+
+    Args:
+        path (str): Path to the source CSV file.
+        **read_csv_kwargs: Options forwarded to ``pd.read_csv`` on a cache miss.
+
+    Returns:
+        pd.DataFrame: The parsed dataset.
+    """
+    return open_table(path, **read_csv_kwargs).to_pandas()
+
+
+def column_array(table: pa.Table, name: str) -> np.ndarray:
+    """
+    Returns a column of a cached table as a NumPy array, without copying when possible.
+
+    Args:
+        table (pa.Table): Table returned by ``open_table``.
+        name (str): Column name.
+
+    Returns:
+        np.ndarray: Column values (a read-only view into the mapped file for numeric columns).
+    """
+    column = table.column(name)
+    if column.num_chunks == 1 and column.null_count == 0:
+        try:
+            return column.chunk(0).to_numpy(zero_copy_only=True)
+        except pa.ArrowInvalid:
+            pass
+    return column.to_numpy()
+
+
+def clear_memory_cache():
+    """
+    Drops the in-process table memo; the on-disk cache is left untouched.
+    """
+    with _lock:
+        _tables.clear()
@@ -0,0 +1,118 @@
+# document_store.py
+
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+"""
+    Local chunk text store
+    - Keeps the text of every embedded chunk in SQLite, zlib-compressed, keyed by namespace and vector ID,
+      so vector metadata only carries IDs and small filterable fields
+    - Query results are hydrated with one batched read for all matched IDs
+    - Metadata values are trimmed to scalars of at most ``MAX_METADATA_CHARS`` characters
+"""
+
+DOCUMENT_STORE_DB = os.getenv("DOCUMENT_STORE_DB", ".document_store.sqlite")
+COMPRESSION_LEVEL = 6
+
+# SQLite's default limit on bound parameters is 999
+READ_BATCH_SIZE = 900
+
+MAX_METADATA_CHARS = 256
+
+# First byte of every stored body; lets another codec be added without rewriting existing rows
+CODEC_ZLIB = b"z"
+
+
+def slim_metadata(metadata: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Filterable copy of vector metadata: scalars and lists of strings, long strings cut to ``MAX_METADATA_CHARS``.
+    """
+    slim = {}
+    for key, value in metadata.items():
+        if isinstance(value, str):
+            slim[key] = value[:MAX_METADATA_CHARS]
+        elif isinstance(value, (bool, int, float)):
+            slim[key] = value
+        elif isinstance(value, (list, tuple)) and all(isinstance(item, str) for item in value):
+            slim[key] = [item[:MAX_METADATA_CHARS] for item in value]
+    return slim
+
+
+class DocumentStore:
+    """
+    Compressed chunk bodies by (namespace, vector ID).
+
+    Args:
+        path (str): SQLite database file; ``:memory:`` for a throwaway store.
+    """
+
+    def __init__(self, path: str = DOCUMENT_STORE_DB):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " namespace TEXT NOT NULL, id TEXT NOT NULL, size INTEGER NOT NULL, body BLOB NOT NULL,"
+            " PRIMARY KEY (namespace, id)) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def put_many(self, namespace: str, bodies: Mapping[str, str]):
+        rows = []
+        for id, text in bodies.items():
+            raw = text.encode("utf-8")
+            rows.append((namespace, id, len(raw), CODEC_ZLIB + zlib.compress(raw, COMPRESSION_LEVEL)))
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", rows)
+            self._connection.commit()
+
+    def get_many(self, namespace: str, ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Bodies of the given IDs that are stored; missing IDs are left out.
+        """
+        ids = list(dict.fromkeys(ids))
+        bodies = {}
+        with self._lock:
+            for start in range(0, len(ids), READ_BATCH_SIZE):
+                batch = ids[start:start + READ_BATCH_SIZE]
+                rows = self._connection.execute(
+                    f"SELECT id, body FROM chunks WHERE namespace = ? AND id IN ({','.join('?' * len(batch))})",
+                    (namespace, *batch)
+                )
+                for id, body in rows:
+                    bodies[id] = zlib.decompress(body[1:]).decode("utf-8")
+        return bodies
+
+    def delete(self, namespace: str, ids: Iterable[str]):
+        with self._lock:
+            self._connection.executemany("DELETE FROM chunks WHERE namespace = ? AND id = ?",
+                                         [(namespace, id) for id in ids])
+            self._connection.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Chunk count, text size and stored (compressed) size.
+        """
+        with self._lock:
+            count, raw, stored = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(body)), 0) FROM chunks"
+            ).fetchone()
+        return {"chunks": count, "text_bytes": raw, "stored_bytes": stored,
+                "compression_ratio": round(raw / stored, 2) if stored else 0.0}
+
+
+_store: Optional[DocumentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    """
+    The process-wide store, opened on first use.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DocumentStore()
+        return _store
@@ -0,0 +1,232 @@
+# embedding_cache.py
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+"""
+    Content-addressed embedding cache
+    - Embeddings are keyed by (model, sha256 of the text), so unchanged chunks are never embedded twice,
+      whatever document, namespace or chunk ID they come from
+    - Per model, vectors live in one append-only float32 file (row i = i-th stored text) next to an
+      append-only index of 32-byte digests and token counts; reads go through a memory map
+    - On open, a partially written tail (an interrupted append) is truncated away
+    - Instances and processes sharing a directory serialize appends with a file lock; row numbers are
+      taken from the vectors file, so another writer's appends never shift this instance's rows
+"""
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache")
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "1") != "0"
+
+DIGEST_BYTES = 32
+# Index record: sha256 digest followed by the text's token count
+INDEX_RECORD = np.dtype([("digest", f"S{DIGEST_BYTES}"), ("tokens", "<u4")])
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class _ModelStore:
+    """
+    Vectors of one model: ``vectors.f32``, ``index.bin`` and ``meta.json`` in one directory.
+
+    Several caches (threads' instances or processes) may share the directory: appends and tail repairs
+    hold an exclusive ``flock`` on ``.lock``, and rows written by others are picked up under that lock.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.index_path = os.path.join(directory, "index.bin")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.lock_path = os.path.join(directory, ".lock")
+        self.dimensions: Optional[int] = None
+        self.rows: Dict[bytes, Tuple[int, int]] = {}
+        # Index records read so far; the records after it were appended by other writers
+        self._loaded = 0
+        self._map: Optional[np.memmap] = None
+
+        if os.path.exists(self.meta_path):
+            with self._locked():
+                self._load()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        """
+        Reads the index records appended since the last call; must hold the lock.
+        """
+        if self.dimensions is None:
+            if not os.path.exists(self.meta_path):
+                return
+            with open(self.meta_path) as f:
+                self.dimensions = json.load(f)["dimensions"]
+        row_bytes = self.dimensions * 4
+        records = os.path.getsize(self.index_path) // INDEX_RECORD.itemsize if os.path.exists(self.index_path) else 0
+        vectors = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        count = min(records, vectors)
+        # Under the lock a partial tail can only be an interrupted append
+        for path, size in ((self.index_path, count * INDEX_RECORD.itemsize), (self.vectors_path, count * row_bytes)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                logger.warning(f"Truncating {path} to {count} complete rows")
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        if count > self._loaded:
+            index = np.fromfile(self.index_path, dtype=INDEX_RECORD, count=count - self._loaded,
+                                offset=self._loaded * INDEX_RECORD.itemsize)
+            for row, record in enumerate(index, start=self._loaded):
+                # Fixed-width bytes fields drop trailing NULs on read; digests keep their full length
+                digest = bytes(record["digest"]).ljust(DIGEST_BYTES, b"\0")
+                self.rows.setdefault(digest, (row, int(record["tokens"])))
+        self._loaded = count
+
+    def get(self, digest: bytes) -> Optional[np.ndarray]:
+        row = self.rows.get(digest)
+        if row is None:
+            return None
+        if self._map is None or self._map.shape[0] <= row[0]:
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r").reshape(-1, self.dimensions)
+        return np.array(self._map[row[0]])
+
+    def append(self, digests: List[bytes], vectors: np.ndarray, token_counts: List[int]) -> int:
+        """
+        Appends the vectors whose digests are not stored yet, also by other writers.
+
+        Returns:
+            int: Number of vectors written.
+        """
+        with self._locked():
+            self._load()
+            if self.dimensions is None:
+                self.dimensions = int(vectors.shape[1])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dimensions": self.dimensions}, f)
+            elif vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions}-dimensional embeddings, got {vectors.shape[1]}")
+
+            new = [i for i, digest in enumerate(digests) if digest not in self.rows]
+            if not new:
+                return 0
+            # Row numbers come from the file, which other instances and processes append to as well
+            first = os.path.getsize(self.vectors_path) // (self.dimensions * 4) if os.path.exists(self.vectors_path) else 0
+
+            # Vectors first: an index record is only ever written for a complete row
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors[new], dtype=np.float32).tobytes())
+            records = np.array([(digests[i], token_counts[i]) for i in new], dtype=INDEX_RECORD)
+            with open(self.index_path, "ab") as f:
+                f.write(records.tobytes())
+            for row, i in enumerate(new, start=first):
+                self.rows[digests[i]] = (row, token_counts[i])
+            self._loaded = first + len(new)
+            return len(new)
+
+
+class EmbeddingCache:
+    """
+    Persistent embeddings keyed by model and text content.
+
+    Args:
+        path (str): Cache directory, one sub-directory per model.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_DIR):
+        self.path = path
+        self._stores: Dict[str, _ModelStore] = {}
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "hits": 0, "misses": 0, "stored": 0, "tokens_saved": 0}
+
+    def _store(self, model: str) -> _ModelStore:
+        store = self._stores.get(model)
+        if store is None:
+            store = _ModelStore(os.path.join(self.path, re.sub(r"[^\w.-]+", "_", model)))
+            self._stores[model] = store
+        return store
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Cached embeddings of ``texts``; None for the texts that are not cached.
+        """
+        with self._lock:
+            store = self._store(model)
+            embeddings = []
+            for text in texts:
+                digest = text_digest(text)
+                vector = store.get(digest)
+                self._counters["lookups"] += 1
+                if vector is None:
+                    self._counters["misses"] += 1
+                    embeddings.append(None)
+                else:
+                    self._counters["hits"] += 1
+                    self._counters["tokens_saved"] += store.rows[digest][1]
+                    embeddings.append(vector.tolist())
+            return embeddings
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]], token_counts: Sequence[int]):
+        """
+        Stores new embeddings; texts already cached are skipped.
+
+        Args:
+            model (str): Model that produced the embeddings.
+            texts (Sequence[str]): Embedded texts.
+            embeddings (Sequence[Sequence[float]]): One embedding per text.
+            token_counts (Sequence[int]): Tokens per text, credited as saved on later hits.
+        """
+        with self._lock:
+            store = self._store(model)
+            new: Dict[bytes, Tuple[Sequence[float], int]] = {}
+            for text, embedding, tokens in zip(texts, embeddings, token_counts):
+                digest = text_digest(text)
+                if digest not in store.rows:
+                    new[digest] = (embedding, tokens)
+            if not new:
+                return
+            self._counters["stored"] += store.append(
+                list(new), np.array([embedding for embedding, _ in new.values()], dtype=np.float32),
+                [tokens for _, tokens in new.values()])
+
+    def stats(self) -> Dict:
+        """
+        Lookup counters since start-up, the hit ratio, embedding tokens not sent to the API, and the
+        number of cached embeddings.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["hit_ratio"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+            stats["entries"] = {model: len(store.rows) for model, store in self._stores.items()}
+            return stats
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    The process-wide cache, or None when disabled with ``EMBEDDING_CACHE=0``.
+    """
+    global _cache
+    if not EMBEDDING_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
@@ -0,0 +1,286 @@
+# embeddings.py
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import openai
+import tiktoken
+from tenacity import retry, stop_after_attempt, wait_exponential
+
+from embedding_cache import EmbeddingCache, get_embedding_cache
+
+"""
+    Batched embeddings
+    - Packs many chunks into each Embedding.create request, up to the model's input-count and
+      per-request token limits, instead of one HTTP round trip per chunk
+    - Runs several requests concurrently, all drawing from one shared requests/tokens-per-minute
+      rate limiter so concurrency cannot push the account over its quota
+    - Texts already in the embedding cache (embedding_cache.py), or repeated within a call, are not sent
+    - Shared by both OpenAIClient implementations (OpenAIClient.py and openai_client.py); ``aembed_texts`` is
+      the asyncio equivalent used by async_openai_client.py, drawing from the same rate limiter and cache
+"""
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# API limits for a single embeddings request
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300000
+
+# Account quota; override to match your tier
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", "3000"))
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", "1000000"))
+
+MAX_CONCURRENT_REQUESTS = 4
+
+
+class RateLimiter:
+    """
+    Thread-safe token buckets for requests and tokens per minute.
+
+    Args:
+        requests_per_minute (int): Request quota.
+        tokens_per_minute (int): Token quota.
+        clock (Callable[[], float]): Monotonic time source in seconds.
+        sleep (Callable[[float], None]): Sleep function.
+    """
+
+    def __init__(self, requests_per_minute: int = EMBEDDING_RPM, tokens_per_minute: int = EMBEDDING_TPM,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._requests = min(float(self.requests_per_minute), self._requests + elapsed * self.requests_per_minute / 60.0)
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60.0)
+
+    def _take(self, tokens: int) -> float:
+        """
+        Takes one request of ``tokens`` tokens if it fits, returning 0, or returns the seconds to wait.
+        """
+        # A request larger than the whole bucket would never fit; let it through once the bucket is full
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._lock:
+            self._refill()
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return 0.0
+            return max((1 - self._requests) * 60.0 / self.requests_per_minute,
+                       (tokens - self._tokens) * 60.0 / self.tokens_per_minute, 0.001)
+
+    def acquire(self, tokens: int):
+        """
+        Blocks until one request of ``tokens`` tokens fits in the quota, then takes it.
+        """
+        while (wait := self._take(tokens)) > 0:
+            self.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        """
+        ``acquire`` without blocking the event loop.
+        """
+        while (wait := self._take(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+
+_rate_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    The process-wide embeddings rate limiter.
+    """
+    return _rate_limiter
+
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    The cl100k_base encoding, loaded once per process.
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return _encoding
+
+
+def count_tokens(texts: Sequence[str]) -> List[int]:
+    return [len(tokens) for tokens in get_encoding().encode_ordinary_batch(list(texts))]
+
+
+def pack_batches(token_counts: Sequence[int], max_inputs: int = MAX_INPUTS_PER_REQUEST,
+                 max_tokens: int = MAX_TOKENS_PER_REQUEST) -> List[List[int]]:
+    """
+    Groups inputs, in order, into requests that respect the input-count and token limits.
+
+    Args:
+        token_counts (Sequence[int]): Tokens per input.
+        max_inputs (int): Maximum inputs per request.
+        max_tokens (int): Maximum total tokens per request.
+
+    Returns:
+        List[List[int]]: Input positions per request.
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    total = 0
+    for position, count in enumerate(token_counts):
+        if batch and (len(batch) >= max_inputs or total + count > max_tokens):
+            batches.append(batch)
+            batch, total = [], 0
+        batch.append(position)
+        total += count
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10))
+def _create(texts: List[str], model: str) -> List[List[float]]:
+    response = openai.Embedding.create(input=texts, model=model)
+    # The API returns one item per input, tagged with the input's position
+    data = sorted(response["data"], key=lambda item: item["index"])
+    return [item["embedding"] for item in data]
+
+
+@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10))
+async def _acreate(texts: List[str], model: str) -> List[List[float]]:
+    # Uses the aiohttp session in openai.aiosession when the caller has set one
+    response = await openai.Embedding.acreate(input=texts, model=model)
+    data = sorted(response["data"], key=lambda item: item["index"])
+    return [item["embedding"] for item in data]
+
+
+def _lookup(texts: Sequence[str], model: str, token_counts: Optional[Sequence[int]],
+            cache: Optional[EmbeddingCache]) -> Tuple[List[Optional[List[float]]], Dict[str, List[int]], List[str], List[int]]:
+    """
+    Cached embeddings by position, positions of each distinct uncached text, those texts, and their token counts.
+    """
+    embeddings: List[Optional[List[float]]] = cache.get_many(model, texts) if cache else [None] * len(texts)
+
+    # Each distinct uncached text is embedded once, however often it occurs
+    missing: Dict[str, List[int]] = {}
+    for position, (text, embedding) in enumerate(zip(texts, embeddings)):
+        if embedding is None:
+            missing.setdefault(text, []).append(position)
+    pending = list(missing)
+    if not pending:
+        return embeddings, missing, pending, []
+    counts = [token_counts[missing[text][0]] for text in pending] if token_counts is not None else count_tokens(pending)
+    return embeddings, missing, pending, counts
+
+
+def _fill(embeddings: List[Optional[List[float]]], missing: Dict[str, List[int]], pending: List[str],
+          fetched: List[List[float]], counts: List[int], model: str, cache: Optional[EmbeddingCache]) -> List[List[float]]:
+    for text, embedding in zip(pending, fetched):
+        for position in missing[text]:
+            embeddings[position] = embedding
+    if cache:
+        cache.put_many(model, pending, fetched, counts)
+    return embeddings
+
+
+def embed_texts(texts: Sequence[str], model: str = EMBEDDING_MODEL, max_workers: int = MAX_CONCURRENT_REQUESTS,
+                rate_limiter: Optional[RateLimiter] = None, token_counts: Optional[Sequence[int]] = None,
+                create: Callable[[List[str], str], List[List[float]]] = _create,
+                cache: Optional[EmbeddingCache] = None, use_cache: bool = True) -> List[List[float]]:
+    """
+    Embeds many texts with packed, concurrent requests, skipping texts that are already cached.
+
+    Args:
+        texts (Sequence[str]): Texts to embed, each within the model's per-input token limit.
+        model (str): Embedding model.
+        max_workers (int): Maximum requests in flight.
+        rate_limiter (RateLimiter): Quota shared with other callers; the process-wide one if None.
+        token_counts (Sequence[int]): Tokens per text, if already known.
+        create (Callable): Function performing one embeddings request.
+        cache (EmbeddingCache): Embedding cache; the process-wide one if None.
+        use_cache (bool): Whether to read and fill the cache at all.
+
+    Returns:
+        List[List[float]]: One embedding per text, in input order.
+    """
+    if not texts:
+        return []
+    cache = (cache or get_embedding_cache()) if use_cache else None
+    embeddings, missing, pending, counts = _lookup(texts, model, token_counts, cache)
+    if not pending:
+        return embeddings
+    fetched = _embed_uncached(pending, counts, model, max_workers, rate_limiter or get_rate_limiter(), create)
+    return _fill(embeddings, missing, pending, fetched, counts, model, cache)
+
+
+async def aembed_texts(texts: Sequence[str], model: str = EMBEDDING_MODEL, max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                       rate_limiter: Optional[RateLimiter] = None, token_counts: Optional[Sequence[int]] = None,
+                       acreate: Callable[[List[str], str], Awaitable[List[List[float]]]] = _acreate,
+                       cache: Optional[EmbeddingCache] = None, use_cache: bool = True) -> List[List[float]]:
+    """
+    ``embed_texts`` for asyncio: packed requests run as concurrent tasks instead of threads.
+
+    Args:
+        texts (Sequence[str]): Texts to embed, each within the model's per-input token limit.
+        model (str): Embedding model.
+        max_concurrency (int): Maximum requests in flight for this call.
+        rate_limiter (RateLimiter): Quota shared with other callers; the process-wide one if None.
+        token_counts (Sequence[int]): Tokens per text, if already known.
+        acreate (Callable): Coroutine function performing one embeddings request.
+        cache (EmbeddingCache): Embedding cache; the process-wide one if None.
+        use_cache (bool): Whether to read and fill the cache at all.
+
+    Returns:
+        List[List[float]]: One embedding per text, in input order.
+    """
+    if not texts:
+        return []
+    cache = (cache or get_embedding_cache()) if use_cache else None
+    embeddings, missing, pending, counts = _lookup(texts, model, token_counts, cache)
+    if not pending:
+        return embeddings
+    rate_limiter = rate_limiter or get_rate_limiter()
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def run(batch: List[int]) -> List[List[float]]:
+        async with slots:
+            await rate_limiter.acquire_async(sum(counts[position] for position in batch))
+            return await acreate([pending[position] for position in batch], model)
+
+    batches = pack_batches(counts)
+    fetched: List[Optional[List[float]]] = [None] * len(pending)
+    for batch, result in zip(batches, await asyncio.gather(*(run(batch) for batch in batches))):
+        for position, embedding in zip(batch, result):
+            fetched[position] = embedding
+    return _fill(embeddings, missing, pending, fetched, counts, model, cache)
+
+
+def _embed_uncached(texts: List[str], token_counts: List[int], model: str, max_workers: int,
+                    rate_limiter: RateLimiter, create: Callable[[List[str], str], List[List[float]]]) -> List[List[float]]:
+    def run(batch: List[int]) -> List[List[float]]:
+        rate_limiter.acquire(sum(token_counts[position] for position in batch))
+        return create([texts[position] for position in batch], model)
+
+    embeddings: List[Optional[List[float]]] = [None] * len(texts)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures: Dict[concurrent.futures.Future, List[int]] = {
+            executor.submit(run, batch): batch for batch in pack_batches(token_counts)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            for position, embedding in zip(futures[future], future.result()):
+                embeddings[position] = embedding
+    return embeddings
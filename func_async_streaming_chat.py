@@ -4,8 +4,7 @@ import functools
 import time
 from loguru import logger  # Importing loguru
 import aiohttp
-import openmeteo_requests
-import requests_cache
+from weather_tools import get_current_weather_async
 from openai import AsyncOpenAI
 from typing import Literal
 import asyncio
@@ -122,17 +121,8 @@ async def get_random_numbers(min: int, max: int, count: int) -> str:
 
 @log_function_call
 async def get_temperature(latitude: float, longitude: float) -> str:
-    cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    openmeteo = openmeteo_requests.Client(session=cache_session)
-
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "current_weather": True
-    }
-
-    response = await openmeteo.weather(params=params)
-    value = response['current_weather']['temperature']
+    current = await get_current_weather_async(latitude, longitude)
+    value = current['temperature']
     return json.dumps({"temperature": str(value)})
 
 
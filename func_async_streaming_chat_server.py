@@ -4,6 +4,7 @@ import asyncio
 import openai
 from typing import Any, Tuple
 from dotenv import load_dotenv
+from weather_tools import get_location_weather
 
 """
     Initialize the client
@@ -22,21 +23,12 @@ DEPLOYMENT_NAME = os.getenv("OPENAI_MODEL")
 
 """
     Get the current weather
-    - This function is hard coded weather values
-    - In production, this could be from your backend data or external API
+    - Resolves the location through the bundled gazetteer (see locations.py)
+    - Fetches the weather through the cached Open-Meteo client (see weather_tools.py)
 """
 def get_current_weather(location, unit="fahrenheit"):
     """Get the current weather in a given location"""
-    if "tokyo" in location.lower():
-        return json.dumps({"location": "Tokyo", "temperature": "10", "unit": unit})
-    elif "san francisco" in location.lower():
-        return json.dumps(
-            {"location": "San Francisco", "temperature": "72", "unit": unit}
-        )
-    elif "paris" in location.lower():
-        return json.dumps({"location": "Paris", "temperature": "22", "unit": unit})
-    else:
-        return json.dumps({"location": location, "temperature": "unknown"})
+    return get_location_weather(location, unit)
 
 """
     Initialize messages
@@ -1,23 +1,13 @@
-import json
 from utils import get_function_and_args, setup_client
+from weather_tools import get_location_weather
 
 # Set up the OpenAI client, get the deployment name
 client, DEPLOYMENT_NAME = setup_client()
 
-# Example function hard coded to return the same weather
-# In production, this could be your backend API or an external API
+# Resolves the location through the bundled gazetteer and fetches its current weather
 def get_current_weather(location, unit="fahrenheit"):
     """Get the current weather in a given location"""
-    if "tokyo" in location.lower():
-        return json.dumps({"location": "Tokyo", "temperature": "10", "unit": unit})
-    elif "san francisco" in location.lower():
-        return json.dumps(
-            {"location": "San Francisco", "temperature": "72", "unit": unit}
-        )
-    elif "paris" in location.lower():
-        return json.dumps({"location": "Paris", "temperature": "22", "unit": unit})
-    else:
-        return json.dumps({"location": location, "temperature": "unknown"})
+    return get_location_weather(location, unit)
 
 
 def run_conversation():
@@ -3,6 +3,7 @@ import json
 import asyncio
 import openai
 from dotenv import load_dotenv
+from weather_tools import get_location_weather
 
 # Setup the OpenAI client to use either Azure, OpenAI or Ollama API
 load_dotenv()
@@ -25,20 +26,10 @@ elif API_HOST == "ollama":
     )
     DEPLOYMENT_NAME = os.getenv("OLLAMA_MODEL")
 
-# Example function hard coded to return the same weather
-# In production, this could be your backend API or an external API
+# Resolves the location through the bundled gazetteer and fetches its current weather
 def get_current_weather(location, unit="fahrenheit"):
     """Get the current weather in a given location"""
-    if "tokyo" in location.lower():
-        return json.dumps({"location": "Tokyo", "temperature": "10", "unit": unit})
-    elif "san francisco" in location.lower():
-        return json.dumps(
-            {"location": "San Francisco", "temperature": "72", "unit": unit}
-        )
-    elif "paris" in location.lower():
-        return json.dumps({"location": "Paris", "temperature": "22", "unit": unit})
-    else:
-        return json.dumps({"location": location, "temperature": "unknown"})
+    return get_location_weather(location, unit)
 
 
 def get_tool_calls(stream):
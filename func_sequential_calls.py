@@ -1,18 +1,27 @@
 import json
 import math
-import pandas as pd
+import numpy as np
 import pytz
 from datetime import datetime
 from utils import check_args, setup_client
+from market_data import available_indices, get_market_store, to_day
+from market_analytics import get_analytics_functions, get_analytics_tools
+from timeseries_budget import AGGREGATIONS, DEFAULT_MAX_TOKENS, MIN_POINTS, fit_series
+from weather_tools import get_current_weather, get_weather_functions, get_weather_tools, weather_cache
+from weather_history import get_history_store
+from locations import resolve_timezone
+from cache_warmer import get_call_log, start_cache_warmer
 from loguru import logger
-import requests
 
 # Set up the OpenAI client, get the deployment name
 client, DEPLOYMENT_NAME = setup_client()
 
 def get_current_time(location):
     try:
-        timezone = pytz.timezone(location)
+        # Accepts IANA zone names as well as place names ("Tokyo", "San Francisco, CA")
+        timezone = resolve_timezone(location)
+        if timezone is None:
+            raise pytz.UnknownTimeZoneError(location)
         now = datetime.now(timezone)
         current_time = now.strftime("%I:%M:%S %p")
         return current_time
@@ -20,53 +29,32 @@ def get_current_time(location):
         logger.error(f"Failed to get timezone for location '{location}': {e}")
         return "Sorry, I couldn't find the timezone for that location."
 
-def get_stock_market_data(index, start_date=None, end_date=None):
-    available_indices = [
-        "Natural_Gas_Price", "Natural_Gas_Vol.", "Crude_oil_Price", "Crude_oil_Vol.",
-        "Copper_Price", "Copper_Vol.", "Bitcoin_Price", "Bitcoin_Vol.", "Platinum_Price", 
-        "Platinum_Vol.", "Ethereum_Price", "Ethereum_Vol.", "S&P_500_Price", "Nasdaq_100_Price",
-        "Nasdaq_100_Vol.", "Apple_Price", "Apple_Vol.", "Tesla_Price", "Tesla_Vol.", 
-        "Microsoft_Price", "Microsoft_Vol.", "Silver_Price", "Silver_Vol.", "Google_Price", 
-        "Google_Vol.", "Nvidia_Price", "Nvidia_Vol.", "Berkshire_Price", "Berkshire_Vol.", 
-        "Netflix_Price", "Netflix_Vol.", "Amazon_Price", "Amazon_Vol.", "Meta_Price", 
-        "Meta_Vol.", "Gold_Price", "Gold_Vol."
-    ]
-
-    if index not in available_indices:
+def get_stock_market_data(index, start_date=None, end_date=None, max_points=None, max_tokens=None, aggregation="auto"):
+    if index not in available_indices():
         logger.warning(f"Invalid index provided: {index}")
-        return f"Invalid index. Please choose from available indices: {', '.join(available_indices)}"
+        return f"Invalid index. Please choose from available indices: {', '.join(available_indices())}"
+
+    if aggregation not in AGGREGATIONS:
+        return f"Invalid aggregation. Please choose from: {', '.join(AGGREGATIONS)}"
+
+    if max_points is not None and max_points < MIN_POINTS:
+        return f"Invalid max_points. Please request at least {MIN_POINTS} points."
 
     try:
-        # Load the CSV file and ensure 'Date' is parsed as a datetime object with specified format
-        data = pd.read_csv('data/Stock Market Dataset.csv', parse_dates=["Date"], dayfirst=True)
-        
-        # Convert start_date and end_date to Timestamps for proper comparison
-        if start_date:
-            start_date = pd.to_datetime(start_date, errors='coerce')
-        if end_date:
-            end_date = pd.to_datetime(end_date, errors='coerce')
-
-        # Validate that dates are properly parsed
-        if start_date is pd.NaT or end_date is pd.NaT:
+        # Slice the resident market store; dates are validated while locating the window
+        try:
+            dates, values = get_market_store().select([index], start_date, end_date)
+        except ValueError:
             return "Invalid date format. Please use YYYY-MM-DD."
 
-        # Filter data for the given index and optional date range
-        if start_date and end_date:
-            # Ensure the 'Date' column and the provided dates are of the same type (datetime)
-            mask = (data["Date"] >= start_date) & (data["Date"] <= end_date)
-            data_filtered = data.loc[mask, ["Date", index]]
-        else:
-            data_filtered = data[["Date", index]]
-        
         # Check if the filtered data is empty
-        if data_filtered.empty:
+        if len(dates) == 0:
             return f"No data available for index '{index}' in the given date range."
 
-        # Convert the DataFrame into a dictionary (Date as key, index values as values)
-        data_filtered["Date"] = data_filtered["Date"].dt.strftime('%Y-%m-%d')
-        data_dict = data_filtered.set_index("Date")[index].to_dict()
-        
-        return json.dumps(data_dict, indent=4)
+        # Keep the response inside the budget so it doesn't flood every later turn
+        if max_points is None and max_tokens is None:
+            max_tokens = DEFAULT_MAX_TOKENS
+        return fit_series(index, dates, values[:, 0], max_points=max_points, max_tokens=max_tokens, aggregation=aggregation)
     
     except Exception as e:
         logger.error(f"Failed to retrieve stock data for index '{index}': {e}")
@@ -100,17 +88,8 @@ def calculator(num1, num2, operator):
 
 def get_temperature(latitude: float, longitude: float) -> str:
     try:
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": latitude,
-            "longitude": longitude,
-            "current_weather": True
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-
-        weather_data = response.json()
-        temperature = weather_data.get("current_weather", {}).get("temperature", "N/A")
+        current = get_current_weather(latitude, longitude)
+        temperature = (current or {}).get("temperature", "N/A")
         return json.dumps({"temperature": temperature}, indent=4)
     except Exception as e:
         logger.error(f"Failed to fetch temperature: {e}")
@@ -118,43 +97,96 @@ def get_temperature(latitude: float, longitude: float) -> str:
 
 def get_historical_temperature(latitude: float, longitude: float, start_date: str, end_date: str) -> str:
     try:
-        url = "https://archive-api.open-meteo.com/v1/archive"
-        params = {
-            "latitude": latitude,
-            "longitude": longitude,
-            "start_date": start_date,
-            "end_date": end_date,
-            "daily": "temperature_2m_max,temperature_2m_min",
-            "timezone": "auto"
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-
-        weather_data = response.json()
-        temperature_data = weather_data.get("daily", {})
+        # Served from the local daily store; only days not stored yet are fetched from the archive
+        temperature_data = get_history_store().get_daily(latitude, longitude, start_date, end_date)
         return json.dumps({"temperature_data": temperature_data}, indent=4)
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD."
     except Exception as e:
         logger.error(f"Failed to fetch historical temperature data: {e}")
         return "Error in retrieving historical temperature data."
 
-def calculate_difference(index, date1, date2):
+PAIR_FIELDS = ("index", "date1", "date2")
+
+def _pair_error(pair, list_indices=False):
+    # Checked per pair, so one malformed pair does not fail the whole batch
+    if not isinstance(pair, dict):
+        return "Each pair must be an object with index, date1 and date2."
+    missing = [field for field in PAIR_FIELDS if not pair.get(field)]
+    if missing:
+        return f"Missing required field{'s' if len(missing) > 1 else ''}: {', '.join(missing)}."
+    if pair["index"] not in available_indices():
+        if list_indices:
+            return f"Invalid index. Please choose from available indices: {', '.join(available_indices())}"
+        return f"Invalid index '{pair['index']}'."
     try:
-        data = pd.read_csv('/mnt/data/Stock Market Dataset.csv', parse_dates=["Date"])
-        data_filtered = data[data["Date"].isin([pd.to_datetime(date1), pd.to_datetime(date2)])]
-        
-        if data_filtered.empty or len(data_filtered) < 2:
+        to_day(pair["date1"]), to_day(pair["date2"])
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD."
+    return None
+
+def calculate_difference(index=None, date1=None, date2=None, pairs=None):
+    # A single (index, date1, date2) lookup, or many of them at once through 'pairs'
+    single = pairs is None
+    if single:
+        pairs = [{"index": index, "date1": date1, "date2": date2}]
+
+    try:
+        if not pairs:
             return "Insufficient data to calculate difference."
-        
-        price1 = data_filtered[data_filtered["Date"] == pd.to_datetime(date1)][index].values[0]
-        price2 = data_filtered[data_filtered["Date"] == pd.to_datetime(date2)][index].values[0]
-        
-        difference = price2 - price1
-        return json.dumps({"difference": difference}, indent=4)
+        # A batch names the bad index only; the full list would be repeated for every bad pair
+        errors = [_pair_error(pair, list_indices=single) for pair in pairs]
+        if any(errors):
+            logger.warning(f"Invalid difference pairs: {[error for error in errors if error]}")
+        if single and errors[0]:
+            return errors[0]
+        valid = [pair for pair, error in zip(pairs, errors) if not error]
+
+        # Resolve every requested date in one vectorized lookup; non-trading days fall back to the prior session
+        count = len(valid)
+        if count:
+            indices = [pair["index"] for pair in valid]
+            sessions, values = get_market_store().locate(
+                indices + indices,
+                [pair["date1"] for pair in valid] + [pair["date2"] for pair in valid]
+            )
+            differences = values[count:] - values[:count]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                changes = differences / values[:count] * 100.0
+
+        def _value(x, digits=4):
+            return None if np.isnan(x) else round(float(x), digits)
+
+        results = []
+        i = 0
+        for pair, error in zip(pairs, errors):
+            if error:
+                results.append({"index": pair.get("index") if isinstance(pair, dict) else None, "error": error})
+                continue
+            if np.isnan(differences[i]):
+                results.append({"index": pair["index"], "error": "Insufficient data to calculate difference."})
+            else:
+                results.append({
+                    "index": pair["index"],
+                    "date1": str(sessions[i]), "value1": _value(values[i]),
+                    "date2": str(sessions[count + i]), "value2": _value(values[count + i]),
+                    "difference": _value(differences[i]),
+                    "change_pct": _value(changes[i], 2),
+                })
+            i += 1
+
+        if single:
+            if "error" in results[0]:
+                return results[0]["error"]
+            return json.dumps(results[0], indent=4)
+        return json.dumps({"results": results}, separators=(",", ":"))
     except Exception as e:
-        logger.error(f"Failed to calculate difference for index '{index}': {e}")
+        logger.error(f"Failed to calculate difference for index '{index or pairs}': {e}")
         return "Error in calculating difference."
 
 def get_tools():
+    # Every series in the market store, across all bundled data files
+    indices = available_indices()
     return [
         {
             "type": "function",
@@ -166,7 +198,7 @@ def get_tools():
                     "properties": {
                         "location": {
                             "type": "string",
-                            "description": "The location name. The pytz is used to get the timezone for that location.",
+                            "description": "The location name, e.g. Tokyo or San Francisco, CA, or an IANA timezone name like Europe/Paris.",
                         }
                     },
                     "required": ["location"],
@@ -177,22 +209,13 @@ def get_tools():
             "type": "function",
             "function": {
                 "name": "get_stock_market_data",
-                "description": "Get the stock market data for a given index and optional date range",
+                "description": "Get the stock market data for a given index and optional date range. Long ranges are aggregated (weekly/monthly/quarterly OHLC, or sums for volumes) or downsampled to fit the budget; the response states the aggregation applied.",
                 "parameters": {
                     "type": "object",
                     "properties": {
                         "index": {
                             "type": "string",
-                            "enum": [
-                                "Natural_Gas_Price", "Natural_Gas_Vol.", "Crude_oil_Price", "Crude_oil_Vol.",
-                                "Copper_Price", "Copper_Vol.", "Bitcoin_Price", "Bitcoin_Vol.", "Platinum_Price", 
-                                "Platinum_Vol.", "Ethereum_Price", "Ethereum_Vol.", "S&P_500_Price", "Nasdaq_100_Price",
-                                "Nasdaq_100_Vol.", "Apple_Price", "Apple_Vol.", "Tesla_Price", "Tesla_Vol.", 
-                                "Microsoft_Price", "Microsoft_Vol.", "Silver_Price", "Silver_Vol.", "Google_Price", 
-                                "Google_Vol.", "Nvidia_Price", "Nvidia_Vol.", "Berkshire_Price", "Berkshire_Vol.", 
-                                "Netflix_Price", "Netflix_Vol.", "Amazon_Price", "Amazon_Vol.", "Meta_Price", 
-                                "Meta_Vol.", "Gold_Price", "Gold_Vol."
-                            ],
+                            "enum": indices,
                         },
                         "start_date": {
                             "type": "string",
@@ -201,12 +224,63 @@ def get_tools():
                         "end_date": {
                             "type": "string",
                             "description": "The end date for the data (in YYYY-MM-DD format). Optional.",
+                        },
+                        "max_points": {
+                            "type": "integer",
+                            "minimum": MIN_POINTS,
+                            "description": "Maximum number of data points to return. Optional.",
+                        },
+                        "max_tokens": {
+                            "type": "integer",
+                            "description": f"Approximate maximum size of the response in tokens. Optional, defaults to {DEFAULT_MAX_TOKENS} when no budget is given.",
+                        },
+                        "aggregation": {
+                            "type": "string",
+                            "enum": AGGREGATIONS,
+                            "description": "How to reduce the data: 'auto' picks the finest representation that fits the budget, 'none' returns every day, 'lttb' downsamples while preserving the shape. Optional.",
                         }
                     },
                     "required": ["index"],
                 },
             },
         },
+        {
+            "type": "function",
+            "function": {
+                "name": "calculate_difference",
+                "description": "Calculate the change of an index between two dates. Dates that are not trading days resolve to the previous trading day. Use 'pairs' to calculate many differences in one call.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "index": {
+                            "type": "string",
+                            "enum": indices,
+                        },
+                        "date1": {
+                            "type": "string",
+                            "description": "The earlier date (in YYYY-MM-DD format).",
+                        },
+                        "date2": {
+                            "type": "string",
+                            "description": "The later date (in YYYY-MM-DD format).",
+                        },
+                        "pairs": {
+                            "type": "array",
+                            "description": "Several (index, date1, date2) lookups to answer at once. Use instead of index/date1/date2.",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "index": {"type": "string", "enum": indices},
+                                    "date1": {"type": "string"},
+                                    "date2": {"type": "string"},
+                                },
+                                "required": ["index", "date1", "date2"],
+                            },
+                        }
+                    },
+                },
+            },
+        },
         {
             "type": "function",
             "function": {
@@ -276,15 +350,18 @@ def get_tools():
                 }
             }
         }
-    ]
+    ] + get_analytics_tools() + get_weather_tools()
 
 def get_available_functions():
     return {
         "get_current_time": get_current_time,
         "get_stock_market_data": get_stock_market_data,
+        "calculate_difference": calculate_difference,
         "calculator": calculator,
         "get_temperature": get_temperature,
-        "get_historical_temperature": get_historical_temperature
+        "get_historical_temperature": get_historical_temperature,
+        **get_analytics_functions(),
+        **get_weather_functions()
     }
 
 def run_multiturn_conversation(messages, tools, available_functions):
@@ -312,7 +389,8 @@ def run_multiturn_conversation(messages, tools, available_functions):
         if not check_args(function_to_call, function_args):
             return f"Invalid number of arguments for function: {function_name}"
 
-        # Call the function
+        # Call the function; the call log feeds the cache warmer
+        get_call_log().record(function_name, function_args)
         function_response = function_to_call(**function_args)
 
         # Add the function call and response to the messages
@@ -361,13 +439,16 @@ def trim_messages(messages, max_tokens=29000):
         current_tokens += message_length
     return trimmed_messages
 
+# Refresh the cache entries of popular weather and market lookups in the background
+start_cache_warmer(weather_cache, ["get_stock_market_data", "calculate_difference", *get_analytics_functions()])
+
 # Get the user's question as input
 user_question = input("Please enter your question: ")
 
 next_messages = [
     {
         "role": "system",
-        "content": "Assistant is a helpful assistant that helps users get answers to questions. Assistant has access to several tools and sometimes you may need to call multiple tools in sequence to get answers for your users.",
+        "content": "Assistant is a helpful assistant that helps users get answers to questions. Assistant has access to several tools and sometimes you may need to call multiple tools in sequence to get answers for your users. Prefer the market analytics tools over fetching raw prices and using the calculator.",
     }
 ]
 next_messages.append(
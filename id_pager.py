@@ -0,0 +1,160 @@
+# id_pager.py
+
+import asyncio
+import concurrent.futures
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+"""
+    Paged vector ID listing
+    - An ``IDPager`` walks the pages of one (index, namespace, prefix, page size) listing lazily, sync or
+      async, and can start from any pagination token
+    - While a page is consumed the next one is fetched in the background
+    - Visited pages are cached by token, so going back, or a Streamlit rerun, does not fetch again;
+      pagers live in a process-wide registry and are dropped when their namespace is written to
+"""
+
+PAGE_CACHE_PAGES = 64
+PREFETCH_WORKERS = 2
+
+# Fetches one page: pagination token -> (ids, next token or None)
+ListPage = Callable[[Optional[str]], Tuple[List[str], Optional[str]]]
+
+
+@dataclass(frozen=True)
+class Page:
+    token: Optional[str]
+    ids: List[str]
+    next_token: Optional[str]
+
+
+_prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="id-prefetch")
+
+
+class IDPager:
+    """
+    Lazily fetched, prefetched and cached pages of one ID listing.
+
+    Args:
+        list_page (ListPage): Fetches the page at a pagination token.
+        prefetch (bool): Fetch the next page in the background whenever a page is returned.
+        cache_pages (int): Pages kept for back-navigation, least recently used dropped first.
+    """
+
+    def __init__(self, list_page: ListPage, prefetch: bool = True, cache_pages: int = PAGE_CACHE_PAGES):
+        self.list_page = list_page
+        self.prefetch = prefetch
+        self.cache_pages = cache_pages
+        self._pages: "OrderedDict[Optional[str], Page]" = OrderedDict()
+        self._pending: Dict[Optional[str], concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def _fetch(self, token: Optional[str]) -> Page:
+        ids, next_token = self.list_page(token)
+        page = Page(token, ids, next_token)
+        with self._lock:
+            self.fetches += 1
+            self._pages[token] = page
+            self._pages.move_to_end(token)
+            while len(self._pages) > self.cache_pages:
+                self._pages.popitem(last=False)
+            self._pending.pop(token, None)
+        return page
+
+    def _prefetch(self, token: Optional[str]):
+        with self._lock:
+            if token in self._pages or token in self._pending:
+                return
+            self._pending[token] = _prefetch_executor.submit(self._fetch, token)
+
+    def page(self, token: Optional[str] = None) -> Page:
+        """
+        The page at ``token`` (the first page if None), from the cache, an in-flight prefetch, or the index.
+        """
+        with self._lock:
+            page = self._pages.get(token)
+            if page is not None:
+                self._pages.move_to_end(token)
+            pending = self._pending.get(token)
+        if page is None:
+            try:
+                page = pending.result() if pending else self._fetch(token)
+            except Exception:
+                with self._lock:
+                    self._pending.pop(token, None)
+                raise
+        if self.prefetch and page.next_token:
+            self._prefetch(page.next_token)
+        return page
+
+    def __iter__(self) -> Iterator[Page]:
+        return self.pages()
+
+    def pages(self, start_token: Optional[str] = None) -> Iterator[Page]:
+        """
+        Pages from ``start_token`` to the end of the listing.
+        """
+        token = start_token
+        while True:
+            page = self.page(token)
+            yield page
+            if not page.next_token:
+                return
+            token = page.next_token
+
+    def ids(self, start_token: Optional[str] = None) -> Iterator[str]:
+        for page in self.pages(start_token):
+            yield from page.ids
+
+    async def apage(self, token: Optional[str] = None) -> Page:
+        return await asyncio.get_running_loop().run_in_executor(None, self.page, token)
+
+    async def apages(self, start_token: Optional[str] = None) -> AsyncIterator[Page]:
+        """
+        ``pages`` for async callers; fetches run on the event loop's default executor.
+        """
+        token = start_token
+        while True:
+            page = await self.apage(token)
+            yield page
+            if not page.next_token:
+                return
+            token = page.next_token
+
+    def __aiter__(self) -> AsyncIterator[Page]:
+        return self.apages()
+
+
+_pagers: Dict[Hashable, IDPager] = {}
+_pagers_lock = threading.Lock()
+
+
+def get_id_pager(index: Hashable, namespace: str, prefix: str, limit: int, list_page: ListPage) -> IDPager:
+    """
+    The registered pager of a listing, created on first use; ``list_page`` replaces the one it was created
+    with, so a pager outlives the client that created it.
+    """
+    key = (index, namespace, prefix, limit)
+    with _pagers_lock:
+        pager = _pagers.get(key)
+        if pager is None:
+            pager = _pagers[key] = IDPager(list_page)
+        pager.list_page = list_page
+        return pager
+
+
+def invalidate_id_pages(index: Hashable, namespace: str):
+    """
+    Drops the pagers of a namespace after vectors were added to or deleted from it.
+    """
+    with _pagers_lock:
+        stale = [key for key in _pagers if key[:2] == (index, namespace)]
+        for key in stale:
+            del _pagers[key]
+    if stale:
+        logger.debug(f"Dropped {len(stale)} cached ID listings of namespace '{namespace}'")
@@ -0,0 +1,317 @@
+# ingest_pipeline.py
+
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+from loguru import logger
+
+from chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, split_text
+from document_store import slim_metadata
+from embeddings import MAX_CONCURRENT_REQUESTS
+from sync_manifest import content_hash
+
+"""
+    Pipelined ingest
+    - Four long-lived stages, render -> chunk -> embed -> upsert, each with its own worker threads and
+      connected by bounded queues, so a spec ingests at the speed of its slowest stage instead of the sum
+      of all of them, and a fast stage cannot run far ahead of a slow one
+    - The embed stage sends up to ``EMBED_BATCH_SIZE`` chunks per call and the upsert stage writes up to
+      ``UPSERT_BATCH_SIZE`` vectors per call; a batch is sent when full or ``BATCH_WAIT_SECONDS`` after its
+      first item
+    - With the stored content hashes of a namespace, the chunk stage drops unchanged chunks before they
+      reach the embed stage
+    - Every job reports per-stage throughput, busy time and queue depth
+    - With a ``store`` callback, chunk text is handed to it before the upsert and vectors only carry slim
+      metadata; without one, the text goes into the vector metadata under "content"
+"""
+
+RENDER_WORKERS = 4
+CHUNK_WORKERS = 2
+EMBED_WORKERS = MAX_CONCURRENT_REQUESTS
+UPSERT_WORKERS = 5
+
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1024"))
+EMBED_BATCH_SIZE = 256
+UPSERT_BATCH_SIZE = 500
+BATCH_WAIT_SECONDS = 0.05
+
+STAGES = ("render", "chunk", "embed", "upsert")
+
+
+@dataclass
+class _Chunk:
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+    hash: str
+    embedding: Optional[List[float]] = None
+
+
+@dataclass
+class StageStats:
+    workers: int
+    processed: int = 0
+    failed: int = 0
+    calls: int = 0
+    busy_seconds: float = 0.0
+    max_queue_depth: int = 0
+
+
+@dataclass
+class IngestJob:
+    """
+    One ingest run: its callbacks, the stored hashes to skip against, and its counters.
+    """
+    render: Callable[[Any], Optional[Dict[str, Any]]]
+    embed: Callable[[List[str]], List[List[float]]]
+    upsert: Callable[[List[tuple]], None]
+    record: Callable[[Dict[str, str]], None]
+    store: Optional[Callable[[Dict[str, str]], None]]
+    chunk_size: int
+    chunk_overlap: int
+    stored: Mapping[str, str]
+    batch_sizes: Dict[str, int] = field(default_factory=dict)
+    hashes: Dict[str, str] = field(default_factory=dict)
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    upserted: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+    _outstanding: int = 0
+    _closed: bool = False
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    _done: threading.Event = field(default_factory=threading.Event)
+
+    def add(self, count: int):
+        with self._lock:
+            self._outstanding += count
+
+    def finish(self, count: int):
+        with self._lock:
+            self._outstanding -= count
+            if self._closed and self._outstanding == 0:
+                self.finished_at = time.perf_counter()
+                self._done.set()
+
+    def close(self):
+        self._closed = True
+        self.finish(0)
+
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Per-stage items, items/s over the job, busy seconds, utilization and maximum queue depth.
+        """
+        elapsed = max((self.finished_at or time.perf_counter()) - self.started_at, 1e-9)
+        return {
+            "seconds": round(elapsed, 3),
+            "upserted": self.upserted,
+            "failed": sum(stats.failed for stats in self.stages.values()),
+            "errors": self.errors[:10],
+            "stages": {
+                name: {
+                    "workers": stats.workers,
+                    "processed": stats.processed,
+                    "failed": stats.failed,
+                    "calls": stats.calls,
+                    "items_per_second": round(stats.processed / elapsed, 1),
+                    "busy_seconds": round(stats.busy_seconds, 3),
+                    "utilization": round(stats.busy_seconds / (elapsed * stats.workers), 3),
+                    "max_queue_depth": stats.max_queue_depth,
+                }
+                for name, stats in self.stages.items()
+            },
+        }
+
+
+class IngestPipeline:
+    """
+    Long-lived render/chunk/embed/upsert pipeline; jobs run one at a time.
+
+    Args:
+        workers (Dict[str, int]): Worker threads per stage, overriding the defaults.
+        queue_size (int): Capacity of each stage's input queue.
+        embed_batch_size (int): Maximum chunks per embed call.
+        upsert_batch_size (int): Maximum vectors per upsert call.
+    """
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None, queue_size: int = QUEUE_SIZE,
+                 embed_batch_size: int = EMBED_BATCH_SIZE, upsert_batch_size: int = UPSERT_BATCH_SIZE):
+        self.workers = {"render": RENDER_WORKERS, "chunk": CHUNK_WORKERS, "embed": EMBED_WORKERS,
+                        "upsert": UPSERT_WORKERS, **(workers or {})}
+        self.batch_sizes = {"embed": embed_batch_size, "upsert": upsert_batch_size}
+        self.queues: Dict[str, queue.Queue] = {stage: queue.Queue(maxsize=queue_size) for stage in STAGES}
+        self._handlers = {"render": self._render, "chunk": self._chunk, "embed": self._embed, "upsert": self._upsert}
+        self._run_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _start(self):
+        if self._threads:
+            return
+        for stage in STAGES:
+            for i in range(self.workers[stage]):
+                thread = threading.Thread(target=self._work, args=(stage,), name=f"ingest-{stage}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _put(self, job: IngestJob, stage: str, item: Any):
+        # Items travel with their job, so a worker never applies one job's callbacks to another's items
+        self.queues[stage].put((job, item))
+        stats = job.stages[stage]
+        stats.max_queue_depth = max(stats.max_queue_depth, self.queues[stage].qsize())
+
+    def _take(self, stage: str) -> List[tuple]:
+        """
+        The next (job, item), or for batching stages up to a batch of them arriving within the batch wait.
+        """
+        items = [self.queues[stage].get()]
+        size = items[0][0].batch_sizes.get(stage, 1)
+        deadline = time.monotonic() + BATCH_WAIT_SECONDS
+        while len(items) < size:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self.queues[stage].get(timeout=remaining) if remaining > 0 else self.queues[stage].get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _work(self, stage: str):
+        while True:
+            # Each job's items go to the handler separately, with that job's callbacks
+            batches: Dict[int, tuple] = {}
+            for job, item in self._take(stage):
+                batches.setdefault(id(job), (job, []))[1].append(item)
+            for job, items in batches.values():
+                self._process(stage, job, items)
+
+    def _process(self, stage: str, job: IngestJob, items: List[Any]):
+        start = time.perf_counter()
+        error = None
+        try:
+            # Handlers return how many units of work left the pipeline
+            finished = self._handlers[stage](job, items)
+        except Exception as e:
+            error = repr(e)
+            finished = len(items)
+            logger.warning(f"Ingest {stage} stage failed for {len(items)} items: {error}")
+        stats = job.stages[stage]
+        with job._lock:
+            stats.calls += 1
+            stats.busy_seconds += time.perf_counter() - start
+            if error is None:
+                stats.processed += len(items)
+            else:
+                stats.failed += len(items)
+                job.errors.append(f"{stage}: {error}")
+        job.finish(finished)
+
+    def _render(self, job: IngestJob, items: List[Any]):
+        document = job.render(items[0])
+        if document is None:
+            raise ValueError("nothing to ingest (render returned None)")
+        self._put(job, "chunk", document)
+        return 0
+
+    def _chunk(self, job: IngestJob, items: List[Dict[str, Any]]):
+        document = items[0]
+        fresh = []
+        for idx, text in enumerate(split_text(document["text"], max_tokens=job.chunk_size, overlap_tokens=job.chunk_overlap)):
+            chunk_id = f"{document['id']}_chunk_{idx}"
+            metadata = {**document.get("metadata", {}), "chunk_id": chunk_id}
+            digest = content_hash(text, metadata)
+            with job._lock:
+                job.hashes[chunk_id] = digest
+            if job.stored.get(chunk_id) != digest:
+                fresh.append(_Chunk(chunk_id, text, metadata, digest))
+        # The document's unit of work becomes one unit per chunk still to embed
+        job.add(len(fresh))
+        for chunk in fresh:
+            self._put(job, "embed", chunk)
+        return 1
+
+    def _embed(self, job: IngestJob, chunks: List[_Chunk]):
+        embeddings = job.embed([chunk.text for chunk in chunks])
+        if len(embeddings) != len(chunks):
+            raise ValueError(f"embed returned {len(embeddings)} embeddings for {len(chunks)} texts")
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk.embedding = embedding
+            self._put(job, "upsert", chunk)
+        return 0
+
+    def _upsert(self, job: IngestJob, chunks: List[_Chunk]):
+        if job.store is None:
+            job.upsert([(chunk.id, chunk.embedding, {"content": chunk.text, **chunk.metadata}) for chunk in chunks])
+        else:
+            # Bodies first, so a query never matches a vector whose text is not stored yet
+            job.store({chunk.id: chunk.text for chunk in chunks})
+            job.upsert([(chunk.id, chunk.embedding, slim_metadata(chunk.metadata)) for chunk in chunks])
+        job.record({chunk.id: chunk.hash for chunk in chunks})
+        with job._lock:
+            job.upserted += len(chunks)
+        return len(chunks)
+
+    def run(self, items: Iterable[Any], upsert: Callable[[List[tuple]], None], embed: Callable[[List[str]], List[List[float]]],
+            record: Callable[[Dict[str, str]], None] = lambda hashes: None,
+            store: Optional[Callable[[Dict[str, str]], None]] = None,
+            render: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None, stored: Optional[Mapping[str, str]] = None,
+            chunk_size: int = CHUNK_MAX_TOKENS, chunk_overlap: int = CHUNK_OVERLAP_TOKENS,
+            upsert_batch_size: Optional[int] = None) -> IngestJob:
+        """
+        Ingests items and waits for them to be upserted.
+
+        Args:
+            items (Iterable[Any]): Items to ingest; fed into the pipeline as the render queue has room.
+            upsert (Callable): Writes a batch of (id, embedding, metadata) vectors.
+            embed (Callable): Embeds a batch of texts.
+            record (Callable): Receives vector ID -> content hash for every upserted batch.
+            store (Callable): Receives vector ID -> chunk text before each upsert; the text is kept in the
+                vector metadata instead if None.
+            render (Callable): Turns an item into a document with "id", "text" and optional "metadata", or
+                None if it cannot; items are documents already if None.
+            stored (Mapping[str, str]): Vector ID -> content hash of vectors already stored; matching chunks
+                are skipped.
+            chunk_size (int): Maximum number of tokens per chunk.
+            chunk_overlap (int): Maximum tokens shared by consecutive chunks of a document.
+            upsert_batch_size (int): Maximum vectors per upsert call; the pipeline's default if None.
+
+        Returns:
+            IngestJob: The finished job; ``hashes`` holds every chunk produced and ``report()`` the stage stats.
+        """
+        with self._run_lock:
+            self._start()
+            job = IngestJob(render=render or (lambda item: item), embed=embed, upsert=upsert, record=record, store=store,
+                            chunk_size=chunk_size, chunk_overlap=chunk_overlap, stored=stored or {},
+                            batch_sizes={**self.batch_sizes, "upsert": upsert_batch_size or self.batch_sizes["upsert"]},
+                            stages={stage: StageStats(self.workers[stage]) for stage in STAGES})
+            try:
+                for item in items:
+                    job.add(1)
+                    self._put(job, "render", item)
+            finally:
+                # Also when ``items`` raises: what was fed still finishes under this job before the lock is released
+                job.close()
+                job._done.wait()
+            logger.info(f"Ingest finished: {job.report()}")
+            return job
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {stage: self.queues[stage].qsize() for stage in STAGES}
+
+
+_pipeline: Optional[IngestPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_ingest_pipeline() -> IngestPipeline:
+    """
+    The process-wide pipeline; its worker threads start with the first job.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = IngestPipeline()
+        return _pipeline
@@ -0,0 +1,172 @@
+# lexical_index.py
+
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+"""
+    Lexical (BM25) retrieval over chunk text
+    - A per-namespace inverted index in SQLite, filled from the same chunks the ingest pipeline embeds
+    - Identifiers are indexed whole and by part: ``listPets`` gives ``listpets``, ``list`` and ``pets``,
+      and ``page_token`` gives ``page_token``, ``page`` and ``token``, so exact operationIds and parameter
+      names match the way they are asked about
+    - ``reciprocal_rank_fusion`` merges the BM25 and vector rankings; a chunk ranked well by either one
+      rises, so a small ``top_k`` still contains the endpoint named in the question
+"""
+
+LEXICAL_INDEX_DB = os.getenv("LEXICAL_INDEX_DB", ".lexical_index.sqlite")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") != "0"
+
+# Candidates taken from each ranking before fusion, at least top_k
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# BM25 parameters and the reciprocal rank fusion constant, at their usual values
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+# SQLite's default limit on bound parameters is 999
+QUERY_TERMS_MAX = 64
+
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms of a text: every identifier, plus its camelCase/snake_case parts.
+    """
+    terms = []
+    for word in _WORD.findall(text):
+        lower = word.lower()
+        terms.append(lower)
+        parts = _PART.findall(word)
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Merges rankings of IDs by the sum of 1 / (k + rank) over the rankings each ID appears in.
+
+    Args:
+        rankings (Iterable[Sequence[str]]): IDs, best first, from each retriever.
+        k (int): Damping constant; larger values flatten the difference between top ranks.
+
+    Returns:
+        List[Tuple[str, float]]: (id, fused score) pairs, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking, start=1):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index by (namespace, chunk ID).
+
+    Args:
+        path (str): SQLite database file; ``:memory:`` for a throwaway index.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_DB):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " namespace TEXT NOT NULL, term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (namespace, term, id)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " namespace TEXT NOT NULL, id TEXT NOT NULL, length INTEGER NOT NULL,"
+            " PRIMARY KEY (namespace, id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS postings_by_id ON postings (namespace, id);"
+        )
+        self._connection.commit()
+
+    def _delete(self, namespace: str, ids: Iterable[str]):
+        rows = [(namespace, id) for id in ids]
+        self._connection.executemany("DELETE FROM postings WHERE namespace = ? AND id = ?", rows)
+        self._connection.executemany("DELETE FROM documents WHERE namespace = ? AND id = ?", rows)
+
+    def add_many(self, namespace: str, bodies: Mapping[str, str]):
+        """
+        Indexes chunks, replacing any earlier text indexed under the same IDs.
+        """
+        postings = []
+        documents = []
+        for id, text in bodies.items():
+            terms = tokenize(text)
+            documents.append((namespace, id, len(terms)))
+            postings.extend((namespace, term, id, tf) for term, tf in Counter(terms).items())
+        with self._lock:
+            self._delete(namespace, bodies)
+            self._connection.executemany("INSERT INTO documents VALUES (?, ?, ?)", documents)
+            self._connection.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", postings)
+            self._connection.commit()
+
+    def delete(self, namespace: str, ids: Iterable[str]):
+        with self._lock:
+            self._delete(namespace, ids)
+            self._connection.commit()
+
+    def has(self, namespace: str) -> bool:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT 1 FROM documents WHERE namespace = ? LIMIT 1", (namespace,)
+            ).fetchone() is not None
+
+    def search(self, namespace: str, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        The ``top_k`` chunks of a namespace with the highest BM25 score for a query.
+
+        Returns:
+            List[Tuple[str, float]]: (id, score) pairs, best first; empty if no term matches.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))[:QUERY_TERMS_MAX]
+        if not terms:
+            return []
+        with self._lock:
+            count, total = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM documents WHERE namespace = ?", (namespace,)
+            ).fetchone()
+            if not count:
+                return []
+            rows = self._connection.execute(
+                "SELECT p.term, p.id, p.tf, d.length FROM postings p"
+                " JOIN documents d ON d.namespace = p.namespace AND d.id = p.id"
+                f" WHERE p.namespace = ? AND p.term IN ({','.join('?' * len(terms))})",
+                (namespace, *terms)
+            ).fetchall()
+
+        frequencies = Counter(term for term, _, _, _ in rows)
+        average = total / count
+        scores: Dict[str, float] = {}
+        for term, id, tf, length in rows:
+            df = frequencies[term]
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average))
+            scores[id] = scores.get(id, 0.0) + idf * norm
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+_index: Optional[LexicalIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> LexicalIndex:
+    """
+    The process-wide index, opened on first use.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LexicalIndex()
+        return _index
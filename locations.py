@@ -0,0 +1,260 @@
+# locations.py
+
+import csv
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import tzinfo
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytz
+
+"""
+    Location resolution
+    - Resolves free-text place names ("tokyo", "San Francisco, CA", "Zürich", "Europe/Paris") to
+      coordinates and an IANA timezone, for the weather and time tools
+    - Backed by a bundled gazetteer (data/gazetteer.csv): a normalized-name hash index for exact
+      matches and a trigram index for misspellings
+    - Resolutions and pytz zone objects are memoized, so repeated names cost a dictionary lookup
+"""
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.csv"))
+
+# Minimum Dice similarity of trigram sets for a fuzzy match
+MIN_FUZZY_SCORE = 0.55
+
+RESOLVE_CACHE_SIZE = 65536
+
+# Full names of the regions the gazetteer stores as postal codes, accepted as qualifiers too
+REGION_NAMES: Dict[str, Dict[str, str]] = {
+    "US": {
+        "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California", "CO": "Colorado",
+        "CT": "Connecticut", "DE": "Delaware", "DC": "District of Columbia", "FL": "Florida", "GA": "Georgia",
+        "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa", "KS": "Kansas",
+        "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts",
+        "MI": "Michigan", "MN": "Minnesota", "MS": "Mississippi", "MO": "Missouri", "MT": "Montana",
+        "NE": "Nebraska", "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico",
+        "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma",
+        "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota",
+        "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington",
+        "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+    },
+    "CA": {
+        "AB": "Alberta", "BC": "British Columbia", "MB": "Manitoba", "NB": "New Brunswick",
+        "NL": "Newfoundland and Labrador", "NS": "Nova Scotia", "NT": "Northwest Territories", "NU": "Nunavut",
+        "ON": "Ontario", "PE": "Prince Edward Island", "QC": "Quebec", "SK": "Saskatchewan", "YT": "Yukon",
+    },
+    "AU": {
+        "ACT": "Australian Capital Territory", "NSW": "New South Wales", "NT": "Northern Territory",
+        "QLD": "Queensland", "SA": "South Australia", "TAS": "Tasmania", "VIC": "Victoria", "WA": "Western Australia",
+    },
+}
+
+# Country names accepted as qualifiers besides the ISO code and pytz.country_names (parentheticals dropped)
+COUNTRY_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "AE": ("UAE",),
+    "BA": ("Bosnia and Herzegovina", "Bosnia"),
+    "CD": ("DRC", "DR Congo", "Democratic Republic of the Congo"),
+    "CG": ("Republic of the Congo",),
+    "CI": ("Ivory Coast",),
+    "CZ": ("Czechia",),
+    "GB": ("United Kingdom", "UK", "Great Britain", "England", "Scotland", "Wales", "Northern Ireland"),
+    "KP": ("North Korea",),
+    "KR": ("South Korea", "Korea"),
+    "MM": ("Burma",),
+    "MK": ("Macedonia",),
+    "NL": ("Holland",),
+    "RU": ("Russian Federation",),
+    "TL": ("Timor-Leste",),
+    "TR": ("Turkiye",),
+    "TT": ("Trinidad and Tobago", "Trinidad"),
+    "US": ("USA", "United States of America", "America"),
+    "VA": ("Holy See", "Vatican"),
+    "WS": ("Samoa",),
+    "XK": ("Kosovo",),
+}
+
+
+def country_names(country_code: str) -> Set[str]:
+    """
+    Normalized names of a country, as accepted after the comma of ``"City, Country"``.
+    """
+    name = re.sub(r"\s*\(.*\)", "", pytz.country_names.get(country_code, ""))
+    return {normalize(alias) for alias in (name, *COUNTRY_ALIASES.get(country_code, ()))} - {""}
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    country_code: str
+    admin1: str
+    latitude: float
+    longitude: float
+    timezone: str
+    population: int
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}, {self.admin1 if self.country_code in ('US', 'CA', 'AU') else self.country_code}"
+
+
+def normalize(text: str) -> str:
+    """
+    Case-, accent- and punctuation-insensitive form of a place name.
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[\W_]+", " ", text)
+    return re.sub(r"\bst\b", "saint", text).strip()
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str) -> tzinfo:
+    """
+    Memoized ``pytz.timezone``; raises ``pytz.UnknownTimeZoneError`` for unknown names.
+    """
+    return pytz.timezone(name)
+
+
+class LocationResolver:
+    """
+    Gazetteer-backed resolver of place names.
+
+    Args:
+        path (str): CSV with name, alternate_names (``|``-separated), country_code, admin1,
+            latitude, longitude, timezone and population columns.
+    """
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        self.places: List[Place] = []
+        # Normalized name -> places, most populous first
+        self.names: Dict[str, List[Place]] = defaultdict(list)
+        # Qualifiers that identify each place: its own country code and name, admin1 code and region name
+        self._qualifiers: Dict[Place, Set[str]] = {}
+        self._trigrams: Dict[str, List[int]] = defaultdict(list)
+        self._keys: List[str] = []
+        self._gram_counts: List[int] = []
+        self._zones = {normalize(zone): zone for zone in pytz.all_timezones}
+
+        countries: Dict[str, Set[str]] = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                place = Place(row["name"], row["country_code"], row["admin1"], float(row["latitude"]),
+                              float(row["longitude"]), row["timezone"], int(row["population"] or 0))
+                self.places.append(place)
+                aliases = [alias for alias in row["alternate_names"].split("|") if alias]
+                for key in {normalize(name) for name in [place.name, *aliases]}:
+                    self.names[key].append(place)
+                region = REGION_NAMES.get(place.country_code, {}).get(place.admin1, "")
+                self._qualifiers[place] = {normalize(place.country_code), normalize(place.admin1)} - {""}
+                if region:
+                    self._qualifiers[place].add(normalize(region))
+                if place.country_code not in countries:
+                    countries[place.country_code] = country_names(place.country_code)
+                self._qualifiers[place] |= countries[place.country_code]
+
+        for key, places in self.names.items():
+            places.sort(key=lambda p: -p.population)
+            self._keys.append(key)
+            grams = trigrams(key)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._trigrams[gram].append(len(self._keys) - 1)
+
+    def _fuzzy(self, key: str) -> Optional[str]:
+        grams = trigrams(key)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for position in self._trigrams.get(gram, ()):
+                shared[position] += 1
+
+        best, best_score = None, MIN_FUZZY_SCORE
+        for position, count in shared.items():
+            candidate = self._keys[position]
+            score = 2 * count / (len(grams) + self._gram_counts[position])
+            if score > best_score or (score == best_score and best is not None
+                                      and self.names[candidate][0].population > self.names[best][0].population):
+                best, best_score = candidate, score
+        return best
+
+    def _lookup(self, name: str, qualifier: str) -> Optional[Place]:
+        candidates = self.names.get(name)
+        if candidates is None:
+            fuzzy = self._fuzzy(name)
+            candidates = self.names[fuzzy] if fuzzy else []
+        if qualifier:
+            # A qualifier that matches none of the candidates names a place the gazetteer does not have
+            candidates = [place for place in candidates if qualifier in self._qualifiers[place]]
+        return candidates[0] if candidates else None
+
+    @lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+    def resolve(self, text: str) -> Optional[Place]:
+        """
+        Best gazetteer match for a free-text place name.
+
+        ``"City, Region"`` and ``"City, Country"`` use the part after the comma to pick between
+        places of the same name; regions and countries can be given by code or name ("ME" or "Maine",
+        "GB" or "United Kingdom"), but not by another city's name. A
+        qualifier that matches no place of that name gives None rather than another place.
+        Misspellings fall back to the closest name by trigram similarity.
+
+        Args:
+            text (str): Place name, optionally qualified.
+
+        Returns:
+            Optional[Place]: The matching place, or None if there is none or the qualifier rules them all out.
+        """
+        key = normalize(text or "")
+        if not key:
+            return None
+        if key in self.names:
+            return self.names[key][0]
+
+        name, _, qualifier = text.partition(",")
+        return self._lookup(normalize(name), normalize(qualifier))
+
+    def timezone(self, text: str) -> Optional[str]:
+        """
+        IANA timezone for an IANA zone name ("Asia/Tokyo", "asia tokyo") or a place name.
+        """
+        zone = self._zones.get(normalize(text or ""))
+        if zone is not None:
+            return zone
+        place = self.resolve(text)
+        return place.timezone if place else None
+
+
+_resolver: Optional[LocationResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_location_resolver() -> LocationResolver:
+    """
+    The process-wide resolver, loaded from the gazetteer on first use.
+    """
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = LocationResolver()
+        return _resolver
+
+
+def resolve_location(text: str) -> Optional[Place]:
+    return get_location_resolver().resolve(text)
+
+
+def resolve_timezone(text: str) -> Optional[tzinfo]:
+    """
+    Cached pytz zone for a place or zone name, or None if it cannot be resolved.
+    """
+    zone = get_location_resolver().timezone(text)
+    return get_zone(zone) if zone else None
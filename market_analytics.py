@@ -0,0 +1,423 @@
+# market_analytics.py
+
+import json
+import math
+import warnings
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from market_data import PERIODS, available_indices, get_market_store, period_buckets
+
+"""
+    Market analytics tools
+    - Vectorized NumPy computations over the resident market store
+    - Each tool answers for many indices in a single call and returns compact JSON,
+      so the model does not have to fetch raw prices and chain calculator calls
+"""
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def _round(value, digits: int = 4) -> Optional[float]:
+    value = float(value)
+    return None if math.isnan(value) else round(value, digits)
+
+
+def _dump(result) -> str:
+    return json.dumps(result, separators=(",", ":"))
+
+
+def ffill(values: np.ndarray) -> np.ndarray:
+    """
+    Forward-fills NaNs down each column; leading NaNs are left as NaN.
+
+    Args:
+        values (np.ndarray): Matrix of shape (n_dates, n_indices).
+
+    Returns:
+        np.ndarray: A filled copy.
+    """
+    rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return values[rows, np.arange(values.shape[1])]
+
+
+def simple_returns(values: np.ndarray) -> np.ndarray:
+    """
+    Daily simple returns between consecutive observations of each column.
+
+    Gaps are bridged: the return on the next observed day is measured against the last
+    observed value. Days without an observation get NaN.
+
+    Args:
+        values (np.ndarray): Matrix of shape (n_dates, n_indices).
+
+    Returns:
+        np.ndarray: Matrix of shape (n_dates - 1, n_indices).
+    """
+    filled = ffill(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = filled[1:] / filled[:-1] - 1.0
+    returns[np.isnan(values[1:])] = np.nan
+    return returns
+
+
+def _load(indices: List[str], start_date, end_date):
+    # Returns (names, dates, values, error) for a validated request
+    names = [indices] if isinstance(indices, str) else list(indices or [])
+    unknown = [name for name in names if name not in available_indices()]
+    if not names or unknown:
+        logger.warning(f"Invalid indices provided: {unknown}")
+        return names, None, None, f"Invalid index. Please choose from available indices: {', '.join(available_indices())}"
+
+    store = get_market_store()
+    try:
+        dates, values = store.select(names, start_date, end_date)
+    except ValueError:
+        return names, None, None, "Invalid date format. Please use YYYY-MM-DD."
+    if len(dates) == 0:
+        return names, None, None, "No data available in the given date range."
+    return names, dates, values, None
+
+
+def _first_last(dates: np.ndarray, values: np.ndarray):
+    # Positions of the first and last observation in each column (-1 if the column is empty)
+    valid = ~np.isnan(values)
+    has_any = valid.any(axis=0)
+    first = np.where(has_any, valid.argmax(axis=0), -1)
+    last = np.where(has_any, len(values) - 1 - valid[::-1].argmax(axis=0), -1)
+    return first, last
+
+
+def get_returns(indices: List[str], start_date: str = None, end_date: str = None) -> str:
+    """
+    Change between the first and last observation of each index in a date range.
+    """
+    try:
+        names, dates, values, error = _load(indices, start_date, end_date)
+        if error:
+            return error
+        first, last = _first_last(dates, values)
+        columns = np.arange(values.shape[1])
+        start_values = values[first, columns]
+        end_values = values[last, columns]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change_pct = (end_values / start_values - 1.0) * 100.0
+
+        result = {}
+        for i, name in enumerate(names):
+            if first[i] < 0:
+                result[name] = None
+                continue
+            result[name] = {
+                "start": str(dates[first[i]]), "start_value": _round(start_values[i]),
+                "end": str(dates[last[i]]), "end_value": _round(end_values[i]),
+                "change": _round(end_values[i] - start_values[i]), "change_pct": _round(change_pct[i], 2),
+            }
+        return _dump(result)
+    except Exception as e:
+        logger.error(f"Failed to compute returns for '{indices}': {e}")
+        return "Error in computing returns."
+
+
+def get_moving_averages(indices: List[str], windows: List[int] = None, end_date: str = None) -> str:
+    """
+    Simple moving averages over the last N observations of each index, as of a date.
+    """
+    try:
+        windows = sorted({int(w) for w in (windows or [20, 50, 200]) if int(w) > 0})
+        if not windows:
+            return "Invalid window. Windows must be positive integers."
+        names, dates, values, error = _load(indices, None, end_date)
+        if error:
+            return error
+
+        # Cumulative sums over valid observations turn every window into two lookups
+        valid = ~np.isnan(values)
+        sums = np.cumsum(np.where(valid, values, 0.0), axis=0)
+        counts = np.cumsum(valid, axis=0)
+        totals = counts[-1]
+        last_sum = sums[-1]
+        _, last = _first_last(dates, values)
+
+        result = {}
+        for i, name in enumerate(names):
+            if last[i] < 0:
+                result[name] = None
+                continue
+            entry = {"as_of": str(dates[last[i]]), "last": _round(values[last[i], i])}
+            for w in windows:
+                if totals[i] < w:
+                    entry[f"sma_{w}"] = None
+                    continue
+                # Sum of the last w observations = total sum - sum up to the (total - w)-th observation
+                cut = int(np.searchsorted(counts[:, i], totals[i] - w, side="right"))
+                before = sums[cut - 1, i] if cut > 0 and totals[i] > w else 0.0
+                sma = (last_sum[i] - before) / w
+                entry[f"sma_{w}"] = _round(sma)
+                entry[f"vs_sma_{w}_pct"] = _round((values[last[i], i] / sma - 1.0) * 100.0, 2)
+            result[name] = entry
+        return _dump(result)
+    except Exception as e:
+        logger.error(f"Failed to compute moving averages for '{indices}': {e}")
+        return "Error in computing moving averages."
+
+
+def get_volatility(indices: List[str], start_date: str = None, end_date: str = None) -> str:
+    """
+    Daily and annualized volatility (standard deviation of daily returns) of each index.
+    """
+    try:
+        names, dates, values, error = _load(indices, start_date, end_date)
+        if error:
+            return error
+        returns = simple_returns(values)
+        observations = np.count_nonzero(~np.isnan(returns), axis=0)
+        with warnings.catch_warnings():
+            # Columns without two observations yield NaN, which is what we report
+            warnings.simplefilter("ignore", RuntimeWarning)
+            daily = np.nanstd(returns, axis=0, ddof=1) if len(returns) > 1 else np.full(values.shape[1], np.nan)
+        daily[observations < 2] = np.nan
+
+        result = {}
+        for i, name in enumerate(names):
+            result[name] = {
+                "daily_pct": _round(daily[i] * 100.0, 3),
+                "annualized_pct": _round(daily[i] * math.sqrt(TRADING_DAYS_PER_YEAR) * 100.0, 2),
+                "observations": int(observations[i]),
+            }
+        return _dump({"from": str(dates[0]), "to": str(dates[-1]), "volatility": result})
+    except Exception as e:
+        logger.error(f"Failed to compute volatility for '{indices}': {e}")
+        return "Error in computing volatility."
+
+
+def get_max_drawdown(indices: List[str], start_date: str = None, end_date: str = None) -> str:
+    """
+    Largest peak-to-trough decline of each index in a date range.
+    """
+    try:
+        names, dates, values, error = _load(indices, start_date, end_date)
+        if error:
+            return error
+        filled = ffill(values)
+        peaks = np.fmax.accumulate(filled, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drawdowns = filled / peaks - 1.0
+
+        result = {}
+        for i, name in enumerate(names):
+            column = drawdowns[:, i]
+            if np.isnan(column).all():
+                result[name] = None
+                continue
+            trough = int(np.nanargmin(column))
+            peak = int(np.nanargmax(filled[:trough + 1, i]))
+            result[name] = {
+                "max_drawdown_pct": _round(column[trough] * 100.0, 2),
+                "peak": str(dates[peak]), "peak_value": _round(filled[peak, i]),
+                "trough": str(dates[trough]), "trough_value": _round(filled[trough, i]),
+            }
+        return _dump(result)
+    except Exception as e:
+        logger.error(f"Failed to compute max drawdown for '{indices}': {e}")
+        return "Error in computing max drawdown."
+
+
+def get_correlation_matrix(indices: List[str], start_date: str = None, end_date: str = None) -> str:
+    """
+    Correlation of daily returns between indices, over the days where all of them traded.
+    """
+    try:
+        if isinstance(indices, str) or len(indices) < 2:
+            return "Please provide at least two indices to correlate."
+        names, dates, values, error = _load(indices, start_date, end_date)
+        if error:
+            return error
+        returns = simple_returns(values)
+        returns = returns[~np.isnan(returns).any(axis=1)]
+        if len(returns) < 3:
+            return "Not enough overlapping data to compute correlations."
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = np.corrcoef(returns, rowvar=False)
+        return _dump({
+            "indices": names,
+            "observations": int(len(returns)),
+            "matrix": [[_round(v, 3) for v in row] for row in matrix],
+        })
+    except Exception as e:
+        logger.error(f"Failed to compute correlation matrix for '{indices}': {e}")
+        return "Error in computing correlation matrix."
+
+
+def get_period_change(indices: List[str], period: str = "month", start_date: str = None, end_date: str = None) -> str:
+    """
+    Period-over-period change of each index, using the last observation of every period.
+    """
+    try:
+        if period not in PERIODS:
+            return f"Invalid period. Please choose from: {', '.join(PERIODS)}"
+        names, dates, values, error = _load(indices, start_date, end_date)
+        if error:
+            return error
+
+        buckets = period_buckets(dates, period)
+        period_ends = np.append(np.flatnonzero(np.diff(buckets)), len(buckets) - 1)
+        closes = ffill(values)[period_ends]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            changes = (closes[1:] / closes[:-1] - 1.0) * 100.0
+
+        return _dump({
+            "period": period,
+            "period_end": [str(d) for d in dates[period_ends]],
+            "close": {name: [_round(v) for v in closes[:, i]] for i, name in enumerate(names)},
+            "change_pct": {name: [None] + [_round(v, 2) for v in changes[:, i]] for i, name in enumerate(names)},
+        })
+    except Exception as e:
+        logger.error(f"Failed to compute period change for '{indices}': {e}")
+        return "Error in computing period change."
+
+
+def _indices_parameter(description: str) -> Dict:
+    return {
+        "type": "array",
+        "items": {"type": "string", "enum": available_indices()},
+        "description": description,
+    }
+
+
+DATE_RANGE_PARAMETERS = {
+    "start_date": {
+        "type": "string",
+        "description": "The start date for the calculation (in YYYY-MM-DD format). Optional.",
+    },
+    "end_date": {
+        "type": "string",
+        "description": "The end date for the calculation (in YYYY-MM-DD format). Optional.",
+    },
+}
+
+
+def get_analytics_tools() -> List[Dict]:
+    """
+    Returns the tool definitions of the market analytics functions.
+    """
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "get_returns",
+                "description": "Get the absolute and percentage change of one or more indices between the first and last trading day of a date range.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "indices": _indices_parameter("The indices to compute returns for."),
+                        **DATE_RANGE_PARAMETERS,
+                    },
+                    "required": ["indices"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_moving_averages",
+                "description": "Get simple moving averages (over the last N trading days) of one or more indices as of a date, and how far the last value is above or below each average.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "indices": _indices_parameter("The indices to compute moving averages for."),
+                        "windows": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "Window lengths in trading days. Defaults to [20, 50, 200].",
+                        },
+                        "end_date": DATE_RANGE_PARAMETERS["end_date"],
+                    },
+                    "required": ["indices"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_volatility",
+                "description": "Get the daily and annualized volatility of daily returns for one or more indices over a date range.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "indices": _indices_parameter("The indices to compute volatility for."),
+                        **DATE_RANGE_PARAMETERS,
+                    },
+                    "required": ["indices"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_max_drawdown",
+                "description": "Get the largest peak-to-trough decline, with peak and trough dates, for one or more indices over a date range.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "indices": _indices_parameter("The indices to compute the maximum drawdown for."),
+                        **DATE_RANGE_PARAMETERS,
+                    },
+                    "required": ["indices"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_correlation_matrix",
+                "description": "Get the correlation matrix of daily returns between two or more indices over a date range.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "indices": _indices_parameter("The indices to correlate (at least two)."),
+                        **DATE_RANGE_PARAMETERS,
+                    },
+                    "required": ["indices"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_period_change",
+                "description": "Get the closing value and period-over-period percentage change of one or more indices for every week, month, quarter or year in a date range.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "indices": _indices_parameter("The indices to compute period changes for."),
+                        "period": {
+                            "type": "string",
+                            "enum": PERIODS,
+                            "description": "The period length. Defaults to month.",
+                        },
+                        **DATE_RANGE_PARAMETERS,
+                    },
+                    "required": ["indices"],
+                },
+            },
+        },
+    ]
+
+
+def get_analytics_functions() -> Dict:
+    """
+    Returns the market analytics functions by tool name.
+    """
+    return {
+        "get_returns": get_returns,
+        "get_moving_averages": get_moving_averages,
+        "get_volatility": get_volatility,
+        "get_max_drawdown": get_max_drawdown,
+        "get_correlation_matrix": get_correlation_matrix,
+        "get_period_change": get_period_change,
+    }
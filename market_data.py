@@ -0,0 +1,495 @@
+# market_data.py
+
+import hashlib
+import io
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dataset_cache import column_array, open_table
+
+"""
+    Market data
+    - One resident store for every bundled market dataset, indexed by (instrument, date)
+    - Wide files (one column per "<Instrument>_<Field>") and long files (one row per instrument and date,
+      one column per field) are ingested into the same float64 matrix: shared date axis x series
+    - Follows appends to the source CSVs: only the new bytes are parsed and appended to the resident
+      arrays; readers hold immutable snapshots, so they never see a half-applied append
+    - Rebuilt through the Arrow dataset cache only when a CSV is rewritten rather than appended to
+    - Shared by get_stock_market_data, calculate_difference and the market analytics tools
+"""
+
+
+@dataclass(frozen=True)
+class MarketSource:
+    """
+    A CSV file feeding the market store.
+
+    Attributes:
+        path (str): Path to the CSV file.
+        layout (str): ``"wide"`` (one column per series) or ``"long"`` (one row per instrument and date).
+        csv_options (Dict): Options forwarded to ``pd.read_csv`` on a cache miss.
+        instrument_column (str): Column naming the instrument, for long files.
+        date_column (str): Column holding the date.
+    """
+    path: str
+    layout: str
+    csv_options: Dict = field(default_factory=dict)
+    instrument_column: str = "Index"
+    date_column: str = "Date"
+
+
+# Adding a data file only takes a new entry here
+MARKET_SOURCES = [
+    # The source mixes D/M/YYYY and DD-MM-YYYY dates and uses thousands separators in prices
+    MarketSource("data/Stock Market Dataset.csv", "wide",
+                 {"parse_dates": ["Date"], "date_format": "mixed", "dayfirst": True, "thousands": ","}),
+    MarketSource("data/stock_data.csv", "long", {"parse_dates": ["Date"]}),
+]
+
+PERIODS = ["week", "month", "quarter", "year"]
+
+
+def series_name(instrument: str, field_name: str) -> str:
+    """
+    Name of the series holding one field of one instrument, e.g. ``Gold_Price`` or ``S&P 500_Close``.
+    """
+    return f"{instrument}_{field_name}"
+
+
+class MarketStore:
+    """
+    Column store of daily market values indexed by (instrument, date).
+    """
+
+    def __init__(self, dates: np.ndarray, series: List[Tuple[str, str]], values: np.ndarray):
+        """
+        Initializes the store.
+
+        Args:
+            dates (np.ndarray): Ascending, unique ``datetime64[D]`` dates shared by all series.
+            series (List[Tuple[str, str]]): (instrument, field) of each column of ``values``.
+            values (np.ndarray): float64 matrix of shape (len(dates), len(series)); missing values are NaN.
+        """
+        self.dates = dates
+        self.series = series
+        self.values = values
+        self.columns = [series_name(instrument, field_name) for instrument, field_name in series]
+        self.column_positions = {name: i for i, name in enumerate(self.columns)}
+        self.series_positions = {key: i for i, key in enumerate(series)}
+        self.instrument_fields: Dict[str, Dict[str, int]] = {}
+        for i, (instrument, field_name) in enumerate(series):
+            self.instrument_fields.setdefault(instrument, {})[field_name] = i
+        self._last_valid_rows: Optional[np.ndarray] = None
+        # Append buffers shared along a chain of snapshots: (dates, values, [committed length])
+        self._buffers: Optional[Tuple[np.ndarray, np.ndarray, List[int]]] = None
+
+    # -----------------------------
+    # Ingest
+    # -----------------------------
+    @staticmethod
+    def read_wide(table: pa.Table, date_column: str = "Date") -> Tuple[np.ndarray, List[Tuple[str, str]], np.ndarray]:
+        """
+        Reads a wide table with one ``<Instrument>_<Field>`` column per series.
+
+        Returns:
+            Tuple: Dates, (instrument, field) per column, and the values matrix in table row order.
+        """
+        dates = column_array(table, date_column).astype("datetime64[D]")
+        names = [name for name in table.column_names if name != date_column]
+        values = np.empty((len(dates), len(names)), dtype=np.float64)
+        for i, name in enumerate(names):
+            values[:, i] = column_array(table, name)
+        series = [tuple(name.rsplit("_", 1)) if "_" in name else (name, "Value") for name in names]
+        return dates, series, values
+
+    @staticmethod
+    def read_long(table: pa.Table, instrument_column: str = "Index",
+                  date_column: str = "Date") -> Tuple[np.ndarray, List[Tuple[str, str]], np.ndarray]:
+        """
+        Reads a long table with one row per (instrument, date) and one column per field.
+
+        Returns:
+            Tuple: Dates, (instrument, field) per column, and the values matrix, one row per distinct date.
+        """
+        row_dates = column_array(table, date_column).astype("datetime64[D]")
+        instruments, instrument_codes = np.unique(table.column(instrument_column).to_numpy(zero_copy_only=False),
+                                                  return_inverse=True)
+        dates, date_rows = np.unique(row_dates, return_inverse=True)
+        fields = [name for name in table.column_names if name not in (instrument_column, date_column)]
+
+        series = [(str(instrument), field_name) for instrument in instruments for field_name in fields]
+        values = np.full((len(dates), len(series)), np.nan)
+        for j, field_name in enumerate(fields):
+            # Scatter the field of every row into its (date, instrument) cell
+            values[date_rows, instrument_codes * len(fields) + j] = column_array(table, field_name)
+        return dates, series, values
+
+    @classmethod
+    def from_parts(cls, parts: Sequence[Tuple[np.ndarray, List[Tuple[str, str]], np.ndarray]]) -> "MarketStore":
+        """
+        Merges ingested parts onto a shared date axis.
+
+        Later parts win when two parts provide the same (instrument, field) on the same date.
+
+        Args:
+            parts: (dates, series, values) tuples as returned by ``read_wide`` / ``read_long``.
+
+        Returns:
+            MarketStore: The merged store.
+        """
+        dates = np.unique(np.concatenate([part[0] for part in parts])) if parts else np.array([], "datetime64[D]")
+        positions: Dict[Tuple[str, str], int] = {}
+        for _, part_series, _ in parts:
+            for key in part_series:
+                positions.setdefault(key, len(positions))
+
+        values = np.full((len(dates), len(positions)), np.nan)
+        for part_dates, part_series, part_values in parts:
+            rows = np.searchsorted(dates, part_dates)
+            columns = np.array([positions[key] for key in part_series], dtype=np.int64)
+            target = values[:, columns]
+            target[rows] = np.where(np.isnan(part_values), target[rows], part_values)
+            values[:, columns] = target
+        return cls(dates, list(positions), values)
+
+    def append(self, part: Tuple[np.ndarray, List[Tuple[str, str]], np.ndarray]) -> "MarketStore":
+        """
+        Returns a new snapshot with an ingested part added; this snapshot is left unchanged.
+
+        Rows for new dates after the last stored date, for known series, are written into spare
+        capacity behind the current rows. Both snapshots share the buffers, but this one only
+        sees its own rows. Anything else (back-filled dates, new series) is merged into a copy.
+
+        Args:
+            part: (dates, series, values) as returned by ``read_wide`` / ``read_long``.
+
+        Returns:
+            MarketStore: The new snapshot.
+        """
+        part_dates, part_series, part_values = part
+        if len(part_dates) == 0:
+            return self
+
+        n, m = len(self.dates), len(part_dates)
+        in_place = (
+            all(key in self.series_positions for key in part_series)
+            and (n == 0 or part_dates.min() > self.dates[-1])
+            and len(np.unique(part_dates)) == m
+        )
+        if not in_place:
+            return MarketStore.from_parts([(self.dates, self.series, self.values), part])
+
+        buffers = self._buffers
+        # Another snapshot may already have written behind us; only the chain head appends in place
+        if buffers is None or buffers[2][0] != n or n + m > len(buffers[0]):
+            capacity = max(2 * (n + m), 64)
+            dates_buffer = np.empty(capacity, dtype="datetime64[D]")
+            values_buffer = np.empty((capacity, len(self.series)), dtype=np.float64)
+            dates_buffer[:n] = self.dates
+            values_buffer[:n] = self.values
+            buffers = (dates_buffer, values_buffer, [n])
+
+        dates_buffer, values_buffer, committed = buffers
+        order = np.argsort(part_dates)
+        columns = np.array([self.series_positions[key] for key in part_series], dtype=np.int64)
+        dates_buffer[n:n + m] = part_dates[order]
+        values_buffer[n:n + m] = np.nan
+        values_buffer[n:n + m, columns] = part_values[order]
+        committed[0] = n + m
+
+        store = MarketStore(dates_buffer[:n + m], self.series, values_buffer[:n + m])
+        store._buffers = buffers
+        return store
+
+    # -----------------------------
+    # Query API
+    # -----------------------------
+    @property
+    def instruments(self) -> List[str]:
+        """
+        Instruments in the store, in ingest order.
+        """
+        return list(self.instrument_fields)
+
+    def unknown_columns(self, names: Sequence[str]) -> List[str]:
+        """
+        Returns the names that are not series of the store.
+        """
+        return [name for name in names if name not in self.column_positions]
+
+    def window(self, start_date=None, end_date=None) -> slice:
+        """
+        Returns the row slice covering an inclusive date range.
+
+        Args:
+            start_date: First date to include (anything ``pd.to_datetime`` accepts), or None for the first row.
+            end_date: Last date to include, or None for the last row.
+
+        Returns:
+            slice: Row slice into ``dates`` and ``values``.
+        """
+        start = 0 if start_date is None else int(np.searchsorted(self.dates, to_day(start_date), side="left"))
+        stop = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, to_day(end_date), side="right"))
+        return slice(start, max(start, stop))
+
+    @property
+    def last_valid_rows(self) -> np.ndarray:
+        """
+        Row of the latest non-missing value at or before each row, per column (-1 if none).
+
+        Built once on first use; turns "nearest prior session with a value" into a single lookup.
+        """
+        if self._last_valid_rows is None:
+            rows = np.where(np.isnan(self.values), -1, np.arange(len(self.dates), dtype=np.int64)[:, None])
+            self._last_valid_rows = np.maximum.accumulate(rows, axis=0)
+        return self._last_valid_rows
+
+    def locate(self, names: Sequence[str], dates: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Resolves (series, date) pairs to the nearest session on or before each date that has a value.
+
+        Args:
+            names (Sequence[str]): Series name of each lookup.
+            dates (Sequence): Date of each lookup (anything ``pd.to_datetime`` accepts).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Resolved session dates and values. Lookups before the first
+            observation resolve to ``NaT`` and NaN.
+
+        Raises:
+            ValueError: If a date is invalid.
+        """
+        days = np.array([to_day(d) for d in dates], dtype="datetime64[D]")
+        columns = np.array([self.column_positions[name] for name in names], dtype=np.int64)
+        # Sorted dates act as the date -> row index: the last row not after each requested day
+        rows = np.searchsorted(self.dates, days, side="right") - 1
+        rows = np.where(rows >= 0, self.last_valid_rows[np.maximum(rows, 0), columns], -1)
+
+        found = rows >= 0
+        sessions = np.where(found, self.dates[np.maximum(rows, 0)], np.datetime64("NaT"))
+        values = np.where(found, self.values[np.maximum(rows, 0), columns], np.nan)
+        return sessions, values
+
+    def select(self, names: Sequence[str], start_date=None, end_date=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the dates and values of several series over a date range.
+
+        Dates on which none of the requested series has a value are dropped, so series from
+        different files do not pick up each other's calendars.
+
+        Args:
+            names (Sequence[str]): Series names.
+            start_date: First date to include, or None.
+            end_date: Last date to include, or None.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Dates of shape (n,) and values of shape (n, len(names)).
+        """
+        rows = self.window(start_date, end_date)
+        positions = [self.column_positions[name] for name in names]
+        values = self.values[rows][:, positions]
+        observed = ~np.isnan(values).all(axis=1)
+        return self.dates[rows][observed], values[observed]
+
+    def query(self, instruments: Sequence[str], fields: Optional[Sequence[str]] = None,
+              start_date=None, end_date=None) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        """
+        Returns a multi-instrument slice.
+
+        Args:
+            instruments (Sequence[str]): Instrument names, e.g. ``["Gold", "S&P 500"]``.
+            fields (Sequence[str]): Fields to return, e.g. ``["Close"]``; all fields of each instrument if None.
+            start_date: First date to include, or None.
+            end_date: Last date to include, or None.
+
+        Returns:
+            Tuple[np.ndarray, List[str], np.ndarray]: Dates, series names, and values of shape (n, len(names)).
+
+        Raises:
+            KeyError: If an instrument is unknown or has none of the requested fields.
+        """
+        names = []
+        for instrument in instruments:
+            available = self.instrument_fields[instrument]
+            selected = [f for f in (fields or available) if f in available]
+            if not selected:
+                raise KeyError(f"Instrument '{instrument}' has none of the fields {list(fields)}")
+            names.extend(series_name(instrument, f) for f in selected)
+        dates, values = self.select(names, start_date, end_date)
+        return dates, names, values
+
+
+def to_day(value) -> np.datetime64:
+    """
+    Converts a date string, datetime or Timestamp to ``datetime64[D]``.
+
+    Raises:
+        ValueError: If the value is not a valid date.
+    """
+    timestamp = pd.to_datetime(value)
+    if timestamp is pd.NaT:
+        raise ValueError(f"Invalid date: {value}")
+    return np.datetime64(timestamp.date(), "D")
+
+
+def period_buckets(dates: np.ndarray, period: str) -> np.ndarray:
+    """
+    Maps each date to an integer bucket id for a calendar period.
+
+    Args:
+        dates (np.ndarray): ``datetime64[D]`` dates.
+        period (str): One of ``PERIODS``.
+
+    Returns:
+        np.ndarray: Bucket ids; equal ids mean the same week, month, quarter or year.
+    """
+    if period == "week":
+        # 1970-01-01 was a Thursday; shifting by 3 days makes buckets start on Monday
+        return (dates.astype(np.int64) + 3) // 7
+    if period == "quarter":
+        return dates.astype("datetime64[M]").astype(np.int64) // 3
+    if period == "month":
+        return dates.astype("datetime64[M]").astype(np.int64)
+    if period == "year":
+        return dates.astype("datetime64[Y]").astype(np.int64)
+    raise ValueError(f"Invalid period: {period}")
+
+
+def ingest(source: MarketSource, table: pa.Table) -> Tuple[np.ndarray, List[Tuple[str, str]], np.ndarray]:
+    """
+    Reads a source table according to its layout.
+    """
+    if source.layout == "wide":
+        return MarketStore.read_wide(table, source.date_column)
+    if source.layout == "long":
+        return MarketStore.read_long(table, source.instrument_column, source.date_column)
+    raise ValueError(f"Unknown layout '{source.layout}' for {source.path}")
+
+
+@dataclass
+class _Tail:
+    # How far into a source file the store has read, and enough to tell an append from a rewrite
+    size: int
+    mtime_ns: int
+    header: bytes
+    fingerprint_start: int
+    fingerprint: bytes
+
+
+class _Rewritten(Exception):
+    pass
+
+
+class MarketFeed:
+    """
+    Keeps a market store in sync with its source CSVs by following appended rows.
+    """
+
+    # Bytes before the read offset that must be unchanged for growth to count as an append
+    FINGERPRINT_BYTES = 4096
+
+    def __init__(self, sources: Sequence[MarketSource] = None):
+        """
+        Initializes the feed.
+
+        Args:
+            sources (Sequence[MarketSource]): Source files; ``MARKET_SOURCES`` if None.
+        """
+        self.sources = list(sources or MARKET_SOURCES)
+        self._store: Optional[MarketStore] = None
+        self._tails: Dict[str, _Tail] = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> MarketStore:
+        """
+        Returns the latest store snapshot, ingesting any rows appended since the last call.
+        """
+        with self._lock:
+            if self._store is None:
+                self._reload()
+            else:
+                try:
+                    for source in self.sources:
+                        part = self._follow(source)
+                        if part is not None:
+                            self._store = self._store.append(part)
+                except _Rewritten:
+                    self._reload()
+            return self._store
+
+    def _reload(self):
+        # Full load through the Arrow dataset cache, remembering where each file ended
+        parts = []
+        for source in self.sources:
+            while True:
+                before = os.stat(source.path)
+                table = open_table(source.path, **source.csv_options)
+                after = os.stat(source.path)
+                if (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns):
+                    break
+            parts.append(ingest(source, table))
+            self._tails[source.path] = self._tail_for(source.path, after.st_size, after.st_mtime_ns)
+        self._store = MarketStore.from_parts(parts)
+
+    def _tail_for(self, path: str, size: int, mtime_ns: int) -> _Tail:
+        with open(path, "rb") as f:
+            header = f.readline()
+            start = max(len(header), size - self.FINGERPRINT_BYTES)
+            f.seek(start)
+            fingerprint = hashlib.sha256(f.read(size - start)).digest()
+        return _Tail(size, mtime_ns, header, start, fingerprint)
+
+    def _follow(self, source: MarketSource):
+        tail = self._tails[source.path]
+        stat = os.stat(source.path)
+        if (stat.st_size, stat.st_mtime_ns) == (tail.size, tail.mtime_ns):
+            return None
+        if stat.st_size <= tail.size:
+            raise _Rewritten()
+
+        with open(source.path, "rb") as f:
+            f.seek(tail.fingerprint_start)
+            if hashlib.sha256(f.read(tail.size - tail.fingerprint_start)).digest() != tail.fingerprint:
+                raise _Rewritten()
+            appended = f.read(stat.st_size - tail.size)
+
+        # Only consume complete lines; a row still being written is picked up next time
+        complete = appended.rfind(b"\n") + 1
+        if complete == 0:
+            return None
+        chunk = appended[:complete]
+
+        # With a partial row left over, forget the mtime so the next call looks at the file again
+        mtime_ns = stat.st_mtime_ns if complete == len(appended) else -1
+        self._tails[source.path] = self._tail_for(source.path, tail.size + complete, mtime_ns)
+
+        if not chunk.strip():
+            return None
+        frame = pd.read_csv(io.BytesIO(tail.header + chunk), **source.csv_options)
+        return ingest(source, pa.Table.from_pandas(frame, preserve_index=False))
+
+
+_feed = MarketFeed()
+
+
+def get_market_store() -> MarketStore:
+    """
+    Returns the latest snapshot of the shared resident market store.
+
+    Rows appended to the source CSVs since the last call are ingested incrementally; a
+    rewritten CSV triggers a full reload.
+    """
+    return _feed.snapshot()
+
+
+def available_indices() -> List[str]:
+    """
+    Names of every series in the market store, e.g. ``Gold_Price`` or ``S&P 500_Close``.
+    """
+    return get_market_store().columns
@@ -2,6 +2,8 @@
 
 import streamlit as st
 from openai_client import OpenAIClient
+from context_packer import CONTEXT_TOKEN_BUDGET, pack_context
+from vector_store import VECTOR_STORE
 from helpers import (
     deep_merge_dicts,
     load_openapi_schemas,
@@ -35,9 +37,13 @@ def main():
     # Access API keys from Streamlit secrets
     try:
         openai_api_key = st.secrets["openai"]["api_key"]
-        pinecone_api_key = st.secrets["pinecone"]["api_key"]
-        pinecone_env = st.secrets["pinecone"]["environment"]
-        pinecone_index = st.secrets["pinecone"]["index_name"]
+        if VECTOR_STORE == "local":
+            # The local vector store needs no Pinecone credentials
+            pinecone_api_key = pinecone_env = pinecone_index = ""
+        else:
+            pinecone_api_key = st.secrets["pinecone"]["api_key"]
+            pinecone_env = st.secrets["pinecone"]["environment"]
+            pinecone_index = st.secrets["pinecone"]["index_name"]
     except KeyError as e:
         st.error(f"Missing API key in secrets: {e}")
         return
@@ -121,18 +127,16 @@ def main():
             # Button to add all endpoints from the selected file to Pinecone
             if st.button("Add All Endpoints from Selected File to Vector Store"):
                 with st.spinner(f"Adding all endpoints from '{selected_file}' to Vector Store..."):
-                    success_count = 0
-                    failure_count = 0
-                    for endpoint in endpoints_info:
+                    timestamp = datetime.now().isoformat()
+
+                    def render_endpoint(endpoint):
                         path = endpoint['path']
                         method = endpoint['method']
-                        summary = endpoint['summary']
 
                         # Generate JSON for the endpoint
                         endpoint_json = generate_json_for_endpoint(openapi_schema, path, method)
                         if not endpoint_json:
-                            failure_count += 1
-                            continue
+                            return None
 
                         # Generate a unique base ID for the endpoint
                         base_id = f"{method}_{path}".replace("/", "_").replace("{", "").replace("}", "")
@@ -141,30 +145,31 @@ def main():
                         metadata = {
                             "endpoint": path,
                             "method": method,
-                            "summary": summary,
-                            "timestamp": datetime.now().isoformat(),
+                            "summary": endpoint['summary'],
+                            "timestamp": timestamp,
                             "file_name": selected_file
                         }
-
-                        # Upsert embeddings with text splitting and metadata into the specific namespace
-                        try:
-                            client.upsert_embeddings(
-                                id=base_id,
-                                text=endpoint_json,
-                                metadata=metadata,
-                                namespace=selected_namespace,
-                                chunk_size=8000,
-                                batch_size=500,
-                                max_workers=5
-                            )
-                            success_count += 1
-                        except Exception as e:
-                            st.error(f"Failed to upsert endpoint {method} {path}: {e}")
-                            failure_count += 1
-
-                    st.success(f"Successfully upserted {success_count} endpoints from '{selected_file}'.")
-                    if failure_count > 0:
-                        st.warning(f"Failed to upsert {failure_count} endpoints from '{selected_file}'.")
+                        return {"id": base_id, "text": endpoint_json, "metadata": metadata}
+
+                    # Sync the namespace with the file through the ingest pipeline: endpoints are rendered, chunked,
+                    # embedded and upserted concurrently, only new or changed endpoints are embedded and upserted,
+                    # and endpoints that disappeared from the spec are deleted
+                    summary = client.sync_documents(
+                        endpoints_info,
+                        namespace=selected_namespace,
+                        chunk_size=8000,
+                        batch_size=500,
+                        render=render_endpoint
+                    )
+                    if summary is not None:
+                        st.success(f"Successfully synced {len(endpoints_info)} endpoints from '{selected_file}'.")
+                        st.json({key: value for key, value in summary.items() if key != "pipeline"})
+                        with st.expander("Ingest pipeline stages"):
+                            st.json(summary["pipeline"]["stages"])
+                        if summary["failed"] > 0:
+                            st.warning(f"Failed to upsert {summary['failed']} endpoints from '{selected_file}'.")
+                    else:
+                        st.warning(f"Failed to upsert the endpoints from '{selected_file}'.")
 
             # Button to add individual endpoints
             st.markdown("---")
@@ -216,8 +221,7 @@ def main():
                                         metadata=metadata,
                                         namespace=selected_namespace,
                                         chunk_size=8000,
-                                        batch_size=500,
-                                        max_workers=5
+                                        batch_size=500
                                     )
                                     st.success(f"Successfully upserted endpoint {method} {path} into namespace '{selected_namespace}'.")
                                 except Exception as e:
@@ -231,13 +235,17 @@ def main():
         # -----------------------------
         st.header("Ask a Question About the OpenAPI Schema")
 
-        # Allow user to select which namespace to query
+        # Allow user to select which namespaces to query; they are searched concurrently
         if uploaded_schema_files:
             namespaces = [f"namespace_{file.name.replace('.', '_')}" for file in uploaded_schema_files]
             namespaces.append("")  # For default namespace
-            selected_query_namespace = st.selectbox("Select Namespace to Query", options=namespaces, index=len(namespaces)-1, key="select_query_namespace")
+            query_all_namespaces = st.checkbox("Query all namespaces in the index", key="query_all_namespaces")
+            selected_query_namespaces = st.multiselect("Select Namespaces to Query", options=namespaces, default=[""],
+                                                       key="select_query_namespaces", disabled=query_all_namespaces)
+            if query_all_namespaces:
+                selected_query_namespaces = "all"
         else:
-            selected_query_namespace = ""
+            selected_query_namespaces = [""]
 
         user_query = st.text_input("Enter your query:", key="user_query")
         top_k = st.slider("Number of Relevant Documents to Retrieve:", min_value=1, max_value=10, value=5)
@@ -248,11 +256,19 @@ def main():
             else:
                 with st.spinner("Processing your query..."):
                     # Step 1: Query the Vector Store
-                    search_results = client.query_vector_store(query=user_query, top_k=top_k, namespace=selected_query_namespace)
+                    search_results = client.query_vector_store(query=user_query, top_k=top_k, namespaces=selected_query_namespaces or [""])
 
                     if search_results:
-                        # Step 2: Compile retrieved contents
-                        retrieved_contents = "\n\n---\n\n".join([result['content'] for result in search_results])
+                        with st.expander("Retrieved chunks"):
+                            st.table([{"namespace": result["namespace"], "id": result["id"], "score": round(result["score"], 4)}
+                                      for result in search_results])
+
+                        # Step 2: Pack the retrieved contents into the context token budget, merging overlapping
+                        # chunks of the same endpoint and dropping duplicates
+                        context = pack_context(search_results, budget=CONTEXT_TOKEN_BUDGET)
+                        retrieved_contents = context.text
+                        st.caption(f"Context: {context.tokens} of {CONTEXT_TOKEN_BUDGET} tokens from {len(context.passages)} passages "
+                                   f"({context.duplicates} duplicate chunks, {len(context.dropped)} passages over budget)")
 
                         # Step 3: Generate a response using OpenAI's ChatCompletion with retrieved context
                         try:
@@ -287,6 +303,25 @@ def main():
                 st.write("### Index Statistics")
                 st.json(stats)
 
+        if st.button("Embedding Cache Statistics"):
+            cache_stats = client.embedding_cache_statistics()
+            if cache_stats:
+                st.write(f"### Embedding Cache: {cache_stats['hit_ratio']:.1%} hit ratio, "
+                         f"{cache_stats['tokens_saved']} embedding tokens saved")
+                st.json(cache_stats)
+            else:
+                st.warning("The embedding cache is disabled (EMBEDDING_CACHE=0).")
+
+        if st.button("Query Cache Statistics"):
+            st.write("### Query Cache")
+            st.json(client.query_cache_statistics())
+
+        if st.button("Document Store Statistics"):
+            doc_stats = client.document_store_statistics()
+            st.write(f"### Document Store: {doc_stats['chunks']} chunks, "
+                     f"{doc_stats['compression_ratio']}x compression")
+            st.json(doc_stats)
+
         st.subheader("List All Namespaces")
 
         if st.button("List Namespaces"):
@@ -323,35 +358,38 @@ def main():
                 # Specify the number of IDs per page
                 limit = st.number_input("Number of IDs per Page:", min_value=1, max_value=1000, value=100, step=1, key="ids_per_page_list")
 
-                # Initialize session state for pagination tokens
-                if 'pagination_token' not in st.session_state:
-                    st.session_state.pagination_token = None
+                # Tokens of the pages visited so far, the current page last; pages are cached by the client's
+                # ID pager, so reruns and going back do not fetch them again
+                listing = (selected_list_namespace, prefix, limit)
+                if st.session_state.get('id_listing') != listing:
+                    st.session_state.id_listing = listing
+                    st.session_state.page_tokens = [None]
 
                 # Function to reset pagination
                 def reset_pagination():
-                    st.session_state.pagination_token = None
+                    st.session_state.page_tokens = [None]
 
                 # Buttons for pagination
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     if st.button("Previous Page"):
-                        st.warning("Previous page functionality not implemented.")
+                        if len(st.session_state.page_tokens) > 1:
+                            st.session_state.page_tokens.pop()
+                        else:
+                            st.info("Already on the first page.")
                 with col2:
                     if st.button("Next Page"):
                         with st.spinner("Fetching next page of IDs..."):
-                            results = client.list_ids_in_namespace_paginated(
+                            current = client.list_ids_in_namespace_paginated(
                                 namespace=selected_list_namespace,
                                 prefix=prefix,
                                 limit=limit,
-                                pagination_token=st.session_state.pagination_token
+                                pagination_token=st.session_state.page_tokens[-1]
                             )
-                            if results and results["ids"]:
-                                st.session_state.pagination_token = results["next_token"]
-                                # Display IDs as a dropdown for selection
-                                selected_vector_id = st.selectbox("Select a Vector ID from Next Page", options=results["ids"], key="select_next_vector_id")
-                                st.write(f"Selected Vector ID: `{selected_vector_id}`")
+                            if current and current["next_token"]:
+                                st.session_state.page_tokens.append(current["next_token"])
                             else:
-                                st.warning("No IDs found in this page.")
+                                st.warning("This is the last page.")
                 with col3:
                     if st.button("Reset Pagination"):
                         reset_pagination()
@@ -359,19 +397,13 @@ def main():
 
                 # Display current page of IDs as a dropdown list
                 with st.spinner("Fetching vector IDs..."):
-                    if st.session_state.pagination_token:
-                        results = client.list_ids_in_namespace_paginated(
-                            namespace=selected_list_namespace,
-                            prefix=prefix,
-                            limit=limit,
-                            pagination_token=st.session_state.pagination_token
-                        )
-                    else:
-                        results = client.list_ids_in_namespace_paginated(
-                            namespace=selected_list_namespace,
-                            prefix=prefix,
-                            limit=limit
-                        )
+                    results = client.list_ids_in_namespace_paginated(
+                        namespace=selected_list_namespace,
+                        prefix=prefix,
+                        limit=limit,
+                        pagination_token=st.session_state.page_tokens[-1]
+                    )
+                    st.caption(f"Page {len(st.session_state.page_tokens)}")
 
                     if results and results["ids"]:
                         st.write("### Vector IDs:")
@@ -445,8 +477,7 @@ def main():
                                 metadata=metadata,
                                 namespace=namespace,
                                 chunk_size=8000,
-                                batch_size=500,
-                                max_workers=5
+                                batch_size=500
                             )
                             success_count += 1
                             st.success(f"Uploaded and upserted {file.name} successfully into namespace '{namespace}'.")
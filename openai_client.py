@@ -2,36 +2,37 @@
 
 import openai
 import streamlit as st
-from typing import List, Optional, Dict, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
 from datetime import datetime
 import json
 import yaml
 import jsonref
 from pinecone import Pinecone, ServerlessSpec
 import concurrent.futures
+from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
-import tiktoken
-def split_text_by_tokens(text: str, max_tokens: int = 8000) -> List[str]:
-    """
-    Splits the input text into smaller chunks not exceeding max_tokens tokens.
-    """
-    encoding = tiktoken.get_encoding("cl100k_base")  # Adjust based on your model's encoding
-    tokens = encoding.encode(text)
+from chunking import CHUNK_OVERLAP_TOKENS
+from document_store import get_document_store
+from embeddings import embed_texts
+from embedding_cache import get_embedding_cache
+from id_pager import IDPager, get_id_pager, invalidate_id_pages
+from ingest_pipeline import IngestJob, get_ingest_pipeline
+from lexical_index import HYBRID_CANDIDATES, HYBRID_SEARCH, get_lexical_index
+from query_cache import get_query_cache
+from retrieval import forget_chunks, lexical_candidates, rank_namespace, store_chunks, top_results, vector_candidates
+from sync_manifest import diff_manifest, get_sync_manifest
+from vector_store import VECTOR_STORE, LocalVectorStore, VectorStore, index_identity, scope_key
 
-    chunks = []
-    for i in range(0, len(tokens), max_tokens):
-        chunk_tokens = tokens[i:i + max_tokens]
-        chunk_text = encoding.decode(chunk_tokens)
-        chunks.append(chunk_text)
-
-    return chunks
+# Threads for a multi-namespace query: one vector query and one BM25 search per namespace
+QUERY_FANOUT_WORKERS = 16
 
 class OpenAIClient:
     """
     A client to interact with OpenAI's API and Pinecone Vector Store for Retrieval-Augmented Generation (RAG).
     """
 
-    def __init__(self, api_key: str, pinecone_api_key: str, pinecone_env: str, index_name: str):
+    def __init__(self, api_key: str, pinecone_api_key: str = "", pinecone_env: str = "", index_name: str = "",
+                 vector_store: Optional[VectorStore] = None):
         """
         Initializes the OpenAIClient with necessary credentials.
         """
@@ -42,24 +43,32 @@ class OpenAIClient:
         self.pinecone_env = pinecone_env
         self.index_name = index_name
 
-        # Initialize Pinecone
-        try:
-            self.pc = Pinecone(api_key=self.pinecone_api_key)
-            self.spec = ServerlessSpec(cloud='aws', region='us-east-1')  # Update as needed
-            if self.index_name not in self.pc.list_indexes().names():
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=1536,  # Dimensionality for text-embedding-ada-002
-                    metric='cosine',
-                    spec=self.spec
-                )
-                st.success(f"Pinecone index '{self.index_name}' created.")
-            else:
-                st.info(f"Pinecone index '{self.index_name}' already exists.")
+        if vector_store is not None or VECTOR_STORE == "local":
+            # In-process backend with the same interface as a Pinecone index
+            self.index = vector_store or LocalVectorStore()
+            st.info(f"Using a local vector store ({type(self.index).__name__}) instead of Pinecone.")
+        else:
+            # Initialize Pinecone
+            try:
+                self.pc = Pinecone(api_key=self.pinecone_api_key)
+                self.spec = ServerlessSpec(cloud='aws', region='us-east-1')  # Update as needed
+                if self.index_name not in self.pc.list_indexes().names():
+                    self.pc.create_index(
+                        name=self.index_name,
+                        dimension=1536,  # Dimensionality for text-embedding-ada-002
+                        metric='cosine',
+                        spec=self.spec
+                    )
+                    st.success(f"Pinecone index '{self.index_name}' created.")
+                else:
+                    st.info(f"Pinecone index '{self.index_name}' already exists.")
 
-            self.index = self.pc.Index(self.index_name)
-        except Exception as e:
-            st.error(f"Failed to initialize Pinecone: {e}")
+                self.index = self.pc.Index(self.index_name)
+            except Exception as e:
+                st.error(f"Failed to initialize Pinecone: {e}")
+
+        # Scopes the manifest, document store, lexical index and caches to this index
+        self.index_id = index_identity(getattr(self, "index", None), self.index_name)
 
     # -----------------------------
     # Helper Methods
@@ -89,80 +98,195 @@ class OpenAIClient:
     def upsert_batch(self, batch: List[tuple], namespace: str):
         """
         Upserts a batch of vectors into Pinecone within a specified namespace.
+
+        Runs on the ingest pipeline's upsert workers, outside the Streamlit script thread, so it logs with
+        loguru; the script thread shows the job's report once it finishes.
         """
         self.index.upsert(vectors=batch, namespace=namespace)
-        st.info(f"Upserted batch containing {len(batch)} vectors into namespace '{namespace}'.")
+        get_query_cache().invalidate(scope_key(self.index_id, namespace))
+        invalidate_id_pages(self.index_id, namespace)
+        logger.info(f"Upserted batch containing {len(batch)} vectors into namespace '{namespace}'.")
+
+    def upsert_embeddings(self, id: str, text: str, metadata: Dict[str, Any] = {}, namespace: str = "", chunk_size: int = 8000, batch_size: int = 500,
+                          chunk_overlap: int = CHUNK_OVERLAP_TOKENS):
+        """
+        Generates embeddings for the given text (split into chunks) and upserts them into Pinecone within a specified namespace using the ingest pipeline.
+        """
+        self.upsert_documents([{"id": id, "text": text, "metadata": metadata}], namespace=namespace,
+                              chunk_size=chunk_size, batch_size=batch_size, chunk_overlap=chunk_overlap)
+
+    def _ingest(self, items: Iterable[Any], namespace: str, chunk_size: int, batch_size: int, chunk_overlap: int,
+                render: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None,
+                stored: Optional[Dict[str, str]] = None) -> IngestJob:
+        """
+        Runs items through the shared render/chunk/embed/upsert pipeline into a namespace, recording the
+        content hash of every upserted vector in the sync manifest. Chunk text goes to the local document
+        store and the lexical index; the vectors only carry slim metadata.
+        """
+        manifest = get_sync_manifest()
+        return get_ingest_pipeline().run(
+            items,
+            upsert=lambda batch: self.upsert_batch(batch, namespace),
+            # Concurrency comes from the embed stage's workers; each call is one packed request
+            embed=lambda texts: embed_texts(texts, max_workers=1),
+            record=lambda hashes: manifest.record(scope_key(self.index_id, namespace), hashes),
+            store=lambda bodies: store_chunks(self.index_id, namespace, bodies),
+            render=render,
+            stored=stored,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            upsert_batch_size=batch_size,
+        )
 
-    def upsert_embeddings(self, id: str, text: str, metadata: Dict[str, Any] = {}, namespace: str = "", chunk_size: int = 8000, batch_size: int = 500, max_workers: int = 5):
+    def upsert_documents(self, documents: Iterable[Any], namespace: str = "", chunk_size: int = 8000, batch_size: int = 500,
+                         chunk_overlap: int = CHUNK_OVERLAP_TOKENS,
+                         render: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None) -> int:
         """
-        Generates embeddings for the given text (split into chunks) and upserts them into Pinecone within a specified namespace using parallel processing.
+        Chunks, embeds and upserts many documents through the ingest pipeline.
+
+        Rendering, chunking, embedding (many chunks per request) and upserting overlap, each stage with its
+        own workers, so the total time is close to that of the slowest stage.
+
+        Args:
+            documents (Iterable[Any]): Documents with "id", "text" and optional "metadata", or items for ``render``.
+            namespace (str): Pinecone namespace.
+            chunk_size (int): Maximum number of tokens per chunk.
+            batch_size (int): Maximum number of vectors per upsert batch.
+            chunk_overlap (int): Maximum tokens shared by consecutive chunks of a document.
+            render (Callable): Turns an item into a document, or None if it cannot.
+
+        Returns:
+            int: Number of vectors upserted.
         """
         try:
-            # Split the text into smaller chunks based on tokens
-            chunks = split_text_by_tokens(text, max_tokens=chunk_size)
-
-            vectors = []
-            for idx, chunk in enumerate(chunks):
-                # Generate a unique ID for each chunk
-                chunk_id = f"{id}_chunk_{idx}"
-
-                # Generate embedding for the chunk
-                embedding_response = openai.Embedding.create(
-                    input=chunk,
-                    model="text-embedding-ada-002"
-                )
-                embedding = embedding_response['data'][0]['embedding']
-
-                # Prepare the vector with metadata
-                vector_metadata = metadata.copy()
-                vector_metadata["chunk_id"] = chunk_id  # Example of adding more metadata
-
-                vectors.append((chunk_id, embedding, {"content": chunk, **vector_metadata}))
-
-            # Define a helper function for upserting a batch
-            def upsert_batch_wrapper(batch):
-                self.upsert_batch(batch, namespace)
-
-            # Batch upsert with parallel processing
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [
-                    executor.submit(upsert_batch_wrapper, vectors[i:i + batch_size])
-                    for i in range(0, len(vectors), batch_size)
-                ]
-                # Wait for all upserts to complete
-                concurrent.futures.wait(futures)
-
-            st.success(f"Successfully upserted all {len(vectors)} vectors with base ID: {id} into namespace '{namespace}'.")
+            job = self._ingest(documents, namespace, chunk_size, batch_size, chunk_overlap, render=render)
+            report = job.report()
+            st.success(
+                f"Successfully upserted {job.upserted} vectors into namespace '{namespace}' in "
+                f"{report['stages']['upsert']['calls']} batches, {report['seconds']:.1f}s "
+                f"({job.upserted / max(report['seconds'], 1e-9):.1f} chunks/s)."
+            )
+            if report["failed"]:
+                st.warning(f"{report['failed']} items failed: {report['errors']}")
+            with st.expander("Ingest pipeline stages"):
+                st.json(report["stages"])
+            return job.upserted
         except Exception as e:
             st.error(f"Failed to upsert embeddings: {e}")
+            return 0
 
-    def query_vector_store(self, query: str, top_k: int = 5, namespace: str = "") -> Optional[List[Dict]]:
+    def sync_documents(self, documents: Iterable[Any], namespace: str = "", chunk_size: int = 8000, batch_size: int = 500,
+                       chunk_overlap: int = CHUNK_OVERLAP_TOKENS, delete_batch_size: int = 1000,
+                       render: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None) -> Optional[Dict[str, Any]]:
         """
-        Queries the Pinecone Vector Store within a specified namespace using the provided query string.
+        Makes a namespace hold exactly the given documents, touching only what changed.
+
+        Documents go through the ingest pipeline, whose chunk stage compares each chunk's content hash with
+        the sync manifest: new and changed chunks are embedded and upserted and unchanged chunks are
+        skipped. Chunks no longer produced are then deleted in batches, unless some documents failed to
+        render or chunk. A namespace without a manifest is seeded from the IDs in the index, so stale
+        vectors from earlier uploads are removed too; so is one the index no longer has (recreated or
+        emptied elsewhere), after its recorded state is dropped. A namespace without a lexical index gets
+        one built from the stored text of its unchanged chunks. The manifest, document store and lexical
+        index are kept per index (``self.index_id``).
+
+        Args:
+            documents (Iterable[Any]): All documents the namespace should contain, or items for ``render``.
+            namespace (str): Pinecone namespace.
+            chunk_size (int): Maximum number of tokens per chunk.
+            batch_size (int): Maximum number of vectors per upsert batch.
+            chunk_overlap (int): Maximum tokens shared by consecutive chunks of a document.
+            delete_batch_size (int): Number of IDs per delete request.
+            render (Callable): Turns an item into a document, or None if it cannot.
+
+        Returns:
+            Optional[Dict[str, Any]]: Counts of added, changed, removed, unchanged and failed vectors and the
+            pipeline's stage report, or None on failure.
         """
         try:
-            embedding_response = openai.Embedding.create(
-                input=query,
-                model="text-embedding-ada-002"
-            )
-            query_embedding = embedding_response['data'][0]['embedding']
+            manifest = get_sync_manifest()
+            scope = scope_key(self.index_id, namespace)
+            stats = self.describe_index_statistics()
+            if manifest.has(scope) and stats and "namespaces" in stats and namespace not in stats["namespaces"]:
+                # The index lost the namespace (recreated, or emptied elsewhere); nothing the manifest lists is there
+                lost = list(manifest.get(scope))
+                manifest.forget(scope, lost)
+                forget_chunks(self.index_id, namespace, lost)
+            if not manifest.has(scope):
+                # Unknown hashes compare as changed: existing vectors are re-upserted (mostly from the embedding cache)
+                manifest.record(scope, {id: "" for id in self.list_ids_in_namespace(namespace)})
+            stored = manifest.get(scope)
 
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                namespace=namespace
+            job = self._ingest(documents, namespace, chunk_size, batch_size, chunk_overlap, render=render, stored=stored)
+            report = job.report()
+            diff = diff_manifest(stored, job.hashes)
+            if report["failed"]:
+                # A document that failed would look removed; keep its vectors until it syncs again
+                st.warning(f"{report['failed']} items failed, so no vectors were deleted: {report['errors']}")
+                diff.removed = []
+            for i in range(0, len(diff.removed), delete_batch_size):
+                batch = diff.removed[i:i + delete_batch_size]
+                self.index.delete(ids=batch, namespace=namespace)
+                manifest.forget(scope, batch)
+                forget_chunks(self.index_id, namespace, batch)
+            if diff.removed:
+                get_query_cache().invalidate(scope)
+                invalidate_id_pages(self.index_id, namespace)
+            if diff.unchanged and not get_lexical_index().has(scope):
+                get_lexical_index().add_many(scope, get_document_store().get_many(scope, diff.unchanged))
+
+            summary = {**diff.summary(), "failed": report["failed"]}
+            st.success(
+                f"Synced namespace '{namespace}' in {report['seconds']:.1f}s: {summary['added']} added, {summary['changed']} changed, "
+                f"{summary['removed']} removed, {summary['unchanged']} unchanged "
+                f"({report['upserted']} vectors upserted in {report['stages']['upsert']['calls']} batches)."
             )
+            return {**summary, "pipeline": report}
+        except Exception as e:
+            st.error(f"Failed to sync documents: {e}")
+            return None
 
-            formatted_results = []
-            for match in results.matches:
-                formatted_results.append({
-                    "id": match.id,
-                    "score": match.score,
-                    "content": match.metadata.get("content", "No content available")
-                })
+    def query_vector_store(self, query: str, top_k: int = 5, namespace: str = "",
+                           namespaces: Optional[Union[List[str], str]] = None) -> Optional[List[Dict]]:
+        """
+        Queries the Pinecone Vector Store within one or more namespaces using the provided query string.
+
+        The query is embedded once and every namespace is searched concurrently; with hybrid search on
+        (``HYBRID_SEARCH``), its BM25 index is searched alongside and the two candidate lists are merged by
+        reciprocal rank fusion, "score" then being the fused score. The best ``top_k`` results over all
+        namespaces are kept, and their text comes from the local document store.
+
+        Args:
+            query (str): The user's query.
+            top_k (int): Number of results over all namespaces.
+            namespace (str): Namespace to query when ``namespaces`` is not given.
+            namespaces (Union[List[str], str]): Namespaces to query, or "all" for every namespace in the index.
+
+        Returns:
+            Optional[List[Dict]]: Results with "id", "score", "content" and "namespace", best first.
+        """
+        try:
+            if namespaces is None:
+                namespaces = [namespace]
+            elif namespaces == "all":
+                namespaces = self.list_namespaces() or [""]
+            namespaces = list(dict.fromkeys(namespaces))
+            candidates = max(top_k, HYBRID_CANDIDATES) if HYBRID_SEARCH else top_k
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(2 * len(namespaces), QUERY_FANOUT_WORKERS)) as executor:
+                # BM25 runs while the query is embedded
+                lexical = {ns: executor.submit(lexical_candidates, self.index_id, ns, query, candidates)
+                           for ns in namespaces} if HYBRID_SEARCH else {}
+                # Repeated questions reuse the query embedding
+                query_embedding = get_query_cache().embedding(query, lambda text: embed_texts([text])[0])
+                dense = {ns: executor.submit(vector_candidates, self.index, self.index_id, query_embedding, candidates, ns) for ns in namespaces}
 
-            return formatted_results
+                ranked = []
+                for ns in namespaces:
+                    ranked.extend(rank_namespace(ns, dense[ns].result(), lexical[ns].result() if ns in lexical else None, top_k))
+
+            # Global top-k over all namespaces, with chunk text from the local document store
+            return top_results(ranked, top_k, self.index_id)
 
         except Exception as e:
             st.error(f"An error occurred during Vector Store query: {e}")
@@ -174,6 +298,10 @@ class OpenAIClient:
         """
         try:
             self.index.delete(ids=[id], namespace=namespace)
+            get_query_cache().invalidate(scope_key(self.index_id, namespace))
+            invalidate_id_pages(self.index_id, namespace)
+            get_sync_manifest().forget(scope_key(self.index_id, namespace), [id])
+            forget_chunks(self.index_id, namespace, [id])
             st.success(f"Deleted vector with ID: {id} from namespace '{namespace}' successfully.")
         except Exception as e:
             st.error(f"Failed to delete vector: {e}")
@@ -189,6 +317,25 @@ class OpenAIClient:
             st.error(f"Failed to retrieve index statistics: {e}")
             return None
 
+    def embedding_cache_statistics(self) -> Dict:
+        """
+        Hit ratio, embedding tokens saved and entry counts of the embedding cache; empty if it is disabled.
+        """
+        cache = get_embedding_cache()
+        return cache.stats() if cache else {}
+
+    def query_cache_statistics(self) -> Dict:
+        """
+        Hit and miss counts of the query embedding and result caches.
+        """
+        return get_query_cache().stats()
+
+    def document_store_statistics(self) -> Dict:
+        """
+        Chunk count and text/compressed sizes of the local document store.
+        """
+        return get_document_store().stats()
+
     def list_namespaces(self) -> Optional[List[str]]:
         """
         Lists all namespaces in the Pinecone index.
@@ -205,36 +352,46 @@ class OpenAIClient:
             st.error(f"Failed to list namespaces: {e}")
             return None
 
+    def id_pager(self, namespace: str = "", prefix: str = "", limit: int = 100) -> IDPager:
+        """
+        The pager over a namespace's IDs: pages are fetched lazily, the next one in the background, and
+        visited pages are cached until the namespace is written to.
+        """
+        def list_page(token: Optional[str]):
+            response = self.index.list_paginated(prefix=prefix, limit=limit, namespace=namespace, pagination_token=token)
+            return [v.id for v in response.vectors], response.pagination.next if response.pagination else None
+
+        return get_id_pager(self.index_id, namespace, prefix, limit, list_page)
+
+    def iter_ids_in_namespace(self, namespace: str = "", prefix: str = "", limit: int = 100,
+                              pagination_token: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields the vector IDs in a namespace page by page, starting at ``pagination_token`` if given.
+        """
+        return self.id_pager(namespace, prefix, limit).ids(pagination_token)
+
     def list_ids_in_namespace(self, namespace: str = "", prefix: str = "", limit: int = 100) -> List[str]:
         """
         Lists all vector IDs in a specified namespace with optional prefix and limit.
         Handles pagination automatically.
         """
         try:
-            ids = []
-            for batch in self.index.list(namespace=namespace, prefix=prefix, limit=limit):
-                ids.extend(batch)
-            return ids
+            return list(self.iter_ids_in_namespace(namespace=namespace, prefix=prefix, limit=limit))
         except Exception as e:
             st.error(f"Failed to list IDs in namespace '{namespace}': {e}")
             return []
 
-    def list_ids_in_namespace_paginated(self, namespace: str = "", prefix: str = "", limit: int = 100) -> Optional[Dict]:
+    def list_ids_in_namespace_paginated(self, namespace: str = "", prefix: str = "", limit: int = 100,
+                                        pagination_token: Optional[str] = None) -> Optional[Dict]:
         """
-        Lists vector IDs in a specified namespace with pagination.
+        Lists one page of vector IDs in a specified namespace, the first page or the one at ``pagination_token``.
         Returns a dictionary with IDs and the next pagination token.
         """
         try:
-            response = self.index.list_paginated(
-                prefix=prefix,
-                limit=limit,
-                namespace=namespace
-            )
-            ids = [v.id for v in response.vectors]
-            next_token = response.pagination.next if response.pagination else None
+            page = self.id_pager(namespace, prefix, limit).page(pagination_token)
             return {
-                "ids": ids,
-                "next_token": next_token
+                "ids": page.ids,
+                "next_token": page.next_token
             }
         except Exception as e:
             st.error(f"Failed to list IDs with pagination in namespace '{namespace}': {e}")
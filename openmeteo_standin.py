@@ -0,0 +1,123 @@
+# openmeteo_standin.py
+
+import argparse
+import contextlib
+import math
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Tuple
+
+from aiohttp import web
+
+"""
+    Open-Meteo stand-in
+    - A local aiohttp server answering the subset of the Open-Meteo API used by the weather tools
+    - Values are deterministic functions of the coordinates and dates, so runs are repeatable
+    - Counts the requests and locations it served (app["stats"]), to check how calls are batched
+    - Usage: python openmeteo_standin.py --port 8765, then set OPEN_METEO_FORECAST_URL=http://127.0.0.1:8765/v1/forecast
+"""
+
+
+def _floats(value: str) -> List[float]:
+    return [float(part) for part in value.split(",") if part != ""]
+
+
+def _temperature(latitude: float, longitude: float, day_of_year: int) -> float:
+    seasonal = 10.0 * math.cos(2 * math.pi * (day_of_year - 200) / 365.0) * (1 if latitude >= 0 else -1)
+    return round(30.0 - abs(latitude) * 0.5 + seasonal + (longitude % 7) * 0.1, 1)
+
+
+async def forecast(request: web.Request) -> web.Response:
+    latitudes = _floats(request.query.get("latitude", ""))
+    longitudes = _floats(request.query.get("longitude", ""))
+    if not latitudes or len(latitudes) != len(longitudes):
+        return web.json_response({"error": True, "reason": "latitude and longitude must have the same length"}, status=400)
+
+    stats = request.app["stats"]
+    stats["forecast_requests"] += 1
+    stats["locations"] += len(latitudes)
+
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    now = now.replace(minute=now.minute - now.minute % 15)
+    entries = [{
+        "latitude": lat,
+        "longitude": lon,
+        "current_weather": {
+            "time": now.strftime("%Y-%m-%dT%H:%M"),
+            "interval": 900,
+            "temperature": _temperature(lat, lon, now.timetuple().tm_yday),
+            "windspeed": round(5 + (abs(lat) + abs(lon)) % 20, 1),
+            "winddirection": int((lat * 7 + lon * 3) % 360),
+            "weathercode": int(abs(lat + lon)) % 4,
+        },
+    } for lat, lon in zip(latitudes, longitudes)]
+    return web.json_response(entries if len(entries) > 1 else entries[0])
+
+
+async def archive(request: web.Request) -> web.Response:
+    try:
+        latitude = float(request.query["latitude"])
+        longitude = float(request.query["longitude"])
+        start = date.fromisoformat(request.query["start_date"])
+        end = date.fromisoformat(request.query["end_date"])
+    except (KeyError, ValueError):
+        return web.json_response({"error": True, "reason": "invalid parameters"}, status=400)
+
+    stats = request.app["stats"]
+    stats["archive_requests"] += 1
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    stats["archive_days"] += len(days)
+
+    maxima = [_temperature(latitude, longitude, d.timetuple().tm_yday) + 4 for d in days]
+    return web.json_response({
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": {
+            "time": [d.isoformat() for d in days],
+            "temperature_2m_max": [round(t, 1) for t in maxima],
+            "temperature_2m_min": [round(t - 8, 1) for t in maxima],
+        },
+    })
+
+
+def create_app() -> web.Application:
+    """
+    Builds the stand-in application.
+    """
+    app = web.Application()
+    app["stats"] = {"forecast_requests": 0, "archive_requests": 0, "locations": 0, "archive_days": 0}
+    app.router.add_get("/v1/forecast", forecast)
+    app.router.add_get("/v1/archive", archive)
+    return app
+
+
+@contextlib.asynccontextmanager
+async def run_standin(host: str = "127.0.0.1", port: int = 0) -> AsyncIterator[Tuple[str, Dict[str, int]]]:
+    """
+    Runs the stand-in for the duration of an ``async with`` block.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind; 0 picks a free port.
+
+    Yields:
+        Tuple[str, Dict[str, int]]: Base URL of the running stand-in (e.g. ``http://127.0.0.1:54321``)
+        and its live request counters.
+    """
+    app = create_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}", app["stats"]
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Open-Meteo stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
@@ -0,0 +1,198 @@
+# quantization.py
+
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import numpy as np
+
+"""
+    Vector quantization for the local vector store
+    - ``ScalarQuantizer``: int8 per dimension, 1 byte per dimension (4x smaller than float32)
+    - ``ProductQuantizer``: the vector split into ``m`` sub-vectors, each stored as the 1-byte ID of its
+      nearest of 256 centroids (1,536 dims in 96 subspaces: 96 bytes, 64x smaller)
+    - Scores are asymmetric: the query stays float32 and is scored against the codes directly (scaled int8
+      dot products, or per-subspace lookup tables for PQ), without decoding the stored vectors
+    - The store scans the codes and re-scores a shortlist of ``RERANK_FACTOR * top_k`` rows at full precision
+"""
+
+QUANTIZATION_KINDS = ("none", "int8", "pq")
+VECTOR_STORE_QUANTIZATION = os.getenv("VECTOR_STORE_QUANTIZATION", "none")
+
+# Namespaces smaller than this are scanned at full precision; quantizers need rows to train on
+QUANTIZE_MIN_ROWS = int(os.getenv("QUANTIZE_MIN_ROWS", "1024"))
+RERANK_FACTOR = int(os.getenv("QUANTIZE_RERANK_FACTOR", "8"))
+TRAINING_ROWS = 16384
+
+PQ_SUBSPACES = int(os.getenv("PQ_SUBSPACES", "96"))
+PQ_CENTROIDS = 256
+# k-means needs about 40 rows per centroid; more only slows training
+PQ_TRAINING_ROWS = 40 * PQ_CENTROIDS
+PQ_TRAINING_ITERATIONS = 10
+
+# Rows decoded or looked up per block: small enough for the float32 temporaries to stay in cache
+SCORE_BLOCK_ROWS = 2048
+
+
+class Quantizer(ABC):
+    """
+    Encodes unit vectors into compact codes and scores float queries against codes.
+    """
+
+    kind: str
+    code_dtype: np.dtype
+
+    def __init__(self, trained_rows: int):
+        self.trained_rows = trained_rows
+
+    @property
+    @abstractmethod
+    def code_width(self) -> int:
+        """
+        Code bytes per vector.
+        """
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def _score_block(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def state(self) -> Dict[str, np.ndarray]:
+        """
+        Arrays to save the quantizer with; ``load_quantizer`` restores it from them.
+        """
+
+    def scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Approximate inner products of float32 queries (q, dimension) with every row of ``codes``, as (rows, q).
+        """
+        blocks = [self._score_block(np.asarray(codes[start:start + SCORE_BLOCK_ROWS]), queries)
+                  for start in range(0, len(codes), SCORE_BLOCK_ROWS)]
+        return np.concatenate(blocks) if blocks else np.zeros((0, len(queries)), np.float32)
+
+
+class ScalarQuantizer(Quantizer):
+    """
+    Symmetric int8 quantization with one scale per dimension, taken from the training rows' largest
+    magnitude in that dimension; values beyond it are clipped.
+    """
+
+    kind = "int8"
+    code_dtype = np.dtype(np.int8)
+
+    def __init__(self, scale: np.ndarray, trained_rows: int):
+        super().__init__(trained_rows)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def train(cls, sample: np.ndarray, trained_rows: int) -> "ScalarQuantizer":
+        peak = np.abs(sample.astype(np.float32)).max(axis=0)
+        return cls(np.where(peak > 0, peak, 1.0) / 127.0, trained_rows)
+
+    @property
+    def code_width(self) -> int:
+        return len(self.scale)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def _score_block(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        # sum(code * scale * query): the scale folds into the queries, and each block is decoded once for all of them
+        return codes.astype(np.float32) @ (queries * self.scale).T
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+
+class ProductQuantizer(Quantizer):
+    """
+    Product quantization with ``PQ_CENTROIDS`` Euclidean k-means centroids per subspace.
+    """
+
+    kind = "pq"
+    code_dtype = np.dtype(np.uint8)
+
+    def __init__(self, centroids: np.ndarray, trained_rows: int):
+        super().__init__(trained_rows)
+        # (m, centroids, sub_dimension)
+        self.centroids = centroids.astype(np.float32)
+        self._norms = (self.centroids ** 2).sum(axis=2)
+        self._offsets = (np.arange(len(self.centroids)) * self.centroids.shape[1]).astype(np.int32)
+
+    @staticmethod
+    def subspaces(dimension: int, requested: int = PQ_SUBSPACES) -> int:
+        """
+        The largest subspace count up to ``requested`` that divides ``dimension``.
+        """
+        return max(m for m in range(1, min(requested, dimension) + 1) if dimension % m == 0)
+
+    @classmethod
+    def train(cls, sample: np.ndarray, trained_rows: int, m: Optional[int] = None, seed: int = 0) -> "ProductQuantizer":
+        rng = np.random.default_rng(seed)
+        sample = sample.astype(np.float32)
+        if len(sample) > PQ_TRAINING_ROWS:
+            sample = sample[rng.choice(len(sample), size=PQ_TRAINING_ROWS, replace=False)]
+        m = m or cls.subspaces(sample.shape[1])
+        k = min(PQ_CENTROIDS, len(sample))
+        parts = sample.reshape(len(sample), m, -1)
+        centroids = np.empty((m, k, parts.shape[2]), dtype=np.float32)
+        for j in range(m):
+            # Euclidean k-means in each subspace; nearest centroid is the argmax of 2 x.c - |c|^2
+            points = np.ascontiguousarray(parts[:, j])
+            means = points[rng.choice(len(points), size=k, replace=False)]
+            for _ in range(PQ_TRAINING_ITERATIONS):
+                distances = points @ (2 * means.T)
+                distances -= (means ** 2).sum(axis=1)
+                labels = np.argmax(distances, axis=1)
+                counts = np.bincount(labels, minlength=k)
+                sums = np.stack([np.bincount(labels, weights=points[:, d], minlength=k) for d in range(points.shape[1])], axis=1)
+                filled = counts > 0
+                means[filled] = sums[filled] / counts[filled, None]
+                # Re-seed empty centroids from random sample rows
+                means[~filled] = points[rng.choice(len(points), size=int((~filled).sum()))]
+            centroids[j] = means
+        return cls(centroids, trained_rows)
+
+    @property
+    def code_width(self) -> int:
+        return len(self.centroids)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        m, _, sub = self.centroids.shape
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            parts = vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32).reshape(-1, m, sub)
+            for j in range(m):
+                distances = parts[:, j] @ (2 * self.centroids[j].T)
+                distances -= self._norms[j]
+                codes[start:start + len(parts), j] = np.argmax(distances, axis=1)
+        return codes
+
+    def _score_block(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        # Lookup tables of each query's inner product with every centroid of every subspace
+        tables = np.einsum("qjd,jkd->qjk", queries.reshape(len(queries), len(self.centroids), -1), self.centroids)
+        positions = codes.astype(np.int32) + self._offsets
+        return np.stack([table.ravel()[positions].sum(axis=1) for table in tables], axis=1)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+
+def train_quantizer(kind: str, sample: np.ndarray, trained_rows: int) -> Quantizer:
+    if kind == "int8":
+        return ScalarQuantizer.train(sample, trained_rows)
+    if kind == "pq":
+        return ProductQuantizer.train(sample, trained_rows)
+    raise ValueError(f"Unknown quantization {kind!r}; expected one of {QUANTIZATION_KINDS}")
+
+
+def load_quantizer(kind: str, state: Dict[str, np.ndarray], trained_rows: int) -> Quantizer:
+    if kind == "int8":
+        return ScalarQuantizer(state["scale"], trained_rows)
+    if kind == "pq":
+        return ProductQuantizer(state["centroids"], trained_rows)
+    raise ValueError(f"Unknown quantization {kind!r}; expected one of {QUANTIZATION_KINDS}")
@@ -0,0 +1,191 @@
+# query_cache.py
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+"""
+    Query cache for the RAG client
+    - Level 1: normalized query text -> query embedding, so a repeated question skips the embeddings call
+    - Level 2: (index and namespace, version, embedding bucket, top_k) -> results, so a repeated or
+      near-identical question skips the vector store. Buckets are sign patterns of the embedding against
+      fixed random hyperplanes; within a bucket a result is only reused when the cached query embedding
+      is at least ``QUERY_CACHE_SIMILARITY`` similar to the new one
+    - Namespaces are passed as ``vector_store.scope_key`` of the index and the namespace, so indexes
+      sharing a namespace name never share results
+    - Upserting into or deleting from a namespace bumps its version, which orphans its results; results
+      are stored under the version read before the query ran, so a query racing a write cannot store
+      pre-write results as current. A TTL covers writes made by other processes
+"""
+
+QUERY_CACHE_EMBEDDINGS = int(os.getenv("QUERY_CACHE_EMBEDDINGS", "4096"))
+QUERY_CACHE_RESULTS = int(os.getenv("QUERY_CACHE_RESULTS", "1024"))
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.98"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))
+BUCKET_BITS = 8
+
+
+def normalize_query(text: str) -> str:
+    """
+    Case-, whitespace- and trailing-punctuation-insensitive form of a query.
+    """
+    return re.sub(r"\s+", " ", text.casefold()).strip().rstrip("?!. ")
+
+
+class QueryCache:
+    """
+    Two-level cache of query embeddings and vector store results.
+
+    Args:
+        max_embeddings (int): Query embeddings kept, least recently used evicted first.
+        max_results (int): Result entries kept, least recently used evicted first.
+        similarity (float): Minimum cosine similarity for reusing another query's results.
+        ttl (float): Seconds a result entry is served for.
+        clock (Callable[[], float]): Monotonic time source in seconds.
+    """
+
+    def __init__(self, max_embeddings: int = QUERY_CACHE_EMBEDDINGS, max_results: int = QUERY_CACHE_RESULTS,
+                 similarity: float = QUERY_CACHE_SIMILARITY, ttl: float = QUERY_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_embeddings = max_embeddings
+        self.max_results = max_results
+        self.similarity = similarity
+        self.ttl = ttl
+        self.clock = clock
+        self._embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        # Result key -> [(unit query embedding, results, stored at)]
+        self._results: "OrderedDict[Tuple, List[Tuple[np.ndarray, List[Dict], float]]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._hyperplanes: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._counters = {"embedding_hits": 0, "embedding_misses": 0, "result_hits": 0, "result_misses": 0,
+                          "invalidations": 0}
+
+    def embedding(self, text: str, embed: Callable[[str], List[float]]) -> List[float]:
+        """
+        Embedding of ``text``, calling ``embed`` only for queries not seen before.
+        """
+        key = normalize_query(text)
+        with self._lock:
+            embedding = self._embeddings.get(key)
+            if embedding is not None:
+                self._embeddings.move_to_end(key)
+                self._counters["embedding_hits"] += 1
+                return embedding
+            self._counters["embedding_misses"] += 1
+        embedding = embed(text)
+        self._put_embedding(key, embedding)
+        return embedding
+
+    async def aembedding(self, text: str, embed: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        """
+        ``embedding`` with a coroutine function as ``embed``.
+        """
+        key = normalize_query(text)
+        with self._lock:
+            embedding = self._embeddings.get(key)
+            if embedding is not None:
+                self._embeddings.move_to_end(key)
+                self._counters["embedding_hits"] += 1
+                return embedding
+            self._counters["embedding_misses"] += 1
+        embedding = await embed(text)
+        self._put_embedding(key, embedding)
+        return embedding
+
+    def _put_embedding(self, key: str, embedding: List[float]):
+        with self._lock:
+            self._embeddings[key] = embedding
+            while len(self._embeddings) > self.max_embeddings:
+                self._embeddings.popitem(last=False)
+
+    def _key(self, namespace: str, unit: np.ndarray, top_k: int) -> Tuple:
+        if self._hyperplanes is None or self._hyperplanes.shape[1] != len(unit):
+            self._hyperplanes = np.random.default_rng(0).standard_normal((BUCKET_BITS, len(unit))).astype(np.float32)
+        bucket = int(np.packbits(self._hyperplanes @ unit > 0)[0])
+        return namespace, self._versions.get(namespace, 0), bucket, top_k
+
+    def version(self, namespace: str) -> int:
+        """
+        Current write version of a namespace; read it before querying the index and pass it to ``put_results``.
+        """
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get_results(self, namespace: str, embedding: Sequence[float], top_k: int) -> Optional[List[Dict]]:
+        """
+        Cached results for this or a near-identical query embedding, or None.
+        """
+        unit = self._unit(embedding)
+        now = self.clock()
+        with self._lock:
+            key = self._key(namespace, unit, top_k)
+            for cached, results, stored_at in self._results.get(key, ()):
+                if now - stored_at < self.ttl and float(cached @ unit) >= self.similarity:
+                    self._results.move_to_end(key)
+                    self._counters["result_hits"] += 1
+                    return [dict(result) for result in results]
+            self._counters["result_misses"] += 1
+            return None
+
+    def put_results(self, namespace: str, embedding: Sequence[float], top_k: int, results: List[Dict],
+                    version: Optional[int] = None):
+        """
+        Stores the results of a query made at ``version`` of the namespace; results older than the current
+        version are dropped.
+        """
+        unit = self._unit(embedding)
+        now = self.clock()
+        with self._lock:
+            if version is not None and version != self._versions.get(namespace, 0):
+                return
+            key = self._key(namespace, unit, top_k)
+            entries = [entry for entry in self._results.get(key, ()) if now - entry[2] < self.ttl]
+            entries.append((unit, [dict(result) for result in results], now))
+            self._results[key] = entries
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    def invalidate(self, namespace: str):
+        """
+        Drops the results of ``namespace`` after its vectors changed.
+        """
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            for key in [key for key in self._results if key[0] == namespace]:
+                del self._results[key]
+            self._counters["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["embeddings"] = len(self._embeddings)
+            stats["result_entries"] = len(self._results)
+            return stats
+
+
+_cache: Optional[QueryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    """
+    The process-wide query cache; it outlives the per-rerun clients Streamlit creates.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QueryCache()
+        return _cache
@@ -0,0 +1,85 @@
+# retrieval.py
+
+import heapq
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from document_store import get_document_store
+from lexical_index import get_lexical_index, reciprocal_rank_fusion
+from query_cache import get_query_cache
+from vector_store import scope_key
+
+"""
+    Retrieval steps shared by the sync and async RAG clients
+    - Chunk text goes to the document store and the lexical index together, and leaves them together
+    - Vector candidates go through the query result cache
+    - Per-namespace rank fusion, the global top-k over namespaces and content hydration
+    - Local state is keyed by the index identity as well as the namespace (``vector_store.scope_key``)
+"""
+
+# (score, namespace, id, content from legacy vector metadata or None)
+Ranked = Tuple[float, str, str, Optional[str]]
+
+
+def store_chunks(index_id: str, namespace: str, bodies: Dict[str, str]):
+    scope = scope_key(index_id, namespace)
+    get_document_store().put_many(scope, bodies)
+    get_lexical_index().add_many(scope, bodies)
+
+
+def forget_chunks(index_id: str, namespace: str, ids: Sequence[str]):
+    scope = scope_key(index_id, namespace)
+    get_document_store().delete(scope, ids)
+    get_lexical_index().delete(scope, ids)
+
+
+def lexical_candidates(index_id: str, namespace: str, query: str, top_k: int) -> List[Tuple[str, float]]:
+    return get_lexical_index().search(scope_key(index_id, namespace), query, top_k)
+
+
+def vector_candidates(index, index_id: str, query_embedding: List[float], top_k: int, namespace: str) -> List[Dict]:
+    """
+    The ``top_k`` nearest vectors as {"id", "score", "content"}; content is only set for vectors that still
+    carry their text in metadata.
+    """
+    # Unchanged namespaces reuse the results of similar earlier queries
+    cache = get_query_cache()
+    scope = scope_key(index_id, namespace)
+    version = cache.version(scope)
+    cached = cache.get_results(scope, query_embedding, top_k)
+    if cached is not None:
+        return cached
+
+    results = index.query(vector=query_embedding, top_k=top_k, include_metadata=True, namespace=namespace)
+    candidates = [{"id": match.id, "score": match.score, "content": (match.metadata or {}).get("content")}
+                  for match in results.matches]
+    cache.put_results(scope, query_embedding, top_k, candidates, version=version)
+    return candidates
+
+
+def rank_namespace(namespace: str, dense: List[Dict], lexical: Optional[List[Tuple[str, float]]], top_k: int) -> List[Ranked]:
+    """
+    A namespace's results: the vector candidates as they are, or fused with the BM25 ranking if given.
+    """
+    if lexical is None:
+        return [(match["score"], namespace, match["id"], match["content"]) for match in dense]
+    legacy = {match["id"]: match["content"] for match in dense}
+    fused = reciprocal_rank_fusion([list(legacy), [id for id, _ in lexical]])
+    return [(score, namespace, id, legacy.get(id)) for id, score in fused[:top_k]]
+
+
+def top_results(ranked: List[Ranked], top_k: int, index_id: str) -> List[Dict]:
+    """
+    The global top-k over all namespaces, as {"id", "score", "namespace", "content"}.
+    """
+    best = heapq.nlargest(top_k, ranked, key=lambda result: result[0])
+
+    # One batched local read per namespace for the returned chunk bodies; vectors upserted before the
+    # document store existed still carry their text in metadata
+    ids: Dict[str, List[str]] = {}
+    for _, namespace, id, _ in best:
+        ids.setdefault(namespace, []).append(id)
+    bodies = {namespace: get_document_store().get_many(scope_key(index_id, namespace), namespace_ids)
+              for namespace, namespace_ids in ids.items()}
+    return [{"id": id, "score": score, "namespace": namespace,
+             "content": bodies[namespace].get(id) or content or "No content available"}
+            for score, namespace, id, content in best]
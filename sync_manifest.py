@@ -0,0 +1,133 @@
+# sync_manifest.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+"""
+    Spec-to-index sync manifest
+    - Records, per namespace, the content hash of every vector the client has upserted
+    - Diffing freshly generated chunks against it tells a sync which vectors to embed and upsert (new or
+      changed), which to delete (gone from the spec) and which to leave alone
+    - The hash covers the chunk text and the metadata stored with it, except volatile fields such as the
+      upload timestamp
+"""
+
+SYNC_MANIFEST_DB = os.getenv("SYNC_MANIFEST_DB", ".sync_manifest.sqlite")
+
+# Metadata that changes on every upload without changing the vector
+VOLATILE_METADATA = ("timestamp", "chunk_id")
+
+
+def content_hash(text: str, metadata: Optional[Mapping[str, Any]] = None) -> str:
+    stable = {key: value for key, value in (metadata or {}).items() if key not in VOLATILE_METADATA}
+    payload = text + "\0" + json.dumps(stable, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ManifestDiff:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def upserts(self) -> List[str]:
+        return self.added + self.changed
+
+    def summary(self) -> Dict[str, int]:
+        return {"added": len(self.added), "changed": len(self.changed), "removed": len(self.removed),
+                "unchanged": len(self.unchanged)}
+
+
+def diff_manifest(stored: Mapping[str, str], current: Mapping[str, str]) -> ManifestDiff:
+    """
+    Compares stored vector hashes with the hashes of the vectors a sync would write.
+
+    Args:
+        stored (Mapping[str, str]): Vector ID -> hash from the manifest.
+        current (Mapping[str, str]): Vector ID -> hash of the newly generated chunks.
+
+    Returns:
+        ManifestDiff: IDs to add, replace, delete and keep, in ``current``/``stored`` order.
+    """
+    diff = ManifestDiff()
+    for id, digest in current.items():
+        if id not in stored:
+            diff.added.append(id)
+        elif stored[id] != digest:
+            diff.changed.append(id)
+        else:
+            diff.unchanged.append(id)
+    diff.removed = [id for id in stored if id not in current]
+    return diff
+
+
+class SyncManifest:
+    """
+    SQLite-backed (namespace, vector ID) -> content hash table.
+
+    Args:
+        path (str): Database file; ``:memory:`` for a throwaway manifest.
+    """
+
+    def __init__(self, path: str = SYNC_MANIFEST_DB):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            " namespace TEXT NOT NULL, vector_id TEXT NOT NULL, content_hash TEXT NOT NULL,"
+            " PRIMARY KEY (namespace, vector_id)) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def get(self, namespace: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT vector_id, content_hash FROM manifest WHERE namespace = ?", (namespace,)
+            )
+            return dict(rows.fetchall())
+
+    def has(self, namespace: str) -> bool:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT 1 FROM manifest WHERE namespace = ? LIMIT 1", (namespace,)
+            ).fetchone() is not None
+
+    def record(self, namespace: str, hashes: Mapping[str, str]):
+        """
+        Stores the hashes of vectors just upserted.
+        """
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO manifest VALUES (?, ?, ?)",
+                                         [(namespace, id, digest) for id, digest in hashes.items()])
+            self._connection.commit()
+
+    def forget(self, namespace: str, ids: Iterable[str]):
+        """
+        Drops vectors just deleted.
+        """
+        with self._lock:
+            self._connection.executemany("DELETE FROM manifest WHERE namespace = ? AND vector_id = ?",
+                                         [(namespace, id) for id in ids])
+            self._connection.commit()
+
+
+_manifest: Optional[SyncManifest] = None
+_manifest_lock = threading.Lock()
+
+
+def get_sync_manifest() -> SyncManifest:
+    """
+    The process-wide manifest, opened on first use.
+    """
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = SyncManifest()
+        return _manifest
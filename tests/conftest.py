@@ -0,0 +1,41 @@
+# tests/conftest.py
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+# The modules under test live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openmeteo_standin import run_standin  # noqa: E402
+
+
+@pytest.fixture
+def openmeteo():
+    """
+    An Open-Meteo stand-in served from its own thread and event loop, so both the sync and the async
+    weather tools can call it. Yields its base URL and live request counters.
+    """
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    stop = asyncio.Event()
+    served = {}
+
+    async def serve():
+        async with run_standin() as (url, stats):
+            served["url"], served["stats"] = url, stats
+            started.set()
+            await stop.wait()
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True)
+    thread.start()
+    assert started.wait(10), "Open-Meteo stand-in did not start"
+    try:
+        yield served["url"], served["stats"]
+    finally:
+        loop.call_soon_threadsafe(stop.set)
+        thread.join(10)
+        loop.close()
@@ -0,0 +1,55 @@
+# tests/test_embedding_cache.py
+
+import os
+
+from embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-ada-002"
+
+
+def test_instances_sharing_a_directory_keep_their_rows(tmp_path):
+    a = EmbeddingCache(str(tmp_path))
+    b = EmbeddingCache(str(tmp_path))
+
+    a.put_many(MODEL, ["x"], [[1.0, 1.0]], [1])
+    b.put_many(MODEL, ["y"], [[2.0, 2.0]], [1])
+    a.put_many(MODEL, ["w"], [[4.0, 4.0]], [1])
+
+    assert b.get_many(MODEL, ["y"]) == [[2.0, 2.0]]
+    assert a.get_many(MODEL, ["x", "w"]) == [[1.0, 1.0], [4.0, 4.0]]
+
+    c = EmbeddingCache(str(tmp_path))
+    c.put_many(MODEL, ["z"], [[3.0, 3.0]], [1])
+    assert c.get_many(MODEL, ["x", "y", "z", "w"]) == [[1.0, 1.0], [2.0, 2.0], [3.0, 3.0], [4.0, 4.0]]
+
+
+def test_rows_stored_by_another_instance_are_not_appended_again(tmp_path):
+    a = EmbeddingCache(str(tmp_path))
+    b = EmbeddingCache(str(tmp_path))
+
+    a.put_many(MODEL, ["x"], [[1.0, 1.0]], [1])
+    b.put_many(MODEL, ["x", "y"], [[1.0, 1.0], [2.0, 2.0]], [1, 1])
+
+    assert b.stats()["stored"] == 1
+    assert b.get_many(MODEL, ["x", "y"]) == [[1.0, 1.0], [2.0, 2.0]]
+    vectors = os.path.join(str(tmp_path), MODEL, "vectors.f32")
+    assert os.path.getsize(vectors) == 2 * 2 * 4
+
+
+def test_interrupted_append_is_truncated_on_open(tmp_path):
+    a = EmbeddingCache(str(tmp_path))
+    a.put_many(MODEL, ["x", "y"], [[1.0, 1.0], [2.0, 2.0]], [1, 1])
+    with open(os.path.join(str(tmp_path), MODEL, "vectors.f32"), "ab") as f:
+        f.write(b"\0" * 12)
+
+    b = EmbeddingCache(str(tmp_path))
+    b.put_many(MODEL, ["z"], [[3.0, 3.0]], [1])
+
+    assert b.get_many(MODEL, ["x", "y", "z"]) == [[1.0, 1.0], [2.0, 2.0], [3.0, 3.0]]
+
+
+def test_digests_ending_in_nul_survive_a_reload(tmp_path):
+    # sha256 of "3-4" ends in a NUL byte
+    EmbeddingCache(str(tmp_path)).put_many(MODEL, ["3-4"], [[3.0, 4.0]], [1])
+
+    assert EmbeddingCache(str(tmp_path)).get_many(MODEL, ["3-4"]) == [[3.0, 4.0]]
@@ -0,0 +1,28 @@
+# tests/test_locations.py
+
+import pytest
+
+from locations import LocationResolver
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return LocationResolver()
+
+
+@pytest.mark.parametrize("text, label", [
+    ("Portland, Maine", "Portland, ME"),
+    ("Portland, OR", "Portland, OR"),
+    ("Osaka, Japan", "Osaka, JP"),
+    ("Paris, France", "Paris, FR"),
+    ("Manchester, England", "Manchester, GB"),
+    ("Busan, South Korea", "Busan, KR"),
+    ("Rotterdam, Holland", "Rotterdam, NL"),
+])
+def test_qualifiers_pick_the_place(resolver, text, label):
+    assert resolver.resolve(text).label == label
+
+
+@pytest.mark.parametrize("text", ["Portland, NYC", "Osaka, Tokio", "Manchester, London", "Paris, TX", "London, Ontario"])
+def test_other_city_names_and_unknown_regions_are_not_qualifiers(resolver, text):
+    assert resolver.resolve(text) is None
@@ -0,0 +1,93 @@
+# tests/test_weather_tools.py
+
+import functools
+import json
+
+import pytest
+
+import weather_tools
+from weather_tools import MAX_LOCATIONS_PER_REQUEST, get_batch_weather
+
+COLUMNS = ["location", "temperature_c", "windspeed_kmh", "weathercode", "time"]
+
+
+def cities(count: int):
+    # Spread far enough apart that every city is its own cache cell
+    return [{"name": f"City {i}", "latitude": -60 + i * 0.37, "longitude": -150 + i * 0.91} for i in range(count)]
+
+
+@pytest.fixture
+def forecast(openmeteo, monkeypatch):
+    url, stats = openmeteo
+    monkeypatch.setattr(weather_tools, "OPEN_METEO_FORECAST_URL", f"{url}/v1/forecast")
+    weather_tools.weather_cache.clear()
+    yield stats
+    weather_tools.weather_cache.clear()
+
+
+@pytest.mark.parametrize("count, requests", [(1, 1), (40, 1), (MAX_LOCATIONS_PER_REQUEST, 1),
+                                             (MAX_LOCATIONS_PER_REQUEST + 1, 2), (250, 3)])
+def test_batches_locations_into_few_requests(forecast, count, requests):
+    result = json.loads(get_batch_weather(cities(count)))
+
+    assert forecast["forecast_requests"] == requests
+    assert forecast["locations"] == count
+    assert all(row[1] is not None for row in result["rows"])
+
+
+def test_repeated_and_duplicate_locations_are_not_refetched(forecast):
+    locations = cities(30)
+    get_batch_weather(locations + locations[:5])
+    assert forecast["forecast_requests"] == 1
+    assert forecast["locations"] == 30
+
+    get_batch_weather(locations)
+    assert forecast["forecast_requests"] == 1
+
+
+def test_splits_requests_when_the_url_is_too_long(forecast, monkeypatch):
+    max_url_length = 300
+    plan = functools.partial(weather_tools.plan_requests, max_url_length=max_url_length)
+    monkeypatch.setattr(weather_tools, "plan_requests", plan)
+    locations = cities(60)
+
+    result = json.loads(get_batch_weather(locations))
+
+    base_url = weather_tools.OPEN_METEO_FORECAST_URL
+    coordinates = [weather_tools.weather_cache.centre(weather_tools.weather_cache.cell(loc["latitude"], loc["longitude"]))
+                   for loc in locations]
+    groups = plan(coordinates, base_url)
+    assert 1 < len(groups) < len(locations)
+    for group in groups:
+        query = (f"?latitude={','.join(weather_tools._format(lat) for lat, _ in group)}"
+                 f"&longitude={','.join(weather_tools._format(lon) for _, lon in group)}&current_weather=true")
+        assert len(base_url + query) <= max_url_length
+    assert forecast["forecast_requests"] == len(groups)
+    assert forecast["locations"] == len(locations)
+    assert [row[0] for row in result["rows"]] == [loc["name"] for loc in locations]
+
+
+def test_compact_table_keeps_request_order_and_shape(forecast):
+    locations = [{"name": "Oslo", "latitude": 59.9139, "longitude": 10.7522},
+                 {"latitude": -33.8688, "longitude": 151.2093},
+                 {"name": "Quito", "latitude": -0.1807, "longitude": -78.4678},
+                 {"name": "Oslo again", "latitude": 59.9139, "longitude": 10.7522}]
+
+    result = json.loads(get_batch_weather(locations))
+
+    assert list(result) == ["columns", "rows"]
+    assert result["columns"] == COLUMNS
+    assert [row[0] for row in result["rows"]] == ["Oslo", "-33.8688,151.2093", "Quito", "Oslo again"]
+    assert all(len(row) == len(COLUMNS) for row in result["rows"])
+    oslo, _, quito, oslo_again = result["rows"]
+    assert oslo[1:] == oslo_again[1:]
+    # The stand-in's temperature falls with distance from the equator
+    assert quito[1] > oslo[1]
+    assert all(isinstance(row[1], float) and isinstance(row[3], int) and row[4] for row in result["rows"])
+    assert forecast["forecast_requests"] == 1
+    assert forecast["locations"] == 3
+
+
+def test_invalid_locations_are_rejected_without_requests(forecast):
+    assert get_batch_weather([{"name": "Nowhere"}]).startswith("Invalid locations")
+    assert forecast["forecast_requests"] == 0
@@ -0,0 +1,187 @@
+# timeseries_budget.py
+
+import json
+from typing import Dict, Optional
+
+import numpy as np
+
+from market_data import period_buckets
+
+"""
+    Time-series budgeting
+    - Shrinks a daily series so that a tool response fits a point and/or token budget
+    - Prefers calendar aggregation (weekly, then monthly, quarterly OHLC of the daily values; sums for
+      volume series) and falls back to shape-preserving LTTB downsampling
+    - Always reports which aggregation was applied so the model can interpret the values
+"""
+
+AGGREGATIONS = ["auto", "none", "week", "month", "quarter", "lttb"]
+
+# Budget applied when the caller gives neither max_points nor max_tokens
+DEFAULT_MAX_TOKENS = 2000
+
+# Calendar aggregations tried, in order, when aggregation="auto"
+AUTO_PERIODS = ["week", "month", "quarter"]
+
+# Series summed per period instead of OHLC-aggregated: "Bitcoin_Vol." (wide files) and "S&P 500_Volume" (long files)
+VOLUME_SUFFIXES = ("_Vol.", "_Volume")
+
+# LTTB keeps the first and last points, so no budget can go below two
+MIN_POINTS = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate for compact JSON (about four characters per token).
+    """
+    return len(text) // 4 + 1
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of ``threshold - 2`` equal buckets in
+    between, the point forming the largest triangle with the previously kept point and the
+    average of the next bucket. Peaks and troughs survive, unlike plain striding.
+
+    Args:
+        x (np.ndarray): Ascending x coordinates (e.g. dates as integers).
+        y (np.ndarray): Values, without NaNs.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Sorted positions of the kept points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n) if threshold >= n else np.array([0, n - 1][:max(threshold, 1)])
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean() if next_stop > stop else x[-1]
+        next_y = y[stop:next_stop].mean() if next_stop > stop else y[-1]
+
+        # Twice the triangle area for every candidate in the bucket at once
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[i + 1] = previous
+    return kept
+
+
+def _round(value) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def _raw(dates: np.ndarray, values: np.ndarray) -> Dict:
+    return {str(d): _round(v) for d, v in zip(dates, values)}
+
+
+def _aggregate(dates: np.ndarray, values: np.ndarray, period: str, is_volume: bool) -> Dict:
+    buckets = period_buckets(dates, period)
+    starts = np.flatnonzero(np.r_[True, np.diff(buckets) != 0])
+    stops = np.r_[starts[1:], len(buckets)]
+
+    data = {}
+    for start, stop in zip(starts, stops):
+        chunk = values[start:stop]
+        chunk = chunk[~np.isnan(chunk)]
+        if len(chunk) == 0:
+            continue
+        label = str(dates[start])
+        if is_volume:
+            data[label] = _round(chunk.sum())
+        else:
+            data[label] = [_round(chunk[0]), _round(chunk.max()), _round(chunk.min()), _round(chunk[-1])]
+    return data
+
+
+def _lttb(dates: np.ndarray, values: np.ndarray, points: int) -> Dict:
+    valid = ~np.isnan(values)
+    dates, values = dates[valid], values[valid]
+    kept = lttb_indices(dates.astype(np.int64), values, max(points, 2))
+    return _raw(dates[kept], values[kept])
+
+
+def _payload(name: str, aggregation: str, columns, dates: np.ndarray, data: Dict) -> Dict:
+    payload = {
+        "index": name,
+        "aggregation": aggregation,
+        "source_points": int(len(dates)),
+        "points": len(data),
+    }
+    if columns:
+        payload["columns"] = columns
+    payload["data"] = data
+    return payload
+
+
+def _dump(payload: Dict) -> str:
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def fit_series(name: str, dates: np.ndarray, values: np.ndarray, max_points: Optional[int] = None,
+               max_tokens: Optional[int] = None, aggregation: str = "auto") -> str:
+    """
+    Serializes a daily series, aggregating or downsampling it to fit the given budgets.
+
+    Args:
+        name (str): Series name; volume series (``VOLUME_SUFFIXES``) are summed instead of OHLC-aggregated.
+        dates (np.ndarray): Ascending ``datetime64[D]`` dates.
+        values (np.ndarray): Values aligned with ``dates`` (NaN for missing).
+        max_points (int): Maximum number of data points in the response, at least ``MIN_POINTS``, or None.
+        max_tokens (int): Approximate maximum number of tokens in the response, or None.
+        aggregation (str): One of ``AGGREGATIONS``. ``auto`` picks the finest representation that fits.
+
+    Returns:
+        str: Compact JSON with the applied aggregation, point counts and the data.
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Invalid aggregation: {aggregation}")
+    if max_points is not None and max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}")
+
+    is_volume = name.endswith(VOLUME_SUFFIXES)
+    columns = None if is_volume else ["open", "high", "low", "close"]
+    suffix = "sum" if is_volume else "ohlc"
+
+    def fits(payload: Dict, text: str) -> bool:
+        return ((max_points is None or payload["points"] <= max_points)
+                and (max_tokens is None or estimate_tokens(text) <= max_tokens))
+
+    if aggregation in ("none", "auto"):
+        payload = _payload(name, "daily", None, dates, _raw(dates, values))
+        text = _dump(payload)
+        if aggregation == "none" or fits(payload, text):
+            return text
+
+    if aggregation in ("week", "month", "quarter"):
+        payload = _payload(name, f"{aggregation}ly_{suffix}", columns, dates,
+                           _aggregate(dates, values, aggregation, is_volume))
+        return _dump(payload)
+
+    if aggregation == "auto":
+        for period in AUTO_PERIODS:
+            payload = _payload(name, f"{period}ly_{suffix}", columns, dates, _aggregate(dates, values, period, is_volume))
+            text = _dump(payload)
+            if fits(payload, text):
+                return text
+
+    # LTTB keeps daily values; size it from whichever budget is tighter
+    points = len(dates) if max_points is None else max_points
+    if max_tokens is not None:
+        sample = _dump(_payload(name, "lttb", None, dates, _raw(dates[:1], values[:1])))
+        per_point = max(estimate_tokens(f'"{dates[0]}":{_round(values[0])},'), 1)
+        points = min(points, max(2, (max_tokens - estimate_tokens(sample)) // per_point))
+    return _dump(_payload(name, "lttb", None, dates, _lttb(dates, values, points)))
@@ -0,0 +1,588 @@
+# vector_store.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from quantization import (QUANTIZATION_KINDS, QUANTIZE_MIN_ROWS, RERANK_FACTOR, TRAINING_ROWS,
+                          VECTOR_STORE_QUANTIZATION, Quantizer,
+                          load_quantizer, train_quantizer)
+
+"""
+    Vector stores
+    - ``VectorStore`` is the subset of the Pinecone ``Index`` API the RAG client uses (upsert, query, delete,
+      list, list_paginated, describe_index_stats); a Pinecone index satisfies it as is
+    - ``LocalVectorStore`` is an in-process backend: one contiguous, memory-mapped float32 (or float16)
+      matrix of unit vectors per namespace, with IDs and metadata in SQLite next to it
+    - Queries are exact (blocked NumPy matrix products) until a namespace reaches ``IVF_THRESHOLD``
+      vectors; above that an inverted-file index (spherical k-means lists) narrows the scan to the
+      ``IVF_NPROBE`` lists nearest to the query
+    - With ``VECTOR_STORE_QUANTIZATION=int8|pq`` a namespace of at least ``QUANTIZE_MIN_ROWS`` vectors also
+      keeps compact codes of its rows; queries scan the codes and re-score only a shortlist against the
+      full-precision matrix, which then stays on disk apart from the rows it re-reads
+    - Select the backend with ``VECTOR_STORE=pinecone|local``
+    - ``index_identity`` names the index a client writes to; local state kept about an index (sync
+      manifest, document store, lexical index, query and ID caches) is keyed by ``scope_key`` of it and
+      the namespace, so switching indexes or backends never serves another index's state
+"""
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", ".vector_store")
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+
+# Namespaces with at least this many vectors are searched approximately
+IVF_THRESHOLD = int(os.getenv("IVF_THRESHOLD", "20000"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_TRAINING_ITERATIONS = 10
+IVF_SAMPLE_PER_LIST = 64
+
+# Rows scored per matrix product, bounding the temporary score matrix
+BLOCK_ROWS = 65536
+INITIAL_CAPACITY = 1024
+
+
+@dataclass
+class Match:
+    id: str
+    score: float
+    metadata: Optional[Dict[str, Any]] = None
+    values: List[float] = field(default_factory=list)
+
+
+@dataclass
+class QueryResponse:
+    matches: List[Match]
+    namespace: str = ""
+
+
+@dataclass
+class ListItem:
+    id: str
+
+
+@dataclass
+class Pagination:
+    next: str
+
+
+@dataclass
+class ListResponse:
+    vectors: List[ListItem]
+    pagination: Optional[Pagination]
+    namespace: str = ""
+
+
+class VectorStore(ABC):
+    """
+    Vector index operations used by the RAG client, with Pinecone ``Index`` signatures.
+    """
+
+    @abstractmethod
+    def upsert(self, vectors: Sequence, namespace: str = ""):
+        """
+        Inserts or replaces ``(id, values, metadata)`` tuples or ``{"id", "values", "metadata"}`` dicts.
+        """
+
+    @abstractmethod
+    def query(self, vector: Sequence[float], top_k: int = 10, namespace: str = "", include_metadata: bool = False,
+              include_values: bool = False) -> QueryResponse:
+        """
+        The ``top_k`` vectors most similar to ``vector`` by cosine similarity.
+        """
+
+    @abstractmethod
+    def delete(self, ids: Optional[Sequence[str]] = None, namespace: str = "", delete_all: bool = False):
+        """
+        Deletes vectors by ID, or the whole namespace.
+        """
+
+    @abstractmethod
+    def list_paginated(self, prefix: str = "", limit: int = 100, namespace: str = "",
+                       pagination_token: Optional[str] = None) -> ListResponse:
+        """
+        One page of IDs, in ID order, and the token of the next page.
+        """
+
+    @abstractmethod
+    def describe_index_stats(self) -> Dict:
+        """
+        ``dimension``, ``total_vector_count`` and ``namespaces`` (name -> ``{"vector_count": n}``).
+        """
+
+    def list(self, prefix: str = "", limit: int = 100, namespace: str = "") -> Iterator[List[str]]:
+        """
+        All IDs with ``prefix``, in pages of ``limit``.
+        """
+        token = None
+        while True:
+            page = self.list_paginated(prefix=prefix, limit=limit, namespace=namespace, pagination_token=token)
+            if page.vectors:
+                yield [item.id for item in page.vectors]
+            if not page.pagination:
+                return
+            token = page.pagination.next
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _open_rows(path: str, dtype: np.dtype, width: int, capacity: int) -> np.memmap:
+    """
+    Memory-maps a row-major file of ``width``-wide rows, growing it to at least ``capacity`` rows.
+    """
+    size = capacity * width * dtype.itemsize
+    if not os.path.exists(path) or os.path.getsize(path) < size:
+        with open(path, "ab") as f:
+            f.truncate(size)
+    capacity = os.path.getsize(path) // (width * dtype.itemsize)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=(capacity, width))
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the ``k`` highest scores, best first.
+    """
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class IVFIndex:
+    """
+    Inverted-file index: rows grouped by their nearest of ``nlist`` unit centroids.
+
+    Args:
+        centroids (np.ndarray): (nlist, dimension) unit centroids.
+        assignments (np.ndarray): List of each row.
+        trained_rows (int): Row count the centroids were trained on; the index is retrained once the
+            namespace has doubled since.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_rows: int):
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = assignments.astype(np.int32)
+        self.trained_rows = trained_rows
+        self._order: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, count: int, seed: int = 0) -> "IVFIndex":
+        nlist = max(1, int(np.sqrt(count)))
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(count, size=min(count, nlist * IVF_SAMPLE_PER_LIST), replace=False))]
+        sample = sample.astype(np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(IVF_TRAINING_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = ~np.bincount(labels, minlength=nlist).astype(bool)
+            # Re-seed empty lists from random sample rows
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = _unit_rows(sums)
+        index = cls(centroids, np.zeros(0, dtype=np.int32), count)
+        index.assignments = np.concatenate([index.assign(matrix[start:min(start + BLOCK_ROWS, count)])
+                                            for start in range(0, count, BLOCK_ROWS)])
+        return index
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors.astype(np.float32) @ self.centroids.T, axis=1).astype(np.int32)
+
+    def set(self, rows: np.ndarray, lists: np.ndarray):
+        end = int(rows.max()) + 1 if len(rows) else 0
+        if end > len(self.assignments):
+            self.assignments = np.concatenate([self.assignments, np.zeros(end - len(self.assignments), np.int32)])
+        self.assignments[rows] = lists
+        self._order = None
+
+    def truncate(self, count: int):
+        self.assignments = self.assignments[:count]
+        self._order = None
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """
+        Rows in the ``nprobe`` lists whose centroids are nearest to ``query``.
+        """
+        if self._order is None:
+            self._order = np.argsort(self.assignments, kind="stable")
+            self._offsets = np.searchsorted(self.assignments[self._order], np.arange(len(self.centroids) + 1))
+        probes = _top_k(self.centroids @ query, min(nprobe, len(self.centroids)))
+        return np.concatenate([self._order[self._offsets[p]:self._offsets[p + 1]] for p in probes])
+
+
+class _Namespace:
+    """
+    Memory-mapped matrix of one namespace; rows ``[0, count)`` are live, in no particular order.
+    """
+
+    def __init__(self, path: str, dimension: int, dtype: str, ids: List[str], quantization: str = "none"):
+        self.path = path
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.quantization = quantization
+        self.ids = ids
+        self.rows = {id: row for row, id in enumerate(ids)}
+        self.matrix: Optional[np.memmap] = None
+        self.quantizer: Optional[Quantizer] = None
+        self.codes: Optional[np.memmap] = None
+        self._foreign_codes_dropped = False
+        if quantization != "none" and os.path.exists(self._quantizer_path):
+            saved = np.load(self._quantizer_path)
+            self.quantizer = load_quantizer(quantization, dict(saved), int(saved["trained_rows"]))
+        if ids:
+            self._map(len(ids))
+        self.ivf: Optional[IVFIndex] = None
+        if os.path.exists(self.path + ".ivf.npz"):
+            saved = np.load(self.path + ".ivf.npz")
+            if len(saved["assignments"]) == self.count:
+                self.ivf = IVFIndex(saved["centroids"], saved["assignments"], int(saved["trained_rows"]))
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def _quantizer_path(self) -> str:
+        return f"{self.path}.{self.quantization}.npz"
+
+    def _map(self, capacity: int):
+        self.flush()
+        self.matrix = None
+        self.matrix = _open_rows(self.path, self.dtype, self.dimension, capacity)
+        if self.quantizer is not None:
+            self.codes = None
+            self.codes = _open_rows(f"{self.path}.{self.quantization}", self.quantizer.code_dtype,
+                                    self.quantizer.code_width, self.matrix.shape[0])
+
+    def flush(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+        if self.codes is not None:
+            self.codes.flush()
+
+    def _drop_foreign_codes(self):
+        """
+        Deletes the codes and quantizers of other quantization kinds before the first write: this store
+        does not keep them up to date, so a later store using them would scan stale codes.
+        """
+        if self._foreign_codes_dropped:
+            return
+        for kind in QUANTIZATION_KINDS:
+            if kind in ("none", self.quantization):
+                continue
+            for path in (f"{self.path}.{kind}.npz", f"{self.path}.{kind}"):
+                if os.path.exists(path):
+                    os.remove(path)
+                    logger.info(f"Dropped {kind} codes of {self.path}, written without them")
+        self._foreign_codes_dropped = True
+
+    def put(self, ids: List[str], vectors: np.ndarray) -> List[Tuple[str, int]]:
+        """
+        Writes unit vectors, appending new IDs; returns the (id, row) pairs written.
+        """
+        self._drop_foreign_codes()
+        rows = []
+        for id in ids:
+            if id not in self.rows:
+                self.rows[id] = len(self.ids)
+                self.ids.append(id)
+            rows.append(self.rows[id])
+        if self.matrix is None or self.count > self.matrix.shape[0]:
+            self._map(max(self.count, INITIAL_CAPACITY, 2 * (self.matrix.shape[0] if self.matrix is not None else 0)))
+        rows_array = np.array(rows)
+        self.matrix[rows_array] = vectors.astype(self.dtype)
+        if self.quantizer is not None:
+            self.codes[rows_array] = self.quantizer.encode(vectors)
+        if self.ivf is not None:
+            self.ivf.set(rows_array, self.ivf.assign(vectors))
+        return list(zip(ids, rows))
+
+    def remove(self, id: str) -> Optional[Tuple[str, int]]:
+        """
+        Deletes a row by moving the last row into its place; returns the moved (id, row), if any.
+        """
+        self._drop_foreign_codes()
+        row = self.rows.pop(id)
+        last = self.count - 1
+        moved = None
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            if self.codes is not None:
+                self.codes[row] = self.codes[last]
+            self.ids[row] = self.ids[last]
+            self.rows[self.ids[row]] = row
+            if self.ivf is not None:
+                self.ivf.assignments[row] = self.ivf.assignments[last]
+            moved = (self.ids[row], row)
+        self.ids.pop()
+        if self.ivf is not None:
+            self.ivf.truncate(self.count)
+        return moved
+
+    def sync_index(self):
+        """
+        Trains, retrains or drops the IVF index and the quantizer to match the namespace size, and saves them.
+        """
+        self._sync_quantizer()
+        if self.count < IVF_THRESHOLD:
+            self.ivf = None
+            if os.path.exists(self.path + ".ivf.npz"):
+                os.remove(self.path + ".ivf.npz")
+            return
+        if self.ivf is None or self.count >= 2 * self.ivf.trained_rows:
+            logger.info(f"Training IVF index over {self.count} vectors in {self.path}")
+            self.ivf = IVFIndex.train(self.matrix, self.count)
+        np.savez(self.path + ".ivf.npz", centroids=self.ivf.centroids, assignments=self.ivf.assignments,
+                 trained_rows=self.ivf.trained_rows)
+
+    def _sync_quantizer(self):
+        if self.quantization == "none" or self.count < QUANTIZE_MIN_ROWS:
+            if self.quantizer is not None:
+                self.quantizer = None
+                self.codes = None
+                for path in (self._quantizer_path, f"{self.path}.{self.quantization}"):
+                    if os.path.exists(path):
+                        os.remove(path)
+            return
+        if self.quantizer is not None and self.count < 2 * self.quantizer.trained_rows:
+            return
+        logger.info(f"Training {self.quantization} quantizer over {self.count} vectors in {self.path}")
+        rng = np.random.default_rng(0)
+        sample = self.matrix[np.sort(rng.choice(self.count, size=min(self.count, TRAINING_ROWS), replace=False))]
+        self.quantizer = train_quantizer(self.quantization, np.asarray(sample, dtype=np.float32), self.count)
+        self._map(self.matrix.shape[0])
+        for start in range(0, self.count, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, self.count)
+            self.codes[start:end] = self.quantizer.encode(np.asarray(self.matrix[start:end], dtype=np.float32))
+        self.codes.flush()
+        # Saved last: a saved quantizer always has its codes on disk
+        np.savez(self._quantizer_path, trained_rows=self.quantizer.trained_rows, **self.quantizer.state())
+
+    def _rescore(self, query: np.ndarray, rows: np.ndarray, approximate: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The best ``top_k`` of ``rows`` at full precision, re-reading only the shortlist the codes rank highest.
+        """
+        shortlist = np.sort(rows[_top_k(approximate, min(len(rows), RERANK_FACTOR * top_k))])
+        scores = np.asarray(self.matrix[shortlist], dtype=np.float32) @ query
+        best = _top_k(scores, top_k)
+        return shortlist[best], scores[best]
+
+    def search(self, queries: np.ndarray, top_k: int, nprobe: int = IVF_NPROBE) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (rows, scores) of the best ``top_k`` rows for each unit query, best first.
+        """
+        if self.quantizer is not None:
+            if self.ivf is None:
+                # One pass over the codes for all queries
+                rows = np.arange(self.count)
+                approximate = self.quantizer.scores(self.codes[:self.count], queries)
+                return [self._rescore(query, rows, approximate[:, q], top_k) for q, query in enumerate(queries)]
+            results = []
+            for query in queries:
+                rows = np.sort(self.ivf.candidates(query, nprobe))
+                if len(rows) < top_k:
+                    rows = np.arange(self.count)
+                approximate = self.quantizer.scores(self.codes[rows], query[None, :])[:, 0]
+                results.append(self._rescore(query, rows, approximate, top_k))
+            return results
+        if self.ivf is not None:
+            results = []
+            for query in queries:
+                rows = self.ivf.candidates(query, nprobe)
+                if len(rows) < top_k:
+                    results.extend(self._exact(query[None, :], top_k))
+                    continue
+                scores = self.matrix[rows].astype(np.float32) @ query
+                best = _top_k(scores, top_k)
+                results.append((rows[best], scores[best]))
+            return results
+        return self._exact(queries, top_k)
+
+    def _exact(self, queries: np.ndarray, top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        best_rows = [np.zeros(0, dtype=np.int64)] * len(queries)
+        best_scores = [np.zeros(0, dtype=np.float32)] * len(queries)
+        for start in range(0, self.count, BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:min(start + BLOCK_ROWS, self.count)], dtype=np.float32)
+            scores = block @ queries.T
+            for q in range(len(queries)):
+                rows = np.concatenate([best_rows[q], np.arange(start, start + len(block))])
+                merged = np.concatenate([best_scores[q], scores[:, q]])
+                keep = _top_k(merged, top_k)
+                best_rows[q], best_scores[q] = rows[keep], merged[keep]
+        return list(zip(best_rows, best_scores))
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store persisted under one directory.
+
+    Args:
+        path (str): Directory for the SQLite catalogue and the per-namespace matrices.
+        dimension (int): Vector dimension.
+        dtype (str): ``float32``, or ``float16`` to halve memory and disk at a small precision cost.
+        quantization (str): ``none``, ``int8`` or ``pq``: compact codes scanned by queries, with
+            full-precision re-scoring of a shortlist.
+    """
+
+    def __init__(self, path: str = VECTOR_STORE_PATH, dimension: int = 1536, dtype: str = VECTOR_STORE_DTYPE,
+                 quantization: str = VECTOR_STORE_QUANTIZATION):
+        if quantization not in QUANTIZATION_KINDS:
+            raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATION_KINDS}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dimension = dimension
+        self.dtype = dtype
+        self.quantization = quantization
+        self._lock = threading.RLock()
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._connection = sqlite3.connect(os.path.join(path, "catalogue.sqlite"), check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " namespace TEXT NOT NULL, id TEXT NOT NULL, row INTEGER NOT NULL, metadata TEXT,"
+            " PRIMARY KEY (namespace, id)) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        store = self._namespaces.get(namespace)
+        if store is None:
+            rows = self._connection.execute("SELECT id, row FROM vectors WHERE namespace = ?", (namespace,)).fetchall()
+            ids = [id for id, _ in sorted(rows, key=lambda pair: pair[1])]
+            file = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:16]
+            store = _Namespace(os.path.join(self.path, f"{file}.{self.dtype}"), self.dimension, self.dtype, ids,
+                               self.quantization)
+            # Quantizes a namespace written before quantization was turned on
+            store._sync_quantizer()
+            self._namespaces[namespace] = store
+        return store
+
+    def upsert(self, vectors: Sequence, namespace: str = ""):
+        ids, values, metadata = [], [], []
+        for vector in vectors:
+            if isinstance(vector, dict):
+                vector = (vector["id"], vector["values"], vector.get("metadata"))
+            ids.append(vector[0])
+            values.append(vector[1])
+            metadata.append(vector[2] if len(vector) > 2 else None)
+        if not ids:
+            return
+        matrix = np.asarray(values, dtype=np.float32)
+        if matrix.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {matrix.shape[1]}")
+
+        with self._lock:
+            store = self._namespace(namespace)
+            written = dict(store.put(ids, _unit_rows(matrix)))
+            store.flush()
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?)",
+                [(namespace, id, written[id], json.dumps(meta) if meta is not None else None)
+                 for id, meta in zip(ids, metadata)]
+            )
+            self._connection.commit()
+            store.sync_index()
+
+    def query(self, vector: Sequence[float], top_k: int = 10, namespace: str = "", include_metadata: bool = False,
+              include_values: bool = False) -> QueryResponse:
+        return self.query_many([vector], top_k=top_k, namespace=namespace, include_metadata=include_metadata,
+                               include_values=include_values)[0]
+
+    def query_many(self, vectors: Sequence[Sequence[float]], top_k: int = 10, namespace: str = "",
+                   include_metadata: bool = False, include_values: bool = False) -> List[QueryResponse]:
+        """
+        ``query`` for several vectors at once, sharing each pass over the matrix.
+        """
+        queries = _unit_rows(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            store = self._namespace(namespace)
+            if store.count == 0:
+                return [QueryResponse([], namespace) for _ in queries]
+            results = store.search(queries, top_k)
+            responses = []
+            for rows, scores in results:
+                ids = [store.ids[row] for row in rows]
+                metadata = self._metadata(namespace, ids) if include_metadata else {}
+                responses.append(QueryResponse([
+                    Match(id, float(score), metadata.get(id) if include_metadata else None,
+                          store.matrix[row].astype(np.float32).tolist() if include_values else [])
+                    for id, row, score in zip(ids, rows, scores)
+                ], namespace))
+            return responses
+
+    def _metadata(self, namespace: str, ids: List[str]) -> Dict[str, Dict]:
+        placeholders = ",".join("?" * len(ids))
+        rows = self._connection.execute(
+            f"SELECT id, metadata FROM vectors WHERE namespace = ? AND id IN ({placeholders})", (namespace, *ids)
+        )
+        return {id: json.loads(metadata) if metadata else {} for id, metadata in rows}
+
+    def delete(self, ids: Optional[Sequence[str]] = None, namespace: str = "", delete_all: bool = False):
+        with self._lock:
+            store = self._namespace(namespace)
+            if delete_all:
+                ids = list(store.ids)
+            moved = {}
+            for id in ids or []:
+                if id in store.rows:
+                    moved.pop(id, None)
+                    change = store.remove(id)
+                    if change:
+                        moved[change[0]] = change[1]
+            store.flush()
+            self._connection.executemany("DELETE FROM vectors WHERE namespace = ? AND id = ?",
+                                         [(namespace, id) for id in ids or []])
+            self._connection.executemany("UPDATE vectors SET row = ? WHERE namespace = ? AND id = ?",
+                                         [(row, namespace, id) for id, row in moved.items()])
+            self._connection.commit()
+            store.sync_index()
+
+    def list_paginated(self, prefix: str = "", limit: int = 100, namespace: str = "",
+                       pagination_token: Optional[str] = None) -> ListResponse:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id FROM vectors WHERE namespace = ? AND substr(id, 1, ?) = ? AND id > ? ORDER BY id LIMIT ?",
+                (namespace, len(prefix), prefix, pagination_token or "", limit + 1)
+            ).fetchall()
+        ids = [id for id, in rows]
+        pagination = Pagination(ids[limit - 1]) if len(ids) > limit else None
+        return ListResponse([ListItem(id) for id in ids[:limit]], pagination, namespace)
+
+    def describe_index_stats(self) -> Dict:
+        with self._lock:
+            counts = self._connection.execute("SELECT namespace, COUNT(*) FROM vectors GROUP BY namespace").fetchall()
+        return {
+            "dimension": self.dimension,
+            "index_fullness": 0.0,
+            "namespaces": {namespace: {"vector_count": count} for namespace, count in counts},
+            "total_vector_count": sum(count for _, count in counts),
+        }
+
+
+def index_identity(index: Any, index_name: str = "") -> str:
+    """
+    Stable name of the index behind a client: a store with a ``path`` by its directory, a Pinecone
+    index by its name.
+    """
+    path = getattr(index, "path", None)
+    if isinstance(path, str):
+        return f"{type(index).__name__}:{os.path.abspath(path)}"
+    return f"pinecone:{index_name}"
+
+
+def scope_key(index_id: str, namespace: str) -> str:
+    """
+    Key of one namespace of one index in the local stores that are shared across indexes.
+    """
+    return f"{index_id}#{namespace}"
@@ -0,0 +1,264 @@
+# weather_cache.py
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+"""
+    Weather cache
+    - Caches current-weather lookups per lat/lon grid cell instead of per exact URL, so nearby
+      coordinates (48.8566,2.3522 and 48.857,2.352) share one entry and one upstream lookup
+    - Entries expire when the provider publishes its next update (Open-Meteo: every 15 minutes,
+      aligned to the quarter hour), not after a fixed TTL from the time of the request
+    - Concurrent misses for the same cell wait for a single in-flight fetch, also across the event loops
+      of different threads (a user's lookup and the cache warmer's loop)
+    - Hit, miss and coalescing counters are available through WeatherCache.stats()
+    - refresh() lets a cache warmer repopulate cells ahead of user requests; the first user hit on a
+      warmed entry is counted as a prevented miss
+"""
+
+# Grid cell size in degrees; 0.01 degrees is ~1.1 km of latitude
+WEATHER_GRID_DEGREES = float(os.getenv("WEATHER_GRID_DEGREES", "0.01"))
+
+# Provider update cadence, used when a response does not carry its own interval
+UPDATE_INTERVAL_SECONDS = 900
+
+# Time after an update boundary before the new values are served by the provider
+PUBLISH_DELAY_SECONDS = 60
+
+# Lifetime of entries whose update boundary has already passed (provider running late)
+RETRY_AFTER_SECONDS = 60
+
+MAX_ENTRIES = 10000
+
+Coordinate = Tuple[float, float]
+Cell = Tuple[int, int]
+Fetcher = Callable[[List[Coordinate]], Awaitable[Dict[Coordinate, Dict]]]
+
+
+@dataclass
+class _Entry:
+    value: Dict
+    expires_at: float
+    # Stored by refresh() rather than by a user lookup, and whether a user has read it since
+    warmed: bool = False
+    used: bool = False
+
+
+class WeatherCache:
+    """
+    Grid-quantized, update-aligned cache in front of a batched current-weather fetcher.
+
+    Args:
+        fetch (Fetcher): Coroutine taking a list of coordinates and returning the provider's
+            ``current_weather`` object per coordinate (e.g. ``weather_tools.fetch_current_weather``).
+        grid_degrees (float): Cell size in degrees. Every coordinate in a cell is served the weather
+            of the cell's centre.
+        update_interval (int): Provider update cadence in seconds, if a response has no ``interval``.
+        publish_delay (int): Seconds after an update boundary before entries are refreshed.
+        max_entries (int): Maximum number of cached cells; the least recently used are evicted.
+        clock (Callable[[], float]): Time source, in seconds since the epoch.
+    """
+
+    def __init__(self, fetch: Fetcher, grid_degrees: float = WEATHER_GRID_DEGREES,
+                 update_interval: int = UPDATE_INTERVAL_SECONDS, publish_delay: int = PUBLISH_DELAY_SECONDS,
+                 max_entries: int = MAX_ENTRIES, clock: Callable[[], float] = time.time):
+        if grid_degrees <= 0:
+            raise ValueError("grid_degrees must be positive")
+        self.fetch = fetch
+        self.grid_degrees = grid_degrees
+        self.update_interval = update_interval
+        self.publish_delay = publish_delay
+        self.max_entries = max_entries
+        self.clock = clock
+
+        # Held for the synchronous bookkeeping only, so lookups from several threads' loops stay consistent
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Cell, _Entry]" = OrderedDict()
+        # Cells being fetched; thread-safe futures, so lookups on any thread's loop can wait on them
+        self._inflight: Dict[Cell, concurrent.futures.Future] = {}
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "expired": 0, "evicted": 0,
+                          "fetches": 0, "fetched_cells": 0, "errors": 0,
+                          "warmed": 0, "warm_hits": 0, "warm_unused": 0}
+
+    def cell(self, latitude: float, longitude: float) -> Cell:
+        """
+        Grid cell containing a coordinate.
+        """
+        return round(float(latitude) / self.grid_degrees), round(float(longitude) / self.grid_degrees)
+
+    def centre(self, cell: Cell) -> Coordinate:
+        """
+        Coordinate the weather of a cell is fetched for.
+        """
+        return round(cell[0] * self.grid_degrees, 6), round(cell[1] * self.grid_degrees, 6)
+
+    def expires_at(self, current: Dict, now: float) -> float:
+        """
+        Time at which the provider will have replaced a ``current_weather`` value.
+
+        The value's ``time`` marks the start of its update interval (in GMT), so it is stale once
+        the next interval starts and the provider has had ``publish_delay`` seconds to publish it.
+        """
+        interval = float(current.get("interval") or self.update_interval)
+        try:
+            start = datetime.fromisoformat(current["time"]).replace(tzinfo=timezone.utc).timestamp()
+        except (KeyError, TypeError, ValueError):
+            start = now - now % interval
+        expiry = start + interval + self.publish_delay
+        return expiry if expiry > now else now + RETRY_AFTER_SECONDS
+
+    async def get_many(self, coordinates: Sequence[Coordinate], **fetch_kwargs) -> Dict[Coordinate, Dict]:
+        """
+        Current weather for many coordinates, fetching only the cells that are missing or stale.
+
+        Args:
+            coordinates (Sequence[Coordinate]): (latitude, longitude) pairs.
+            **fetch_kwargs: Passed on to the fetcher (e.g. ``session``).
+
+        Returns:
+            Dict[Coordinate, Dict]: ``current_weather`` object per requested coordinate. Coordinates
+            whose cell could not be fetched are missing.
+        """
+        now = self.clock()
+        cells = {coordinate: self.cell(*coordinate) for coordinate in coordinates}
+
+        found: Dict[Cell, Dict] = {}
+        waiting: Dict[Cell, concurrent.futures.Future] = {}
+        claimed: Dict[Cell, concurrent.futures.Future] = {}
+        with self._lock:
+            for cell in dict.fromkeys(cells.values()):
+                entry = self._entries.get(cell)
+                if entry is not None:
+                    if entry.expires_at > now:
+                        self._counters["hits"] += 1
+                        if entry.warmed and not entry.used:
+                            self._counters["warm_hits"] += 1
+                        entry.used = True
+                        self._entries.move_to_end(cell)
+                        found[cell] = entry.value
+                        continue
+                    self._counters["expired"] += 1
+                    self._drop(cell)
+
+                pending = self._inflight.get(cell)
+                if pending is not None:
+                    self._counters["coalesced"] += 1
+                    waiting[cell] = pending
+                    continue
+
+                self._counters["misses"] += 1
+                self._inflight[cell] = claimed[cell] = concurrent.futures.Future()
+
+        if claimed:
+            await self._fetch_cells(claimed, found, False, fetch_kwargs)
+
+        for cell, future in waiting.items():
+            value = await asyncio.wrap_future(future)
+            if value:
+                found[cell] = value
+
+        return {coordinate: found[cell] for coordinate, cell in cells.items() if cell in found}
+
+    async def get(self, latitude: float, longitude: float) -> Optional[Dict]:
+        """
+        Current weather for one coordinate, or None if it could not be fetched.
+        """
+        coordinate = (float(latitude), float(longitude))
+        return (await self.get_many([coordinate])).get(coordinate)
+
+    async def refresh(self, coordinates: Sequence[Coordinate], **fetch_kwargs) -> int:
+        """
+        Fetches and stores the cells of the given coordinates ahead of user lookups.
+
+        Cells already being fetched are skipped. Refreshes do not count as lookups; the first user
+        hit on a refreshed entry counts as a prevented miss (``warm_hits``).
+
+        Args:
+            coordinates (Sequence[Coordinate]): (latitude, longitude) pairs.
+            **fetch_kwargs: Passed on to the fetcher.
+
+        Returns:
+            int: Number of cells stored.
+        """
+        claimed: Dict[Cell, concurrent.futures.Future] = {}
+        with self._lock:
+            for cell in dict.fromkeys(self.cell(*coordinate) for coordinate in coordinates):
+                if cell not in self._inflight:
+                    self._inflight[cell] = claimed[cell] = concurrent.futures.Future()
+        if not claimed:
+            return 0
+        found: Dict[Cell, Dict] = {}
+        await self._fetch_cells(claimed, found, True, fetch_kwargs)
+        return len(found)
+
+    def expiry(self, latitude: float, longitude: float) -> Optional[float]:
+        """
+        Expiry time of the entry covering a coordinate, or None if its cell is not stored.
+        """
+        entry = self._entries.get(self.cell(latitude, longitude))
+        return entry.expires_at if entry is not None else None
+
+    async def _fetch_cells(self, claimed: Dict[Cell, concurrent.futures.Future], found: Dict[Cell, Dict], warmed: bool, fetch_kwargs: Dict):
+        fetched: Dict[Coordinate, Dict] = {}
+        try:
+            self._counters["fetches"] += 1
+            self._counters["fetched_cells"] += len(claimed)
+            fetched = await self.fetch([self.centre(cell) for cell in claimed], **fetch_kwargs)
+        except Exception as e:
+            self._counters["errors"] += 1
+            logger.error(f"Failed to fetch weather for {len(claimed)} cells: {e}")
+        finally:
+            # Always release the waiters, also on errors and cancellation
+            stored_at = self.clock()
+            with self._lock:
+                for cell, future in claimed.items():
+                    value = fetched.get(self.centre(cell))
+                    if value:
+                        self._store(cell, value, stored_at, warmed)
+                        found[cell] = value
+                    if self._inflight.get(cell) is future:
+                        del self._inflight[cell]
+                    if not future.done():
+                        future.set_result(value or None)
+
+    def _store(self, cell: Cell, value: Dict, now: float, warmed: bool = False):
+        if cell in self._entries:
+            self._drop(cell)
+        self._entries[cell] = _Entry(value, self.expires_at(value, now), warmed=warmed)
+        if warmed:
+            self._counters["warmed"] += 1
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self._counters["evicted"] += 1
+
+    def _drop(self, cell: Cell):
+        entry = self._entries.pop(cell)
+        if entry.warmed and not entry.used:
+            self._counters["warm_unused"] += 1
+
+    def stats(self) -> Dict:
+        """
+        Cache counters and the hit rate. Coalesced lookups count as hits, as they did not
+        cause an upstream request of their own.
+        """
+        lookups = self._counters["hits"] + self._counters["misses"] + self._counters["coalesced"]
+        hit_rate = (self._counters["hits"] + self._counters["coalesced"]) / lookups if lookups else 0.0
+        return {**self._counters, "lookups": lookups, "entries": len(self._entries), "hit_rate": round(hit_rate, 4)}
+
+    def clear(self):
+        """
+        Drops all entries and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+        for name in self._counters:
+            self._counters[name] = 0
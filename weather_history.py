@@ -0,0 +1,197 @@
+# weather_history.py
+
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from loguru import logger
+
+from weather_cache import WEATHER_GRID_DEGREES
+
+"""
+    Historical weather store
+    - Keeps the daily rows returned by the Open-Meteo archive API in SQLite, per location grid cell
+    - A query only fetches the date sub-ranges that are not stored yet and serves the rest locally
+    - Archived days do not change, so stored rows never expire; days the archive has no values for
+      yet (its last few days) are not stored and are fetched again next time
+    - The store lock covers SQLite only; archive requests run outside it, so one slow upstream call
+      does not hold up other lookups
+"""
+
+OPEN_METEO_ARCHIVE_URL = os.getenv("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+WEATHER_HISTORY_DB = os.getenv("WEATHER_HISTORY_DB", ".weather_history.sqlite")
+REQUEST_TIMEOUT_SECONDS = 30
+
+# Gaps separated by at most this many stored days are fetched in one request
+MAX_GAP_MERGE_DAYS = 7
+
+DAILY_VARIABLES = ["temperature_2m_max", "temperature_2m_min"]
+
+DateRange = Tuple[date, date]
+
+
+def missing_ranges(stored: List[date], start: date, end: date, merge_days: int = MAX_GAP_MERGE_DAYS) -> List[DateRange]:
+    """
+    Inclusive date ranges within [start, end] that are not in ``stored``.
+
+    Args:
+        stored (List[date]): Days already available, in any order.
+        start (date): First day of the query.
+        end (date): Last day of the query.
+        merge_days (int): Gaps separated by at most this many stored days are merged into one range,
+            trading a few refetched days for fewer requests.
+
+    Returns:
+        List[DateRange]: Ascending, non-overlapping (first, last) ranges to fetch.
+    """
+    have = set(stored)
+    ranges: List[DateRange] = []
+    day = start
+    while day <= end:
+        if day in have:
+            day += timedelta(days=1)
+            continue
+        first = day
+        while day <= end and day not in have:
+            day += timedelta(days=1)
+        last = day - timedelta(days=1)
+        if ranges and (first - ranges[-1][1]).days - 1 <= merge_days:
+            ranges[-1] = (ranges[-1][0], last)
+        else:
+            ranges.append((first, last))
+    return ranges
+
+
+class HistoricalTemperatureStore:
+    """
+    Read-through store of daily archive temperatures.
+
+    Args:
+        path (str): SQLite database file; ``:memory:`` for a throwaway store.
+        base_url (str): Archive endpoint; ``OPEN_METEO_ARCHIVE_URL`` if None.
+        grid_degrees (float): Cell size locations are quantized to, as for the current-weather cache.
+        session (requests.Session): HTTP session to reuse, or None.
+    """
+
+    def __init__(self, path: str = WEATHER_HISTORY_DB, base_url: Optional[str] = None,
+                 grid_degrees: float = WEATHER_GRID_DEGREES, session: Optional[requests.Session] = None):
+        self.base_url = base_url
+        self.grid_degrees = grid_degrees
+        self.session = session or requests.Session()
+        # Guards the connection and the counters, never held across an HTTP request
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS daily_temperature ("
+            " lat_cell INTEGER NOT NULL, lon_cell INTEGER NOT NULL, day TEXT NOT NULL,"
+            " temperature_2m_max REAL, temperature_2m_min REAL,"
+            " PRIMARY KEY (lat_cell, lon_cell, day)) WITHOUT ROWID"
+        )
+        self._connection.commit()
+        self._counters = {"queries": 0, "requests": 0, "fetched_days": 0, "served_days": 0, "local_days": 0}
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return round(float(latitude) / self.grid_degrees), round(float(longitude) / self.grid_degrees)
+
+    def _stored_days(self, cell: Tuple[int, int], start: date, end: date) -> List[date]:
+        rows = self._connection.execute(
+            "SELECT day FROM daily_temperature WHERE lat_cell = ? AND lon_cell = ? AND day BETWEEN ? AND ?",
+            (*cell, start.isoformat(), end.isoformat())
+        )
+        return [date.fromisoformat(day) for day, in rows]
+
+    def _fetch(self, cell: Tuple[int, int], first: date, last: date) -> List[Tuple]:
+        params = {
+            "latitude": round(cell[0] * self.grid_degrees, 6),
+            "longitude": round(cell[1] * self.grid_degrees, 6),
+            "start_date": first.isoformat(),
+            "end_date": last.isoformat(),
+            "daily": ",".join(DAILY_VARIABLES),
+            "timezone": "auto",
+        }
+        response = self.session.get(self.base_url or OPEN_METEO_ARCHIVE_URL, params=params,
+                                    timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        daily = response.json().get("daily", {})
+
+        rows = []
+        for day, high, low in zip(daily.get("time", []), *(daily.get(name, []) for name in DAILY_VARIABLES)):
+            # The archive lags a few days behind; keep those days out so they are fetched again later
+            if high is None and low is None:
+                continue
+            rows.append((*cell, day, high, low))
+        return rows
+
+    def get_daily(self, latitude: float, longitude: float, start_date: str, end_date: str) -> Dict[str, List]:
+        """
+        Daily maximum and minimum temperatures, fetching only the days that are not stored yet.
+
+        Args:
+            latitude (float): Latitude of the location.
+            longitude (float): Longitude of the location.
+            start_date (str): First day, YYYY-MM-DD.
+            end_date (str): Last day, YYYY-MM-DD.
+
+        Returns:
+            Dict[str, List]: ``time``, ``temperature_2m_max`` and ``temperature_2m_min`` columns, in the
+            layout of the archive API's ``daily`` object. Days without data are left out.
+        """
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        if end < start:
+            raise ValueError("end_date is before start_date")
+        cell = self._cell(latitude, longitude)
+
+        with self._lock:
+            self._counters["queries"] += 1
+            gaps = missing_ranges(self._stored_days(cell, start, end), start, end)
+
+        # Concurrent lookups of the same gap may both fetch it; INSERT OR REPLACE keeps the rows consistent
+        for first, last in gaps:
+            fetched_rows = self._fetch(cell, first, last)
+            with self._lock:
+                self._counters["requests"] += 1
+                self._counters["fetched_days"] += len(fetched_rows)
+                self._connection.executemany("INSERT OR REPLACE INTO daily_temperature VALUES (?, ?, ?, ?, ?)", fetched_rows)
+                self._connection.commit()
+        if gaps:
+            logger.info(f"Fetched {len(gaps)} missing ranges for cell {cell} between {start} and {end}")
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT day, temperature_2m_max, temperature_2m_min FROM daily_temperature"
+                " WHERE lat_cell = ? AND lon_cell = ? AND day BETWEEN ? AND ? ORDER BY day",
+                (*cell, start.isoformat(), end.isoformat())
+            ).fetchall()
+            fetched = sum((last - first).days + 1 for first, last in gaps)
+            self._counters["served_days"] += len(rows)
+            self._counters["local_days"] += max(len(rows) - fetched, 0)
+
+        return {
+            "time": [row[0] for row in rows],
+            "temperature_2m_max": [row[1] for row in rows],
+            "temperature_2m_min": [row[2] for row in rows],
+        }
+
+    def stats(self) -> Dict:
+        """
+        Query, request and day counters. ``local_days`` are days served without fetching them.
+        """
+        return dict(self._counters)
+
+
+_store: Optional[HistoricalTemperatureStore] = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoricalTemperatureStore:
+    """
+    The process-wide store, opened on first use.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoricalTemperatureStore()
+        return _store
@@ -0,0 +1,292 @@
+# weather_tools.py
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+from loguru import logger
+
+from locations import resolve_location
+from weather_cache import WeatherCache
+
+"""
+    Weather tools
+    - Batch current-weather lookups against Open-Meteo for many locations in one tool call
+    - Open-Meteo accepts comma-separated latitude/longitude lists, so locations are merged into as
+      few upstream requests as the URL length allows; the remaining requests run concurrently
+    - Lookups go through a grid-quantized cache that expires with the provider's 15-minute updates
+      (see weather_cache.py)
+    - Point OPEN_METEO_FORECAST_URL at a stand-in (see openmeteo_standin.py) to run without the real API
+"""
+
+OPEN_METEO_FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Conservative limits: most proxies and servers accept URLs of at least 2 KB
+MAX_URL_LENGTH = 2000
+MAX_LOCATIONS_PER_REQUEST = 100
+MAX_CONCURRENT_REQUESTS = 8
+REQUEST_TIMEOUT_SECONDS = 10
+
+# 4 decimals is ~11 m; identical rounded coordinates share one upstream lookup
+COORDINATE_DECIMALS = 4
+
+Coordinate = Tuple[float, float]
+
+
+def _format(value: float) -> str:
+    return f"{round(float(value), COORDINATE_DECIMALS):g}"
+
+
+def plan_requests(coordinates: Sequence[Coordinate], base_url: str = OPEN_METEO_FORECAST_URL,
+                  max_url_length: int = MAX_URL_LENGTH,
+                  max_locations: int = MAX_LOCATIONS_PER_REQUEST) -> List[List[Coordinate]]:
+    """
+    Groups unique coordinates into the fewest requests that respect the URL and location limits.
+
+    Args:
+        coordinates (Sequence[Coordinate]): (latitude, longitude) pairs; duplicates are dropped.
+        base_url (str): Forecast endpoint the requests are sent to.
+        max_url_length (int): Maximum length of a request URL.
+        max_locations (int): Maximum number of locations per request.
+
+    Returns:
+        List[List[Coordinate]]: Coordinate groups, one per upstream request.
+    """
+    # Fixed part of the URL: base, parameter names and the other query parameters
+    fixed_length = len(base_url) + len("?latitude=&longitude=&current_weather=true")
+
+    groups: List[List[Coordinate]] = []
+    group: List[Coordinate] = []
+    length = fixed_length
+    for coordinate in dict.fromkeys(coordinates):
+        added = len(_format(coordinate[0])) + len(_format(coordinate[1])) + (2 if group else 0)
+        if group and (length + added > max_url_length or len(group) >= max_locations):
+            groups.append(group)
+            group, length = [], fixed_length
+            added -= 2
+        group.append(coordinate)
+        length += added
+    if group:
+        groups.append(group)
+    return groups
+
+
+async def _fetch_group(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, base_url: str,
+                       group: List[Coordinate]) -> Dict[Coordinate, Dict]:
+    params = {
+        "latitude": ",".join(_format(lat) for lat, _ in group),
+        "longitude": ",".join(_format(lon) for _, lon in group),
+        "current_weather": "true",
+    }
+    async with semaphore:
+        async with session.get(base_url, params=params) as response:
+            response.raise_for_status()
+            payload = await response.json()
+
+    # A single location comes back as an object, several as a list in request order
+    entries = payload if isinstance(payload, list) else [payload]
+    return {coordinate: entry.get("current_weather", {}) for coordinate, entry in zip(group, entries)}
+
+
+async def fetch_current_weather(coordinates: Sequence[Coordinate], session: Optional[aiohttp.ClientSession] = None,
+                                base_url: Optional[str] = None,
+                                max_concurrency: int = MAX_CONCURRENT_REQUESTS) -> Dict[Coordinate, Dict]:
+    """
+    Fetches current weather for many coordinates with batched, concurrent upstream requests.
+
+    Args:
+        coordinates (Sequence[Coordinate]): (latitude, longitude) pairs, already rounded.
+        session (aiohttp.ClientSession): Session to reuse; a temporary one is created if None.
+        base_url (str): Forecast endpoint; ``OPEN_METEO_FORECAST_URL`` if None.
+        max_concurrency (int): Maximum number of upstream requests in flight.
+
+    Returns:
+        Dict[Coordinate, Dict]: Open-Meteo ``current_weather`` object per coordinate. Coordinates
+        whose request failed are missing.
+    """
+    base_url = base_url or OPEN_METEO_FORECAST_URL
+    groups = plan_requests(coordinates, base_url)
+    if not groups:
+        return {}
+
+    owns_session = session is None
+    if owns_session:
+        session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS))
+    try:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        results = await asyncio.gather(
+            *(_fetch_group(session, semaphore, base_url, group) for group in groups),
+            return_exceptions=True
+        )
+    finally:
+        if owns_session:
+            await session.close()
+
+    weather: Dict[Coordinate, Dict] = {}
+    for group, result in zip(groups, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to fetch weather for {len(group)} locations: {result}")
+            continue
+        weather.update(result)
+    return weather
+
+
+# Shared by every weather tool in the process
+weather_cache = WeatherCache(fetch_current_weather)
+
+
+async def get_current_weather_async(latitude: float, longitude: float) -> Optional[Dict]:
+    """
+    Cached Open-Meteo ``current_weather`` object for one coordinate, or None if unavailable.
+    """
+    return await weather_cache.get(latitude, longitude)
+
+
+def _run(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # A sync tool called from inside an event loop (e.g. the async chat server) cannot re-enter it
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
+
+
+def get_current_weather(latitude: float, longitude: float) -> Optional[Dict]:
+    """
+    Synchronous entry point of ``get_current_weather_async`` for the sync tool loops.
+    """
+    return _run(get_current_weather_async(latitude, longitude))
+
+
+def get_location_weather(location: str, unit: str = "fahrenheit") -> str:
+    """
+    Current temperature for a place name, resolved through the gazetteer.
+
+    Args:
+        location (str): Place name, e.g. "Tokyo" or "San Francisco, CA".
+        unit (str): "celsius" or "fahrenheit".
+
+    Returns:
+        str: JSON with the resolved location, the temperature and the unit.
+    """
+    place = resolve_location(location)
+    current = get_current_weather(place.latitude, place.longitude) if place else None
+    if current is None or current.get("temperature") is None:
+        return json.dumps({"location": location, "temperature": "unknown"})
+
+    temperature = current["temperature"]
+    if unit == "fahrenheit":
+        temperature = round(temperature * 9 / 5 + 32, 1)
+    return json.dumps({"location": place.label, "temperature": str(temperature), "unit": unit})
+
+
+def get_weather_cache_stats() -> Dict:
+    """
+    Hit rate and counters of the shared weather cache.
+    """
+    return weather_cache.stats()
+
+
+async def get_batch_weather_async(locations: List[Dict], session: Optional[aiohttp.ClientSession] = None) -> str:
+    """
+    Current weather for many locations, as a compact table.
+
+    Args:
+        locations (List[Dict]): Objects with ``latitude``, ``longitude`` and an optional ``name``.
+        session (aiohttp.ClientSession): Session to reuse, or None.
+
+    Returns:
+        str: JSON with ``columns`` and one row per requested location.
+    """
+    try:
+        keys = [(float(loc["latitude"]), float(loc["longitude"])) for loc in locations]
+    except (KeyError, TypeError, ValueError):
+        return "Invalid locations. Each location needs a numeric latitude and longitude."
+
+    try:
+        weather = await weather_cache.get_many(keys, session=session)
+        rows = []
+        for location, key in zip(locations, keys):
+            current = weather.get(key)
+            name = location.get("name") or f"{key[0]},{key[1]}"
+            if current is None:
+                rows.append([name, None, None, None, "unavailable"])
+            else:
+                rows.append([name, current.get("temperature"), current.get("windspeed"),
+                             current.get("weathercode"), current.get("time")])
+        return json.dumps({
+            "columns": ["location", "temperature_c", "windspeed_kmh", "weathercode", "time"],
+            "rows": rows,
+        }, separators=(",", ":"))
+    except Exception as e:
+        logger.error(f"Failed to fetch batch weather: {e}")
+        return "Error in retrieving weather."
+
+
+def get_batch_weather(locations: List[Dict]) -> str:
+    """
+    Synchronous entry point of ``get_batch_weather_async`` for the sync tool loops.
+    """
+    return _run(get_batch_weather_async(locations))
+
+
+def get_weather_tools() -> List[Dict]:
+    """
+    Returns the tool definitions of the weather functions.
+    """
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "get_batch_weather",
+                "description": "Gives the current temperature, wind speed and weather code for many locations at once. Use this instead of calling get_temperature once per location.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "locations": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "name": {"type": "string", "description": "A label for the location, e.g. the city name."},
+                                    "latitude": {"type": "number", "description": "The latitude of the location."},
+                                    "longitude": {"type": "number", "description": "The longitude of the location."},
+                                },
+                                "required": ["latitude", "longitude"],
+                            },
+                        }
+                    },
+                    "required": ["locations"],
+                },
+            },
+        }
+    ]
+
+
+def get_weather_functions() -> Dict:
+    """
+    Returns the weather functions by tool name.
+    """
+    return {"get_batch_weather": get_batch_weather}
+
+
+if __name__ == "__main__":
+    # Runs a batch lookup against a local Open-Meteo stand-in
+    from openmeteo_standin import run_standin
+
+    async def demo():
+        async with run_standin() as (url, stats):
+            global OPEN_METEO_FORECAST_URL
+            OPEN_METEO_FORECAST_URL = f"{url}/v1/forecast"
+            cities = [{"name": f"City {i}", "latitude": -60 + i * 0.37, "longitude": -150 + i * 0.91} for i in range(300)]
+            result = json.loads(await get_batch_weather_async(cities))
+            print(json.dumps(result["rows"][:5], indent=4))
+            print(f"{len(cities)} locations served by {stats['forecast_requests']} upstream requests")
+            await get_batch_weather_async(cities)
+            print(f"Repeated call: {stats['forecast_requests']} upstream requests in total, cache {get_weather_cache_stats()}")
+
+    asyncio.run(demo())